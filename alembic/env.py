@@ -9,6 +9,7 @@ from alembic import context
 sys.path = ['', '..'] + sys.path[1:]
 
 from db.base import Base
+from app.article.search import is_search_object
 from config.settings import SQLALCHEMY_DATABASE_URL
 
 # this is the Alembic Config object, which provides
@@ -31,6 +32,11 @@ target_metadata = Base.metadata
 # ... etc.
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    """Full-text search tables, columns and indexes are maintained by hand written migrations"""
+    return not (reflected and compare_to is None and is_search_object(name))
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -49,6 +55,7 @@ def run_migrations_offline():
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -72,7 +79,8 @@ def run_migrations_online():
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            include_object=include_object,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,37 @@
+"""post like count
+
+Revision ID: 2c5d8f1e9a60
+Revises: b7a93e54c2d1
+Create Date: 2026-10-18 21:48:37.905114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c5d8f1e9a60'
+down_revision = 'b7a93e54c2d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('post', sa.Column('like_count', sa.Integer(), server_default='0', nullable=False))
+    # keep the first like of every (user, post) pair before making the pair unique
+    op.execute(
+        "DELETE FROM post_like WHERE id NOT IN "
+        "(SELECT min(id) FROM post_like GROUP BY user_id, post_id)"
+    )
+    op.create_index('ix_post_like_user_id_post_id', 'post_like', ['user_id', 'post_id'],
+                    unique=True)
+    op.execute(
+        "UPDATE post SET like_count = "
+        "(SELECT count(post_like.id) FROM post_like WHERE post_like.post_id = post.id)"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_post_like_user_id_post_id', table_name='post_like')
+    with op.batch_alter_table('post') as batch_op:
+        batch_op.drop_column('like_count')
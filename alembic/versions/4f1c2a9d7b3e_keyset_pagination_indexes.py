@@ -0,0 +1,34 @@
+"""keyset pagination indexes
+
+Revision ID: 4f1c2a9d7b3e
+Revises: 933b6b3e7765
+Create Date: 2026-10-18 19:52:10.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f1c2a9d7b3e'
+down_revision = '933b6b3e7765'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_post_date_created_id', 'post', ['date_created', 'id'], unique=False)
+    op.create_index('ix_comment_parent_id_date_created_id', 'comment',
+                    ['parent_id', 'date_created', 'id'], unique=False)
+    op.create_index('ix_tag_date_created_id', 'tag', ['date_created', 'id'], unique=False)
+    op.create_index('ix_category_date_created_id', 'category', ['date_created', 'id'], unique=False)
+    op.create_index('ix_user_date_registrations_id', 'user', ['date_registrations', 'id'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_user_date_registrations_id', table_name='user')
+    op.drop_index('ix_category_date_created_id', table_name='category')
+    op.drop_index('ix_tag_date_created_id', table_name='tag')
+    op.drop_index('ix_comment_parent_id_date_created_id', table_name='comment')
+    op.drop_index('ix_post_date_created_id', table_name='post')
@@ -0,0 +1,45 @@
+"""slug alias
+
+Revision ID: 6e3b9d4a1c58
+Revises: 2c5d8f1e9a60
+Create Date: 2026-10-18 23:12:05.418230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e3b9d4a1c58'
+down_revision = '2c5d8f1e9a60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'slug_alias',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('slug', sa.String(length=255), nullable=False),
+        sa.Column('target_id', sa.Integer(), nullable=False),
+        sa.Column('date_created', sa.DateTime(timezone=True), server_default=sa.func.now(),
+                  nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_slug_alias_kind_slug', 'slug_alias', ['kind', 'slug'], unique=True)
+    op.create_index('ix_slug_alias_kind_target_id', 'slug_alias', ['kind', 'target_id'],
+                    unique=False)
+    # categories were created with the bare slugified name, suffix all but the first duplicate
+    op.execute(
+        "UPDATE category SET slug = slug || '-' || id WHERE id NOT IN "
+        "(SELECT min(id) FROM category GROUP BY slug)"
+    )
+    op.create_index('ix_category_slug', 'category', ['slug'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_category_slug', table_name='category')
+    op.drop_index('ix_slug_alias_kind_target_id', table_name='slug_alias')
+    op.drop_index('ix_slug_alias_kind_slug', table_name='slug_alias')
+    op.drop_table('slug_alias')
@@ -0,0 +1,79 @@
+"""comment path
+
+Revision ID: 7a4c2e8f9b13
+Revises: 6e3b9d4a1c58
+Create Date: 2026-10-19 09:41:26.770318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4c2e8f9b13'
+down_revision = '6e3b9d4a1c58'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def segment(id):
+    # app.article.threads.segment at the time of this revision
+    return str(id).zfill(10)
+
+
+def backfill():
+    comment = sa.table(
+        'comment',
+        sa.column('id', sa.Integer), sa.column('parent_id', sa.Integer),
+        sa.column('thread_id', sa.Integer), sa.column('path', sa.String),
+        sa.column('depth', sa.Integer),
+    )
+    conn = op.get_bind()
+    parents = dict(conn.execute(sa.select(comment.c.id, comment.c.parent_id)).fetchall())
+    places = {}
+
+    def place(id):
+        """(thread_id, path, depth) of id, replies of deleted comments become top-level"""
+        start, chain = id, []
+        while id not in places:
+            parent_id = parents[id]
+            if parent_id not in parents or parent_id == id or parent_id in chain:
+                places[id] = (id, segment(id), 0)
+                break
+            chain.append(id)
+            id = parent_id
+        for child_id in reversed(chain):
+            thread_id, path, depth = places[parents[child_id]]
+            places[child_id] = (thread_id, f"{path}/{segment(child_id)}", depth + 1)
+        return places[start]
+
+    update = comment.update() \
+        .where(comment.c.id == sa.bindparam('_id')) \
+        .values(thread_id=sa.bindparam('thread_id'), path=sa.bindparam('path'),
+                depth=sa.bindparam('depth'))
+    ids = sorted(parents)
+    for start in range(0, len(ids), BATCH_SIZE):
+        rows = []
+        for id in ids[start:start + BATCH_SIZE]:
+            thread_id, path, depth = place(id)
+            rows.append({'_id': id, 'thread_id': thread_id, 'path': path, 'depth': depth})
+        conn.execute(update, rows)
+
+
+def upgrade():
+    op.add_column('comment', sa.Column('thread_id', sa.Integer(), nullable=True))
+    op.add_column('comment', sa.Column('path', sa.String(), nullable=True))
+    op.add_column('comment', sa.Column('depth', sa.Integer(), server_default='0',
+                                       nullable=False))
+    backfill()
+    op.create_index('ix_comment_thread_id_path', 'comment', ['thread_id', 'path'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_comment_thread_id_path', table_name='comment')
+    with op.batch_alter_table('comment') as batch_op:
+        batch_op.drop_column('depth')
+        batch_op.drop_column('path')
+        batch_op.drop_column('thread_id')
@@ -0,0 +1,62 @@
+"""post full-text search
+
+Revision ID: 8d2e6b1f0a47
+Revises: 4f1c2a9d7b3e
+Create Date: 2026-10-18 20:31:44.207165
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2e6b1f0a47'
+down_revision = '4f1c2a9d7b3e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE post_fts USING fts5("
+            "title, text, content='post', content_rowid='id', tokenize='porter unicode61')"
+        )
+        op.execute(
+            "CREATE TRIGGER post_fts_insert AFTER INSERT ON post BEGIN "
+            "INSERT INTO post_fts(rowid, title, text) VALUES (new.id, new.title, new.text); END"
+        )
+        op.execute(
+            "CREATE TRIGGER post_fts_delete AFTER DELETE ON post BEGIN "
+            "INSERT INTO post_fts(post_fts, rowid, title, text) "
+            "VALUES ('delete', old.id, old.title, old.text); END"
+        )
+        op.execute(
+            "CREATE TRIGGER post_fts_update AFTER UPDATE OF title, text ON post BEGIN "
+            "INSERT INTO post_fts(post_fts, rowid, title, text) "
+            "VALUES ('delete', old.id, old.title, old.text); "
+            "INSERT INTO post_fts(rowid, title, text) VALUES (new.id, new.title, new.text); END"
+        )
+        # index posts which existed before the table
+        op.execute("INSERT INTO post_fts(post_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        op.execute(
+            "ALTER TABLE post ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(text, '')), 'B')) STORED"
+        )
+        op.create_index('ix_post_search_vector', 'post', ['search_vector'],
+                        postgresql_using='gin')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER post_fts_update")
+        op.execute("DROP TRIGGER post_fts_delete")
+        op.execute("DROP TRIGGER post_fts_insert")
+        op.execute("DROP TABLE post_fts")
+    elif dialect == 'postgresql':
+        op.drop_index('ix_post_search_vector', table_name='post')
+        op.drop_column('post', 'search_vector')
@@ -0,0 +1,33 @@
+"""post comment count
+
+Revision ID: 9c1f5b7e2d64
+Revises: 7a4c2e8f9b13
+Create Date: 2026-10-19 14:05:52.193867
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c1f5b7e2d64'
+down_revision = '7a4c2e8f9b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('post', sa.Column('comment_count', sa.Integer(), server_default='0',
+                                    nullable=False))
+    op.create_index('ix_comment_post_id_parent_id_date_created_id', 'comment',
+                    ['post_id', 'parent_id', 'date_created', 'id'], unique=False)
+    op.execute(
+        "UPDATE post SET comment_count = "
+        "(SELECT count(comment.id) FROM comment WHERE comment.post_id = post.id)"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_comment_post_id_parent_id_date_created_id', table_name='comment')
+    with op.batch_alter_table('post') as batch_op:
+        batch_op.drop_column('comment_count')
@@ -0,0 +1,72 @@
+"""timeline entry
+
+Revision ID: a3f7c9d2e5b1
+Revises: 9c1f5b7e2d64
+Create Date: 2026-10-20 10:12:37.408215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f7c9d2e5b1'
+down_revision = '9c1f5b7e2d64'
+branch_labels = None
+depends_on = None
+
+# settings.FEED_TIMELINE_LENGTH and FEED_FANOUT_MAX_FOLLOWERS at the time of this revision
+TIMELINE_LENGTH = 800
+FANOUT_MAX_FOLLOWERS = 10000
+
+
+def upgrade():
+    op.add_column('user', sa.Column('follower_count', sa.Integer(), server_default='0',
+                                    nullable=False))
+    op.create_index('ix_user_follower_count', 'user', ['follower_count'], unique=False)
+    op.create_index('ix_user_to_user_followed_id_follower_id', 'user_to_user',
+                    ['followed_id', 'follower_id'], unique=False)
+    op.create_index('ix_post_user_id_date_created_id', 'post',
+                    ['user_id', 'date_created', 'id'], unique=False)
+    op.create_table(
+        'timeline_entry',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('author_id', sa.Integer(), nullable=False),
+        sa.Column('date_created', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['author_id'], ['user.id'], ),
+        sa.ForeignKeyConstraint(['post_id'], ['post.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'post_id')
+    )
+    op.create_index('ix_timeline_entry_post_id', 'timeline_entry', ['post_id'], unique=False)
+    op.create_index('ix_timeline_entry_user_id_date_created_post_id', 'timeline_entry',
+                    ['user_id', 'date_created', 'post_id'], unique=False)
+    op.execute(
+        'UPDATE "user" SET follower_count = '
+        '(SELECT count(*) FROM user_to_user WHERE user_to_user.followed_id = "user".id)'
+    )
+    # the newest posts of the pushed accounts every user follows
+    op.execute(
+        'INSERT INTO timeline_entry (user_id, post_id, author_id, date_created) '
+        'SELECT follower_id, id, user_id, date_created FROM ('
+        ' SELECT user_to_user.follower_id, post.id, post.user_id, post.date_created,'
+        '  row_number() OVER (PARTITION BY user_to_user.follower_id'
+        '   ORDER BY post.date_created DESC, post.id DESC) AS rank'
+        ' FROM user_to_user'
+        ' JOIN "user" ON "user".id = user_to_user.followed_id'
+        ' JOIN post ON post.user_id = user_to_user.followed_id'
+        f' WHERE "user".follower_count <= {FANOUT_MAX_FOLLOWERS}'
+        f') AS entries WHERE rank <= {TIMELINE_LENGTH}'
+    )
+
+
+def downgrade():
+    op.drop_index('ix_timeline_entry_user_id_date_created_post_id', table_name='timeline_entry')
+    op.drop_index('ix_timeline_entry_post_id', table_name='timeline_entry')
+    op.drop_table('timeline_entry')
+    op.drop_index('ix_post_user_id_date_created_id', table_name='post')
+    op.drop_index('ix_user_to_user_followed_id_follower_id', table_name='user_to_user')
+    op.drop_index('ix_user_follower_count', table_name='user')
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('follower_count')
@@ -0,0 +1,32 @@
+"""post filter indexes
+
+Revision ID: b7a93e54c2d1
+Revises: 8d2e6b1f0a47
+Create Date: 2026-10-18 21:05:12.639021
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7a93e54c2d1'
+down_revision = '8d2e6b1f0a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_post_tag_tag_id_post_id', 'post_tag', ['tag_id', 'post_id'], unique=False)
+    op.create_index('ix_post_category_id_date_created', 'post', ['category_id', 'date_created'],
+                    unique=False)
+    op.create_index('ix_post_is_active_date_created', 'post', ['is_active', 'date_created'],
+                    unique=False)
+    op.create_index(op.f('ix_tag_name'), 'tag', ['name'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_tag_name'), table_name='tag')
+    op.drop_index('ix_post_is_active_date_created', table_name='post')
+    op.drop_index('ix_post_category_id_date_created', table_name='post')
+    op.drop_index('ix_post_tag_tag_id_post_id', table_name='post_tag')
@@ -0,0 +1,47 @@
+"""follow counts
+
+Revision ID: c8e2f4a6b1d3
+Revises: a3f7c9d2e5b1
+Create Date: 2026-10-20 15:47:09.126583
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e2f4a6b1d3'
+down_revision = 'a3f7c9d2e5b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('following_count', sa.Integer(), server_default='0',
+                                    nullable=False))
+    # SQLite adds a column with a non-constant default only by copying the table
+    with op.batch_alter_table('user_to_user') as batch_op:
+        batch_op.add_column(sa.Column('date_created', sa.DateTime(), server_default=sa.func.now(),
+                                      nullable=True))
+    op.drop_index('ix_user_to_user_followed_id_follower_id', table_name='user_to_user')
+    op.create_index('ix_user_to_user_follower_id_date_created_followed_id', 'user_to_user',
+                    ['follower_id', 'date_created', 'followed_id'], unique=False)
+    op.create_index('ix_user_to_user_followed_id_date_created_follower_id', 'user_to_user',
+                    ['followed_id', 'date_created', 'follower_id'], unique=False)
+    op.execute(
+        'UPDATE "user" SET following_count = '
+        '(SELECT count(*) FROM user_to_user WHERE user_to_user.follower_id = "user".id)'
+    )
+
+
+def downgrade():
+    op.drop_index('ix_user_to_user_followed_id_date_created_follower_id',
+                  table_name='user_to_user')
+    op.drop_index('ix_user_to_user_follower_id_date_created_followed_id',
+                  table_name='user_to_user')
+    op.create_index('ix_user_to_user_followed_id_follower_id', 'user_to_user',
+                    ['followed_id', 'follower_id'], unique=False)
+    with op.batch_alter_table('user_to_user') as batch_op:
+        batch_op.drop_column('date_created')
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('following_count')
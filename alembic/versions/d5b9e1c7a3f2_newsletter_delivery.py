@@ -0,0 +1,40 @@
+"""newsletter delivery
+
+Revision ID: d5b9e1c7a3f2
+Revises: c8e2f4a6b1d3
+Create Date: 2026-10-21 11:03:58.640192
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5b9e1c7a3f2'
+down_revision = 'c8e2f4a6b1d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'newsletter_delivery',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('contact_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('date_created', sa.DateTime(timezone=True), server_default=sa.func.now(),
+                  nullable=True),
+        sa.ForeignKeyConstraint(['contact_id'], ['contact.id'], ),
+        sa.ForeignKeyConstraint(['post_id'], ['post.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_newsletter_delivery_post_id_contact_id', 'newsletter_delivery',
+                    ['post_id', 'contact_id'], unique=True)
+    op.create_index('ix_contact_category_id_id', 'contact', ['category_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_contact_category_id_id', table_name='contact')
+    op.drop_index('ix_newsletter_delivery_post_id_contact_id', table_name='newsletter_delivery')
+    op.drop_table('newsletter_delivery')
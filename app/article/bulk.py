@@ -0,0 +1,174 @@
+"""
+Bulk import and export of posts as NDJSON, one post per line.
+
+The import validates lines into schemas.PostImport and writes them in batches: categories and tags
+are resolved through caches which live for the whole import, missing tags of a batch are
+created with one multi-row INSERT, slugs are allocated for the whole batch and posts and their
+post_tag rows go in with executemany. The posts of a batch are pushed to the followers'
+timelines like new posts. Every batch is one transaction.
+The export pages through post by id, so memory use does not grow with the table.
+"""
+import json
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.article import feed, schemas
+from app.article.models import Category, Post, Tag, post_tag
+from app.article.slugs import SlugAllocator, base_slug
+from app.base import cache
+from config import settings
+
+
+async def ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """Numbered non-empty lines of a stream of byte chunks"""
+    buffer = b""
+    number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, line
+    if buffer.strip():
+        yield number + 1, buffer
+
+
+class PostImporter:
+    """Imports NDJSON lines of schemas.PostImport as posts of user_id"""
+
+    def __init__(self, db: AsyncSession, user_id: int,
+                 batch_size: int = settings.POST_IMPORT_BATCH_SIZE,
+                 max_errors: int = settings.POST_IMPORT_MAX_ERRORS):
+        self.db = db
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.slugs = SlugAllocator(db, Post)
+        self.categories: Set[int] = set()
+        self.tags: Dict[str, int] = {}
+        self.result = schemas.ImportResult()
+
+    def error(self, line: int, detail: str) -> None:
+        self.result.failed += 1
+        if len(self.result.errors) < self.max_errors:
+            self.result.errors.append(schemas.ImportLineError(line=line, detail=detail))
+
+    async def run(self, lines: AsyncIterator[Tuple[int, bytes]]) -> schemas.ImportResult:
+        batch: List[Tuple[int, schemas.PostImport]] = []
+        async for number, line in lines:
+            try:
+                batch.append((number, schemas.PostImport(**json.loads(line))))
+            except (ValueError, TypeError, ValidationError) as exc:
+                self.error(number, str(exc))
+                continue
+            if len(batch) >= self.batch_size:
+                await self.write(batch)
+                batch = []
+        if batch:
+            await self.write(batch)
+        self.result.errors.sort(key=lambda error: error.line)
+        if self.result.imported:
+            await cache.invalidate("posts", "tags")
+        return self.result
+
+    async def write(self, batch: List[Tuple[int, schemas.PostImport]]) -> None:
+        await self.resolve_categories({post.category for _, post in batch})
+        valid = []
+        for number, post in batch:
+            if post.category in self.categories:
+                valid.append(post)
+            else:
+                self.error(number, f"Category {post.category} does not exist")
+        if not valid:
+            return
+        await self.resolve_tags({name for post in valid for name in post.tag or ()})
+        slugs = await self.slugs.allocate(
+            [post.slug or base_slug(post.title, default="post") for post in valid]
+        )
+
+        now = datetime.utcnow()
+        await self.db.execute(insert(Post.__table__), [
+            {"slug": slug, "title": post.title, "text": post.text, "is_active": post.is_active,
+             "user_id": self.user_id, "category_id": post.category, "like_count": 0,
+             "date_created": post.date_created or now}
+            for slug, post in zip(slugs, valid)
+        ])
+        # SQLite has no RETURNING, slugs are unique so they identify the new rows
+        result = await self.db.execute(select(Post.slug, Post.id).where(Post.slug.in_(slugs)))
+        ids = dict(result.all())
+        links = {(ids[slug], self.tags[name])
+                 for slug, post in zip(slugs, valid) for name in post.tag or ()}
+        if links:
+            await self.db.execute(insert(post_tag), [
+                {"post_id": post_id, "tag_id": tag_id} for post_id, tag_id in links
+            ])
+        await feed.fan_out_imported(self.db, self.user_id, list(ids.values()))
+        await self.db.commit()
+        self.result.imported += len(valid)
+
+    async def resolve_categories(self, category_ids: Set[int]) -> None:
+        unknown = category_ids - self.categories
+        if unknown:
+            result = await self.db.execute(select(Category.id).where(Category.id.in_(unknown)))
+            self.categories.update(result.scalars())
+
+    async def resolve_tags(self, names: Set[str]) -> None:
+        """Load ids of names into the cache, creating the missing tags"""
+        unknown = names - self.tags.keys()
+        if not unknown:
+            return
+        await self._load_tags(unknown)
+        missing = unknown - self.tags.keys()
+        if missing:
+            # tag.name has no unique constraint to upsert on, the lookup above stands in for it
+            now = datetime.utcnow()
+            await self.db.execute(insert(Tag.__table__), [
+                {"name": name, "date_created": now} for name in sorted(missing)
+            ])
+            await self._load_tags(missing)
+
+    async def _load_tags(self, names: Iterable[str]) -> None:
+        # duplicated names resolve to the oldest tag
+        result = await self.db.execute(
+            select(Tag.name, Tag.id).where(Tag.name.in_(list(names))).order_by(Tag.id.desc())
+        )
+        self.tags.update(result.all())
+
+
+async def export_posts(db: AsyncSession, page_size: int = settings.POST_EXPORT_PAGE_SIZE
+                       ) -> AsyncIterator[bytes]:
+    """All posts as NDJSON in the format of the import, a page of rows and their tags at a time"""
+    columns = [Post.id, Post.slug, Post.title, Post.text, Post.category_id, Post.is_active,
+               Post.date_created]
+    last_id: Optional[int] = 0
+    while last_id is not None:
+        result = await db.execute(
+            select(*columns).where(Post.id > last_id).order_by(Post.id).limit(page_size)
+        )
+        rows = result.all()
+        if not rows:
+            break
+        last_id = rows[-1].id if len(rows) == page_size else None
+        tags: Dict[int, List[str]] = {}
+        result = await db.execute(
+            select(post_tag.c.post_id, Tag.name)
+            .join(Tag, Tag.id == post_tag.c.tag_id)
+            .where(post_tag.c.post_id.in_([row.id for row in rows]))
+            .order_by(post_tag.c.post_id, Tag.name)
+        )
+        for post_id, name in result.all():
+            tags.setdefault(post_id, []).append(name)
+        yield "".join(
+            json.dumps({
+                "id": row.id, "slug": row.slug, "title": row.title, "text": row.text,
+                "category": row.category_id, "tag": tags.get(row.id, []),
+                "is_active": row.is_active,
+                "date_created": row.date_created.isoformat() if row.date_created else None,
+            }, ensure_ascii=False) + "\n"
+            for row in rows
+        ).encode()
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.article import bulk, schemas
+from app.base.routing import SerializingRoute
+from app.user import permission
+from app.user.principal import Principal
+from db.db import get_db
+
+router = APIRouter(route_class=SerializingRoute)
+
+NDJSON = "application/x-ndjson"
+
+
+@router.post("/import", response_model=schemas.ImportResult)
+async def import_posts(
+        request: Request,
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(permission.get_current_superuser),
+):
+    """
+    Create posts from an NDJSON body, one PostImport object per line.
+    Valid lines are imported, the response lists the lines which failed
+    """
+    importer = bulk.PostImporter(db, user_id=current_user.id)
+    return await importer.run(bulk.ndjson_lines(request.stream()))
+
+
+@router.get("/export", dependencies=[Depends(permission.get_current_superuser)])
+async def export_posts(db: AsyncSession = Depends(get_db)):
+    """All posts as NDJSON, in the format of the import"""
+    return StreamingResponse(bulk.export_posts(db), media_type=NDJSON)
@@ -1,73 +1,92 @@
 from typing import List, Any
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.article import schemas, services
+from app.article import schemas, services, slugs, loaders
+from app.article.models import Category
+from app.base import cache
+from app.base.fields import FieldSet
+from app.base.pagination import CursorParams
 from app.user import permission
-from app.user.models import User
+from app.user.principal import Principal
 from db.db import get_db
 
-router = APIRouter()
+router = APIRouter(route_class=cache.CachedRoute)
 
 
 @router.get("/{slug}", response_model=schemas.CategoryInResponse)
-def get_category(*, slug: str, db: Session = Depends(get_db)):
-    category = services.category_crud.get(db=db, slug=slug)
+async def get_category(*, slug: str, db: AsyncSession = Depends(get_db), request: Request):
+    category = await services.category_crud.get(db=db, slug=slug)
     if not category:
+        current = await slugs.current_slug(db, Category, slug)
+        if current:
+            return RedirectResponse(request.url_for("get_category", slug=current), status_code=301)
         raise HTTPException(status_code=404, detail="Category not found")
+    cache.tag(request, f"category:{category.id}")
     return category
 
 
 @router.get("/", response_model=List[schemas.CategoryInResponse])
-def get_list_categories(*, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)) -> Any:
-    categories = services.category_crud.get_multi(skip=skip, limit=limit, db=db)
+async def get_list_categories(*, skip: int = 0, limit: int = 100,
+                              db: AsyncSession = Depends(get_db),
+                              page: CursorParams = Depends(), request: Request, response: Response,
+                              fields: FieldSet = Depends(loaders.category_fields)) -> Any:
+    if page.enabled:
+        categories = await services.category_crud.get_multi_keyset(
+            after=page.after, limit=limit, db=db, options=fields.options()
+        )
+        page.set_next(response, categories, limit)
+    else:
+        categories = await services.category_crud.get_multi(skip=skip, limit=limit, db=db,
+                                                            options=fields.options())
     if not categories:
         raise HTTPException(status_code=404, detail="Categories not found")
-    return categories
+    cache.tag(request, "categories")
+    return fields.respond(categories, response)
 
 
 @router.post("/", response_model=schemas.CategoryInResponse)
-def create_category(
+async def create_category(
         *,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         schema: schemas.CategoryCreate,
-        current_user: User = Depends(permission.get_current_active_user),
+        current_user: Principal = Depends(permission.get_current_active_principal),
 ) -> Any:
-    slug = services.generate_slug(schema.name)
-    category_in_db = schemas.CategoryInDB(**schema.dict(), user_id=current_user.id, slug=slug)
-    category = services.category_crud.create(db=db, schema=category_in_db)
+    category_in_db = schemas.CategoryInDB(**schema.dict(), user_id=current_user.id)
+    category = await services.category_crud.create(db=db, schema=category_in_db)
     return category
 
 
 @router.put("/{id}", response_model=schemas.CategoryUpdate)
-def update_category(
+async def update_category(
         *,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         id: int,
         schema: schemas.CategoryUpdate,
-        current_user: User = Depends(permission.get_current_active_user),
+        current_user: Principal = Depends(permission.get_current_active_principal),
 ):
-    category = services.category_crud.get(db=db, id=id)
+    category = await services.category_crud.get(db=db, id=id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     if not current_user.is_superuser and (category.user_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    category = services.category_crud.update(db=db, db_obj=category, schema=schema)
+    category = await services.category_crud.update(db=db, db_obj=category, schema=schema)
     return category
 
 
 @router.delete("/{id}", response_model=schemas.CategoryInResponse)
 async def delete_category(
         *,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         id: int,
-        current_user: User = Depends(permission.get_current_active_user),
+        current_user: Principal = Depends(permission.get_current_active_principal),
 ):
-    category = services.category_crud.get(db=db, id=id)
+    category = await services.category_crud.get(db=db, id=id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     if not current_user.is_superuser and (category.user_id != current_user.id):
         raise HTTPException(status_code=404, detail="Not enough permissions")
-    category = services.category_crud.remove(db=db, id=id)
+    category = await services.category_crud.remove(db=db, id=id)
     return category
@@ -1,87 +1,129 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.article import schemas, services, models
+from app.article import schemas, services, loaders, threads
+from app.base import cache
+from app.base.fields import FieldSet
+from app.base.pagination import NEXT_CURSOR_HEADER, CursorParams
 from app.user import permission
-from app.user.models import User
+from app.user.principal import Principal
+from config import settings
 from db.db import get_db
 
-router = APIRouter()
+router = APIRouter(route_class=cache.CachedRoute)
 
 
 @router.get("/{id}", response_model=schemas.CommentInResponse)
-def get_comment(*, db: Session = Depends(get_db), id: int):
-    comment = services.comment_crud.get_without_parent(db=db, id=id)
+async def get_comment(*, db: AsyncSession = Depends(get_db), id: int, request: Request):
+    comment = await services.comment_crud.get_without_parent(db=db, id=id)
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
+    cache.tag(request, "comments")
     return comment
 
 
+@router.get("/{id}/replies", response_model=List[schemas.CommentInResponse])
+async def get_comment_replies(*, db: AsyncSession = Depends(get_db), id: int,
+                              after: Optional[str] = None,
+                              limit: int = settings.COMMENT_THREAD_REPLIES,
+                              request: Request, response: Response):
+    """Replies of the comment in thread order, `after` is the more_replies of the thread"""
+    comment = await services.comment_crud.get(db=db, id=id)
+    if not comment:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    if after is not None and not after.startswith(threads.subtree_prefix(comment)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    replies, next_cursor = await services.comment_crud.get_replies(db=db, comment=comment,
+                                                                   after=after, limit=limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    cache.tag(request, "comments")
+    return replies
+
+
 @router.get("/", response_model=List[schemas.CommentInResponse])
-def get_list_comments(*, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    comments = services.comment_crud.get_multi_without_parent(skip=skip, limit=limit, db=db)
+async def get_list_comments(*, skip: int = 0, limit: int = 100,
+                            db: AsyncSession = Depends(get_db),
+                            page: CursorParams = Depends(), request: Request, response: Response,
+                            fields: FieldSet = Depends(loaders.comment_fields)):
+    # without replies in the fields only the top-level comments are loaded
+    depth = None if fields.includes("replies") else 0
+    if page.enabled:
+        comments = await services.comment_crud.get_multi_keyset_without_parent(
+            after=page.after, limit=limit, db=db, depth=depth, options=fields.options()
+        )
+        page.set_next(response, comments, limit)
+    else:
+        comments = await services.comment_crud.get_multi_without_parent(
+            skip=skip, limit=limit, db=db, depth=depth, options=fields.options()
+        )
     if not comments:
         raise HTTPException(status_code=404, detail="Comments not found")
-    return comments
+    cache.tag(request, "comments")
+    return fields.respond(comments, response)
 
 
 @router.post("/{post_id}", response_model=schemas.CommentCreate)
-def create_comment(
+async def create_comment(
         *,
         post_id: int,
         schema: schemas.CommentCreate,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(permission.get_current_active_user),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(permission.get_current_active_principal),
 ):
     comment_in_db = schemas.CommentInDB(**schema.dict(), post_id=post_id, user_id=current_user.id)
-    comment = services.comment_crud.create(db=db, schema=comment_in_db)
+    comment = await services.comment_crud.create(db=db, schema=comment_in_db)
     return comment
 
 
 @router.post("/{post_id}/{comment_id}", response_model=schemas.CommentInResponse)
-def create_comment_reply(
+async def create_comment_reply(
         *,
         post_id: int,
         comment_id: int,
         schema: schemas.CommentCreate,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(permission.get_current_active_user),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(permission.get_current_active_principal),
 ):
-    extend_comment_in = models.Comment(**schema.dict(), post_id=post_id, parent_id=comment_id,
-                                       user_id=current_user.id)
-    comment = services.comment_crud.create(db=db, schema=extend_comment_in)
+    parent = await services.comment_crud.get(db=db, id=comment_id, post_id=post_id)
+    if not parent:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    comment_in_db = schemas.CommentInDB(**schema.dict(), post_id=post_id, user_id=current_user.id)
+    comment = await services.comment_crud.create(db=db, schema=comment_in_db, parent=parent,
+                                                 options=loaders.comment_in_response())
     return comment
 
 
 @router.put("/{id}", response_model=schemas.CommentUpdate)
-def update_comment(
+async def update_comment(
         *,
         id: int,
         schema: schemas.CommentUpdate,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(permission.get_current_active_user),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(permission.get_current_active_principal),
 ):
-    comment = services.comment_crud.get(db=db, id=id)
+    comment = await services.comment_crud.get(db=db, id=id)
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
     if not current_user.is_superuser and (comment.user_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    comment = services.comment_crud.update(db=db, db_obj=comment, schema=schema)
+    comment = await services.comment_crud.update(db=db, db_obj=comment, schema=schema)
     return comment
 
 
 @router.delete("/{id}", response_model=schemas.CommentInResponse)
-def delete_comment(
+async def delete_comment(
         *,
         id: int,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(permission.get_current_active_user),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(permission.get_current_active_principal),
 ):
-    comment = services.comment_crud.get(db=db, id=id)
+    comment = await services.comment_crud.get(db=db, id=id)
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
     if not current_user.is_superuser and (comment.user_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    comment = services.comment_crud.remove(db=db, id=id)
+    comment = await services.comment_crud.remove(db=db, id=id,
+                                                 options=loaders.comment_in_response())
     return comment
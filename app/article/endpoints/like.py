@@ -1,39 +1,54 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.article import schemas, models, services
+from app.article import schemas, services, like_buffer
+from app.base.routing import SerializingRoute
 from app.user import permission
+from app.user.principal import Principal
 from db.db import get_db
 
-router = APIRouter()
+router = APIRouter(route_class=SerializingRoute)
 
 
 @router.post("/{post_id}/", response_model=schemas.Like)
-def like_post(
+async def like_post(
         post_id: int,
-        db: Session = Depends(get_db),
-        current_user: models.User = Depends(permission.get_current_active_user),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(permission.get_current_active_principal),
 ):
-    if services.has_liked_post(db=db, post_id=post_id, user_id=current_user.id):
+    if like_buffer.buffer is not None:
+        if await like_buffer.liked(db=db, user_id=current_user.id, post_id=post_id):
+            raise HTTPException(status_code=400, detail="Post already liked")
+        await like_buffer.push(user_id=current_user.id, post_id=post_id, liked=True)
+        return schemas.Like(user_id=current_user.id, post_id=post_id)
+    like = await services.like(db=db, post_id=post_id, user_id=current_user.id)
+    if like is None:
         raise HTTPException(status_code=400, detail="Post already liked")
-    like = services.like(db=db, post_id=post_id, user_id=current_user.id)
     return like
 
 
 @router.delete("/{post_id}/", response_model=schemas.Like)
-def unlike_post(
+async def unlike_post(
         post_id: int,
-        db: Session = Depends(get_db),
-        current_user: models.User = Depends(permission.get_current_active_user),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(permission.get_current_active_principal),
 ):
-    if not services.has_liked_post(db=db, post_id=post_id, user_id=current_user.id):
+    if like_buffer.buffer is not None:
+        if not await like_buffer.liked(db=db, user_id=current_user.id, post_id=post_id):
+            raise HTTPException(status_code=400, detail="Post was not liked")
+        await like_buffer.push(user_id=current_user.id, post_id=post_id, liked=False)
+        return schemas.Like(user_id=current_user.id, post_id=post_id)
+    unlike = await services.unlike(db=db, post_id=post_id, user_id=current_user.id)
+    if unlike is None:
         raise HTTPException(status_code=400, detail="Post was not liked")
-    unlike = services.unlike(db=db, post_id=post_id, user_id=current_user.id)
     return unlike
 
 
 @router.get("/{post_id}/")
-def count_likes_post(post_id: int, db: Session = Depends(get_db)):
-    count_likes = services.count_likes(db=db, post_id=post_id)
+async def count_likes_post(post_id: int, db: AsyncSession = Depends(get_db)):
+    if like_buffer.buffer is not None:
+        count_likes = await like_buffer.count(db=db, post_id=post_id)
+    else:
+        count_likes = await services.count_likes(db=db, post_id=post_id)
     return {"count_likes": count_likes}
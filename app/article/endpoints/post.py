@@ -1,13 +1,25 @@
+import logging
 from typing import List, Optional, Any
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import RedirectResponse
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.article import services, schemas
+import tasks
+from app.article import services, schemas, loaders, slugs
+from app.article.filters import TagMode
+from app.article.models import Post
+from app.base import cache, task_queue
+from app.base.fields import FieldSet
+from app.base.pagination import CursorParams
 from app.user import permission
-from app.user.models import User
+from app.user.principal import Principal
+from config import settings
 from db.db import get_db
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
+
+router = APIRouter(route_class=cache.CachedRoute)
 
 
 class FilterQueryParams:
@@ -16,73 +28,129 @@ class FilterQueryParams:
                  skip: int = 0,
                  limit: int = 100,
                  tag: Optional[List[str]] = Query(None),
+                 tag_mode: TagMode = TagMode.any,
                  category: Optional[int] = Query(None),
                  ):
         self.search = search
         self.skip = skip
         self.limit = limit
         self.tag = tag
+        self.tag_mode = tag_mode
         self.category = category
 
 
+def cache_tags(post: Post) -> List[str]:
+    """Response cache tags of everything a PostInResponse shows"""
+    tags = [f"post:{post.id}", f"category:{post.category_id}"]
+    # a sparse fieldset without tags leaves them unloaded
+    if "tag" not in inspect(post).unloaded:
+        tags.extend(f"tag:{tag.id}" for tag in post.tag)
+    return tags
+
+
 @router.get("/{slug}", response_model=schemas.PostInResponse)
-def get_post(*, slug: str, db: Session = Depends(get_db)):
-    post = services.post_crud.get(db=db, slug=slug)
+async def get_post(*, slug: str, db: AsyncSession = Depends(get_db), request: Request):
+    post = await services.post_crud.get(db=db, slug=slug, options=loaders.post_in_response())
     if not post:
+        current = await slugs.current_slug(db, Post, slug)
+        if current:
+            return RedirectResponse(request.url_for("get_post", slug=current), status_code=301)
         raise HTTPException(status_code=404, detail="Post not found")
+    cache.tag(request, *cache_tags(post))
     return post
 
 
+@router.get("/{id}/comments", response_model=List[schemas.CommentInResponse])
+async def get_post_comments(*, id: int, skip: int = 0, limit: int = Query(20, le=100),
+                            replies: int = Query(settings.COMMENT_THREAD_REPLIES, ge=0, le=500),
+                            depth: Optional[int] = Query(None, ge=0),
+                            db: AsyncSession = Depends(get_db),
+                            page: CursorParams = Depends(), request: Request, response: Response,
+                            fields: FieldSet = Depends(loaders.comment_fields)):
+    """
+    Top-level comments of the post, each with up to `replies` replies `depth` levels deep.
+    Replies of the whole page come in one query, more_replies continues a cut thread
+    """
+    if not fields.includes("replies"):
+        depth = 0
+    comments = await services.comment_crud.get_post_threads(
+        db=db, post_id=id, skip=0 if page.enabled else skip, after=page.after, limit=limit,
+        replies=replies, depth=depth, options=fields.options()
+    )
+    if page.enabled:
+        page.set_next(response, comments, limit)
+    if not comments:
+        raise HTTPException(status_code=404, detail="Comments not found")
+    cache.tag(request, "comments", f"post:{id}")
+    return fields.respond(comments, response)
+
+
 @router.get("/", response_model=List[schemas.PostInResponse])
-def get_list_posts(db: Session = Depends(get_db), common: FilterQueryParams = Depends()):
-    posts = services.post_filters(db=db, skip=common.skip, limit=common.limit, search=common.search,
-                                  tag=common.tag, category=common.category)
+async def get_list_posts(request: Request, response: Response, db: AsyncSession = Depends(get_db),
+                         common: FilterQueryParams = Depends(), page: CursorParams = Depends(),
+                         fields: FieldSet = Depends(loaders.post_fields)):
+    if page.enabled and common.search:
+        raise HTTPException(status_code=400, detail="Search results can't be paginated by cursor")
+    skip = 0 if page.enabled else common.skip
+    posts = await services.post_filters(db=db, skip=skip, limit=common.limit, search=common.search,
+                                        tag=common.tag, tag_mode=common.tag_mode,
+                                        category=common.category, after=page.after,
+                                        options=fields.options(loaders.post_in_response()))
+    if page.enabled:
+        page.set_next(response, posts, common.limit)
     if not posts:
         raise HTTPException(status_code=404, detail="Posts not found")
-    return posts
+    cache.tag(request, "posts", *{tag for post in posts for tag in cache_tags(post)})
+    return fields.respond(posts, response)
 
 
 @router.post("/", response_model=schemas.PostInResponse)
-def create_post(
+async def create_post(
         *,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         schema: schemas.PostCreate,
-        current_user: User = Depends(permission.get_current_active_user),
+        current_user: Principal = Depends(permission.get_current_active_principal),
 ) -> Any:
-    slug = services.generate_slug(schema.title)
-    post_in_db = schemas.PostInDB(**schema.dict(), user_id=current_user.id, slug=slug)
-    post = services.post_crud.create_with_tags_and_category(db=db, post_schema=post_in_db)
+    post_in_db = schemas.PostInDB(**schema.dict(), user_id=current_user.id)
+    post = await services.post_crud.create_with_tags_and_category(db=db, post_schema=post_in_db)
+    if settings.EMAILS_ENABLED and post.category_id is not None:
+        # the post is committed, a broker outage must not turn the request into an error
+        try:
+            task_queue.enqueue(tasks.celery_send_newsletter, post_id=post.id)
+        except Exception:
+            logger.exception(f"Enqueueing the newsletter of post {post.id} failed")
     return post
 
 
-@router.put("/{id}", response_model=schemas.PostUpdate)
-def update_post(
+@router.put("/{id}", response_model=schemas.PostInResponse)
+async def update_post(
         *,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         id: int,
         schema: schemas.PostUpdate,
-        current_user: User = Depends(permission.get_current_active_user),
+        current_user: Principal = Depends(permission.get_current_active_principal),
 ):
-    post = services.post_crud.get(db=db, id=id)
+    post = await services.post_crud.get(db=db, id=id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     if not current_user.is_superuser and (post.user_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    post = services.post_crud.update(db=db, db_obj=post, schema=schema)
+    post = await services.post_crud.update(db=db, db_obj=post, schema=schema,
+                                           options=loaders.post_in_response())
     return post
 
 
 @router.delete("/{id}", response_model=schemas.PostBase)
 async def delete_post(
         *,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         id: int,
-        current_user: User = Depends(permission.get_current_active_user),
+        current_user: Principal = Depends(permission.get_current_active_principal),
 ):
-    post = services.post_crud.get(db=db, id=id)
+    post = await services.post_crud.get(db=db, id=id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     if not current_user.is_superuser and (post.user_id != current_user.id):
         raise HTTPException(status_code=404, detail="Not enough permissions")
-    post = services.post_crud.remove(db=db, id=id)
+    post = await services.post_crud.remove(db=db, id=id)
     return post
@@ -1,54 +1,67 @@
 
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.article import schemas, services
+from app.article import schemas, services, loaders
+from app.base import cache
+from app.base.fields import FieldSet
+from app.base.pagination import CursorParams
 from app.user import permission
 from db.db import get_db
 
-router = APIRouter()
+router = APIRouter(route_class=cache.CachedRoute)
 
 
 @router.get("/{tag_id}", response_model=schemas.TagInResponse)
-def get_tag(*, tag_id: int, db: Session = Depends(get_db)):
-    tag = services.tag_crud.get(db=db, id=tag_id)
+async def get_tag(*, tag_id: int, db: AsyncSession = Depends(get_db), request: Request):
+    tag = await services.tag_crud.get(db=db, id=tag_id)
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
+    cache.tag(request, f"tag:{tag.id}")
     return tag
 
 
 @router.get("/", response_model=List[schemas.TagInResponse])
-def get_list_tag(*, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    tag = services.tag_crud.get_multi(skip=skip, limit=limit, db=db)
+async def get_list_tag(*, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db),
+                       page: CursorParams = Depends(), request: Request, response: Response,
+                       fields: FieldSet = Depends(loaders.tag_fields)):
+    if page.enabled:
+        tag = await services.tag_crud.get_multi_keyset(after=page.after, limit=limit, db=db,
+                                                       options=fields.options())
+        page.set_next(response, tag, limit)
+    else:
+        tag = await services.tag_crud.get_multi(skip=skip, limit=limit, db=db,
+                                                options=fields.options())
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
-    return tag
+    cache.tag(request, "tags")
+    return fields.respond(tag, response)
 
 
 @router.post("/", response_model=schemas.TagCreate,
-             dependencies=[Depends(permission.get_current_active_user)])
-def create_tag(
+             dependencies=[Depends(permission.get_current_active_principal)])
+async def create_tag(
         *,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         schema: schemas.TagCreate,
 ):
-    tag = services.tag_crud.create(db=db, schema=schema)
+    tag = await services.tag_crud.create(db=db, schema=schema)
     return tag
 
 
 @router.put("/{id}", response_model=schemas.TagUpdate,
             dependencies=[Depends(permission.get_current_superuser)])
-def update_tag(
+async def update_tag(
         *,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         id: int,
         schema: schemas.TagUpdate,
 ):
-    tag = services.tag_crud.get(db=db, id=id)
+    tag = await services.tag_crud.get(db=db, id=id)
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
-    tag = services.tag_crud.update(db=db, db_obj=tag, schema=schema)
+    tag = await services.tag_crud.update(db=db, db_obj=tag, schema=schema)
     return tag
 
 
@@ -56,11 +69,11 @@ def update_tag(
                dependencies=[Depends(permission.get_current_superuser)])
 async def delete_tag(
         *,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         id: int,
 ):
-    tag = services.tag_crud.get(db=db, id=id)
+    tag = await services.tag_crud.get(db=db, id=id)
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
-    tag = services.tag_crud.remove(db=db, id=id)
+    tag = await services.tag_crud.remove(db=db, id=id)
     return tag
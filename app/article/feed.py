@@ -0,0 +1,154 @@
+"""
+Feeds of GET /user/me/feed, the newest posts of the accounts a user follows.
+
+A new post is pushed into the timeline_entry rows of the author's followers with one
+INSERT ... SELECT, so reading a feed is a range scan of the reader's timeline. Timelines keep
+about FEED_TIMELINE_LENGTH entries. Accounts with more than FEED_FANOUT_MAX_FOLLOWERS followers
+are not pushed, their posts are pulled on read, a page of each such account the reader follows.
+Either way a page costs a few index range scans of `limit` rows, whatever the number of
+accounts the reader follows.
+"""
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, delete, func, literal, select, true, tuple_, union, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Load
+from sqlalchemy.sql import Delete
+
+from app.base.pagination import Cursor, keyset
+from app.base.sql import insert_ignore
+from app.user.models import User, user_to_user
+from config import settings
+from .models import Post, TimelineEntry
+
+ENTRY_COLUMNS = ["user_id", "post_id", "author_id", "date_created"]
+
+
+def pushed(follower_count: int) -> bool:
+    """Whether posts of an account with follower_count followers are pushed to timelines"""
+    return follower_count <= settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def _trim(user_ids) -> Delete:
+    """Delete timeline entries of user_ids older than the FEED_TIMELINE_LENGTH newest ones"""
+    rank = func.row_number().over(
+        partition_by=TimelineEntry.user_id,
+        order_by=(TimelineEntry.date_created.desc(), TimelineEntry.post_id.desc()),
+    )
+    ranked = select(TimelineEntry.user_id, TimelineEntry.post_id, rank.label("rank")) \
+        .where(TimelineEntry.user_id.in_(user_ids)) \
+        .subquery()
+    oldest = select(ranked.c.user_id, ranked.c.post_id) \
+        .where(ranked.c.rank > settings.FEED_TIMELINE_LENGTH)
+    return delete(TimelineEntry) \
+        .where(tuple_(TimelineEntry.user_id, TimelineEntry.post_id).in_(oldest)) \
+        .execution_options(synchronize_session=False)
+
+
+async def fan_out(db: AsyncSession, post: Post) -> None:
+    """Push post to the timelines of its author's followers, the caller commits"""
+    result = await db.execute(select(User.follower_count).where(User.id == post.user_id))
+    follower_count = result.scalar()
+    if not follower_count or not pushed(follower_count):
+        return
+    entries = select(user_to_user.c.follower_id, Post.id, Post.user_id, Post.date_created) \
+        .where(Post.id == post.id, user_to_user.c.followed_id == Post.user_id)
+    await db.execute(insert_ignore(db, TimelineEntry.__table__)
+                     .from_select(ENTRY_COLUMNS, entries))
+    # every post trims the timelines of a different 1/FEED_TRIM_INTERVAL of the followers,
+    # so a timeline is trimmed about once every FEED_TRIM_INTERVAL entries it receives
+    interval = settings.FEED_TRIM_INTERVAL
+    trimmed = select(user_to_user.c.follower_id) \
+        .where(user_to_user.c.followed_id == post.user_id,
+               user_to_user.c.follower_id % interval == post.id % interval)
+    await db.execute(_trim(trimmed))
+
+
+async def fan_out_imported(db: AsyncSession, user_id: int, post_ids: Sequence[int]) -> None:
+    """
+    Push a batch of imported posts of user_id to its followers' timelines with one
+    INSERT ... SELECT, the caller commits
+    """
+    result = await db.execute(select(User.follower_count).where(User.id == user_id))
+    follower_count = result.scalar()
+    if not follower_count or not pushed(follower_count) or not post_ids:
+        return
+    entries = select(user_to_user.c.follower_id, Post.id, Post.user_id, Post.date_created) \
+        .where(Post.id.in_(post_ids), user_to_user.c.followed_id == Post.user_id)
+    await db.execute(insert_ignore(db, TimelineEntry.__table__)
+                     .from_select(ENTRY_COLUMNS, entries))
+    # a batch brings every follower more entries than FEED_TRIM_INTERVAL, trim them all
+    followers = select(user_to_user.c.follower_id).where(user_to_user.c.followed_id == user_id)
+    await db.execute(_trim(followers))
+
+
+async def follow(db: AsyncSession, follower_id: int, follower_counts: Dict[int, int]) -> None:
+    """
+    Copy the recent posts of newly followed accounts, follower_counts maps their ids to their
+    follower counts, into the timeline of follower_id. The caller commits
+    """
+    author_ids = [id for id, count in follower_counts.items() if pushed(count)]
+    if not author_ids:
+        return
+    pages = [
+        select(select(Post.id, Post.user_id, Post.date_created)
+               .where(Post.user_id == author_id)
+               .order_by(Post.date_created.desc(), Post.id.desc())
+               .limit(settings.FEED_FOLLOW_BACKFILL)
+               .subquery())
+        for author_id in author_ids
+    ]
+    recent = (union_all(*pages) if len(pages) > 1 else pages[0]).subquery()
+    # SQLite parses ON CONFLICT after INSERT ... SELECT only when the SELECT has a WHERE
+    entries = select(literal(follower_id), recent.c.id, recent.c.user_id, recent.c.date_created) \
+        .where(true())
+    await db.execute(insert_ignore(db, TimelineEntry.__table__)
+                     .from_select(ENTRY_COLUMNS, entries))
+    await db.execute(_trim([follower_id]))
+
+
+async def unfollow(db: AsyncSession, follower_id: int, followed_ids: Sequence[int]) -> None:
+    """Remove the posts of unfollowed accounts from the timeline, the caller commits"""
+    await db.execute(delete(TimelineEntry)
+                     .where(TimelineEntry.user_id == follower_id,
+                            TimelineEntry.author_id.in_(followed_ids))
+                     .execution_options(synchronize_session=False))
+
+
+async def remove_post(db: AsyncSession, post_id: int) -> None:
+    """Remove a deleted post from every timeline, the caller commits"""
+    await db.execute(delete(TimelineEntry)
+                     .where(TimelineEntry.post_id == post_id)
+                     .execution_options(synchronize_session=False))
+
+
+async def read(db: AsyncSession, user_id: int, *, after: Optional[Cursor] = None,
+               limit: int = 20, options: Sequence[Load] = ()) -> List[Post]:
+    """Page of the feed of user_id, newest first, `after` continues from a cursor"""
+    pages = [keyset(select(TimelineEntry.post_id.label("id"),
+                           TimelineEntry.date_created.label("date_created"))
+                    .where(TimelineEntry.user_id == user_id),
+                    TimelineEntry.date_created, TimelineEntry.post_id, after).limit(limit)]
+    # followed accounts which are not pushed, few since it takes that many followers; the
+    # follower_count index finds them and the user_to_user primary key checks each one
+    pulled = await db.execute(
+        select(User.id)
+        .join(user_to_user, and_(user_to_user.c.followed_id == User.id,
+                                 user_to_user.c.follower_id == user_id))
+        .where(User.follower_count > settings.FEED_FANOUT_MAX_FOLLOWERS)
+    )
+    for author_id in pulled.scalars():
+        pages.append(keyset(select(Post.id, Post.date_created).where(Post.user_id == author_id),
+                            Post.date_created, Post.id, after).limit(limit))
+    # a post pushed before its author passed the threshold may be in two pages, union dedupes
+    pages = [select(page.subquery()) for page in pages]
+    merged = (union(*pages) if len(pages) > 1 else pages[0]).subquery()
+    result = await db.execute(select(merged.c.id)
+                              .order_by(merged.c.date_created.desc(), merged.c.id.desc())
+                              .limit(limit))
+    ids = result.scalars().all()
+    if not ids:
+        return []
+    result = await db.execute(select(Post).options(*options).where(Post.id.in_(ids)))
+    posts = {post.id: post for post in result.scalars().all()}
+    return [posts[id] for id in ids if id in posts]
@@ -0,0 +1,71 @@
+from enum import Enum
+from typing import List, Optional
+
+from sqlalchemy import distinct, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from app.base.pagination import Cursor, keyset
+from .models import Post, Tag, post_tag
+from .search import full_text_search
+
+
+class TagMode(str, Enum):
+    any = "any"
+    all = "all"
+
+
+def _tagged_post_ids(names: List[str], mode: TagMode):
+    """
+    Ids of posts having any (or all) of tag names.
+    The subquery is not correlated, so it is resolved once through ix_tag_name
+    and ix_post_tag_tag_id_post_id instead of probing post_tag for every post
+    """
+    query = select(post_tag.c.post_id) \
+        .join(Tag, Tag.id == post_tag.c.tag_id) \
+        .where(Tag.name.in_(names))
+    if mode == TagMode.all:
+        query = query \
+            .group_by(post_tag.c.post_id) \
+            .having(func.count(distinct(Tag.name)) == len(set(names)))
+    return query
+
+
+class PostQuery:
+    """
+    Composable filters for listing posts.
+    Every filter narrows the result (filters are AND-ed) and tags are matched by
+    a semi-join, so each post comes back once and limit counts posts, not post/tag pairs
+    """
+
+    def __init__(self, db: AsyncSession, query: Optional[Select] = None):
+        self.query = query if query is not None else select(Post)
+        self.dialect = db.bind.dialect.name
+        self._search: Optional[str] = None
+
+    def active(self) -> "PostQuery":
+        self.query = self.query.filter_by(is_active=True)
+        return self
+
+    def category(self, category_id: Optional[int]) -> "PostQuery":
+        if category_id:
+            self.query = self.query.filter(Post.category_id == category_id)
+        return self
+
+    def tags(self, names: Optional[List[str]], mode: TagMode = TagMode.any) -> "PostQuery":
+        if names:
+            self.query = self.query.filter(Post.id.in_(_tagged_post_ids(names, mode)))
+        return self
+
+    def search(self, search: Optional[str]) -> "PostQuery":
+        """Order by full-text relevance instead of date, see search.full_text_search"""
+        self._search = search or None
+        return self
+
+    def page(self, *, skip: int = 0, limit: int = 100, after: Optional[Cursor] = None) -> Select:
+        """Final query with ordering and pagination applied"""
+        if self._search:
+            query = full_text_search(self.query, self._search, self.dialect)
+        else:
+            query = keyset(self.query, Post.date_created, Post.id, after)
+        return query.offset(skip).limit(limit)
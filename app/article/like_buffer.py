@@ -0,0 +1,245 @@
+"""
+Write-behind buffer for like/unlike.
+
+Events are kept per (user_id, post_id), only the last one matters, and a background
+task writes them to post_like in batches. Pending events stay visible through
+`liked` and `count` until they are committed, so a user always reads their own likes.
+"""
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.base.sql import insert_ignore
+from config import settings
+from db.db import AsyncSessionLocal
+from . import services
+from .models import PostLike
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[int, int]
+
+
+class LikeBuffer(ABC):
+    """Pending like state per (user_id, post_id), True for like and False for unlike"""
+
+    @abstractmethod
+    async def add(self, user_id: int, post_id: int, liked: bool) -> None:
+        pass
+
+    @abstractmethod
+    async def state(self, user_id: int, post_id: int) -> Optional[bool]:
+        pass
+
+    @abstractmethod
+    async def post_events(self, post_id: int) -> Dict[int, bool]:
+        """Pending like state of post_id per user_id"""
+
+    @abstractmethod
+    async def pending(self) -> Dict[Key, bool]:
+        pass
+
+    @abstractmethod
+    async def discard(self, flushed: Dict[Key, bool]) -> None:
+        """Forget flushed events unless they were overwritten during the flush"""
+
+    @abstractmethod
+    async def size(self) -> int:
+        pass
+
+
+class MemoryLikeBuffer(LikeBuffer):
+    """Buffer of a single worker process"""
+
+    def __init__(self):
+        self._events: Dict[Key, bool] = {}
+
+    async def add(self, user_id: int, post_id: int, liked: bool) -> None:
+        self._events[(user_id, post_id)] = liked
+
+    async def state(self, user_id: int, post_id: int) -> Optional[bool]:
+        return self._events.get((user_id, post_id))
+
+    async def post_events(self, post_id: int) -> Dict[int, bool]:
+        return {user_id: liked for (user_id, id), liked in self._events.items() if id == post_id}
+
+    async def pending(self) -> Dict[Key, bool]:
+        return dict(self._events)
+
+    async def discard(self, flushed: Dict[Key, bool]) -> None:
+        for key, liked in flushed.items():
+            if self._events.get(key) is liked:
+                del self._events[key]
+
+    async def size(self) -> int:
+        return len(self._events)
+
+
+# HDEL fields of KEYS[1] only if they still hold the flushed value
+DISCARD_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+"""
+
+
+class RedisLikeBuffer(LikeBuffer):
+    """Buffer shared by all workers, events are fields "user_id:post_id" of one hash"""
+
+    def __init__(self, client, key: str = "likes:pending"):
+        self.client = client
+        self.key = key
+        self._discard = client.register_script(DISCARD_SCRIPT)
+
+    async def add(self, user_id: int, post_id: int, liked: bool) -> None:
+        await self.client.hset(self.key, f"{user_id}:{post_id}", int(liked))
+
+    async def state(self, user_id: int, post_id: int) -> Optional[bool]:
+        value = await self.client.hget(self.key, f"{user_id}:{post_id}")
+        return None if value is None else value == b"1"
+
+    async def post_events(self, post_id: int) -> Dict[int, bool]:
+        events = {}
+        async for field, value in self.client.hscan_iter(self.key, match=f"*:{post_id}"):
+            events[int(field.split(b":")[0])] = value == b"1"
+        return events
+
+    async def pending(self) -> Dict[Key, bool]:
+        events = {}
+        for field, value in (await self.client.hgetall(self.key)).items():
+            user_id, post_id = field.split(b":")
+            events[(int(user_id), int(post_id))] = value == b"1"
+        return events
+
+    async def discard(self, flushed: Dict[Key, bool]) -> None:
+        args = []
+        for (user_id, post_id), liked in flushed.items():
+            args += [f"{user_id}:{post_id}", int(liked)]
+        if args:
+            await self._discard(keys=[self.key], args=args)
+
+    async def size(self) -> int:
+        return await self.client.hlen(self.key)
+
+
+async def flush(db: AsyncSession, buffer: LikeBuffer) -> int:
+    """Write pending events in one transaction, return number of flushed events"""
+    events = await buffer.pending()
+    if not events:
+        return 0
+    likes = [{"user_id": user_id, "post_id": post_id}
+             for (user_id, post_id), liked in events.items() if liked]
+    unlikes: Dict[int, List[int]] = {}
+    for (user_id, post_id), liked in events.items():
+        if not liked:
+            unlikes.setdefault(user_id, []).append(post_id)
+
+    if likes:
+        await db.execute(insert_ignore(db, PostLike.__table__), likes)
+    if unlikes:
+        await db.execute(delete(PostLike).where(or_(*(
+            and_(PostLike.user_id == user_id, PostLike.post_id.in_(post_ids))
+            for user_id, post_ids in unlikes.items()
+        ))))
+    # inserts and deletes are idempotent, so counters are recounted rather than adjusted
+    await services.reconcile_like_counts(db, post_ids=list({post_id for _, post_id in events}))
+    await buffer.discard(events)
+    return len(events)
+
+
+class LikeFlusher:
+    """Background task flushing buffer every `interval` seconds or at `max_size` events"""
+
+    def __init__(self, buffer: LikeBuffer, session_factory: Callable[[], AsyncSession],
+                 interval: float = settings.LIKE_BUFFER_FLUSH_INTERVAL,
+                 max_size: int = settings.LIKE_BUFFER_MAX_SIZE):
+        self.buffer = buffer
+        self.session_factory = session_factory
+        self.interval = interval
+        self.max_size = max_size
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def notify(self) -> None:
+        """Called after add(), flushes early when the buffer is full"""
+        if self._wakeup is not None and await self.buffer.size() >= self.max_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        async with self.session_factory() as db:
+            try:
+                return await flush(db, self.buffer)
+            except Exception:
+                await db.rollback()
+                logger.exception("Flushing likes failed, events are kept for the next flush")
+                return 0
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        """Start flushing in the running event loop"""
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+def create_like_buffer() -> Optional[LikeBuffer]:
+    if settings.LIKE_BUFFER_BACKEND == "memory":
+        return MemoryLikeBuffer()
+    if settings.LIKE_BUFFER_BACKEND == "redis":
+        from redis import asyncio as aioredis
+        return RedisLikeBuffer(aioredis.Redis.from_url(settings.REDIS_URL))
+    return None
+
+
+# None when like/unlike are written straight to the database
+buffer = create_like_buffer()
+flusher = LikeFlusher(buffer, AsyncSessionLocal) if buffer is not None else None
+
+
+async def push(user_id: int, post_id: int, liked: bool) -> None:
+    await buffer.add(user_id, post_id, liked)
+    await flusher.notify()
+
+
+async def liked(db: AsyncSession, user_id: int, post_id: int) -> bool:
+    """Like state of the user including not yet flushed events"""
+    state = await buffer.state(user_id, post_id) if buffer is not None else None
+    if state is None:
+        return await services.has_liked_post(db=db, post_id=post_id, user_id=user_id)
+    return state
+
+
+async def count(db: AsyncSession, post_id: int) -> int:
+    """Like count of the post including not yet flushed events"""
+    count = await services.count_likes(db=db, post_id=post_id)
+    events = await buffer.post_events(post_id) if buffer is not None else {}
+    if not events:
+        return count
+    result = await db.execute(select(PostLike.user_id)
+                              .where(PostLike.post_id == post_id,
+                                     PostLike.user_id.in_(list(events))))
+    stored = set(result.scalars())
+    return count + sum(int(liked) - int(user_id in stored) for user_id, liked in events.items())
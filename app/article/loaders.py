@@ -0,0 +1,49 @@
+from typing import List
+
+from sqlalchemy.orm import Load, joinedload, selectinload, noload
+
+from app.base.fields import Projection
+from config import settings
+from . import schemas
+from .models import Category, Comment, Post, Tag
+
+
+def comment_replies(loader: Load, depth: int = settings.COMMENT_REPLIES_DEPTH) -> Load:
+    """
+    Chain selectinload on Comment.replies `depth` levels deep.
+    Replies below the last level are not loaded, so a tree costs depth + 1 queries at most
+    """
+    for _ in range(depth):
+        loader = loader.selectinload(Comment.replies)
+    return loader.noload(Comment.replies)
+
+
+def comment_in_response(depth: int = settings.COMMENT_REPLIES_DEPTH) -> List[Load]:
+    """Loader options for schemas.CommentInResponse"""
+    if depth <= 0:
+        return [noload(Comment.replies)]
+    return [comment_replies(selectinload(Comment.replies), depth=depth - 1)]
+
+
+def post_in_response() -> List[Load]:
+    """Loader options for schemas.PostInResponse"""
+    return [
+        joinedload(Post.category),
+        selectinload(Post.tag),
+    ]
+
+
+# sparse fieldsets of the list endpoints, date_created is the keyset pagination column
+post_fields = Projection(
+    schemas.PostInResponse, Post,
+    relationships={"category": joinedload(Post.category), "tag": selectinload(Post.tag)},
+    # category_id for the cache tags
+    required=("id", "date_created", "category_id"),
+)
+# the rest of Comment is needed to assemble threads
+comment_fields = Projection(
+    schemas.CommentInResponse, Comment,
+    required=("id", "date_created", "parent_id", "thread_id", "path"),
+)
+category_fields = Projection(schemas.CategoryInResponse, Category, required=("id", "date_created"))
+tag_fields = Projection(schemas.TagInResponse, Tag, required=("id", "date_created"))
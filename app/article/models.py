@@ -1,16 +1,21 @@
-from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey, Table, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey, Table, Boolean, Index
 from sqlalchemy.orm import relationship, backref
 
 from app.user.models import User
 from db.db import Base
+from db.types import Timestamp
 
 
 class Category(Base):
     __tablename__ = "category"
+    __table_args__ = (
+        Index("ix_category_date_created_id", "date_created", "id"),
+        Index("ix_category_slug", "slug", unique=True),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True, unique=True)
     slug = Column(String(255))
     name = Column(String(200))
-    date_created = Column(DateTime(timezone=True), server_default=func.now())
+    date_created = Column(Timestamp(timezone=True), server_default=func.now())
     date_updated = Column(DateTime(timezone=True), onupdate=func.now())
 
     user_id = Column(Integer, ForeignKey("user.id"))
@@ -23,14 +28,25 @@ class Category(Base):
 
 class Post(Base):
     __tablename__ = "post"
+    __table_args__ = (
+        Index("ix_post_date_created_id", "date_created", "id"),
+        Index("ix_post_category_id_date_created", "category_id", "date_created"),
+        Index("ix_post_is_active_date_created", "is_active", "date_created"),
+        # posts of an author for the feeds, see feed.py
+        Index("ix_post_user_id_date_created_id", "user_id", "date_created", "id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True, unique=True)
     slug = Column(String, unique=True)
     title = Column(String(255))
     text = Column(String)
-    date_created = Column(DateTime(timezone=True), server_default=func.now())
+    date_created = Column(Timestamp(timezone=True), server_default=func.now())
     date_updated = Column(DateTime(timezone=True), onupdate=func.now())
     is_active = Column(Boolean, default=True)
+    # denormalized count of PostLike rows, maintained by services.like / unlike
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # denormalized count of Comment rows, maintained by services.CRUDComment
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     user_id = Column(Integer, ForeignKey("user.id"))
     user = relationship(User, back_populates="post")
@@ -47,14 +63,24 @@ class Post(Base):
 
 class Comment(Base):
     __tablename__ = "comment"
+    __table_args__ = (
+        Index("ix_comment_parent_id_date_created_id", "parent_id", "date_created", "id"),
+        Index("ix_comment_thread_id_path", "thread_id", "path"),
+        Index("ix_comment_post_id_parent_id_date_created_id",
+              "post_id", "parent_id", "date_created", "id"),
+    )
 
     id = Column(Integer, primary_key=True, unique=True, autoincrement=True)
     text = Column(String)
     is_active = Column(Boolean, default=True)
-    date_created = Column(DateTime(timezone=True), server_default=func.now())
+    date_created = Column(Timestamp(timezone=True), server_default=func.now())
 
     parent_id = Column(Integer, ForeignKey('comment.id'))
     replies = relationship('Comment', backref=backref('parent', remote_side=[id]))
+    # place in the thread, maintained by services.CRUDComment.create, see threads.py
+    thread_id = Column(Integer)
+    path = Column(String)
+    depth = Column(Integer, nullable=False, default=0, server_default="0")
 
     user_id = Column(Integer, ForeignKey("user.id"))
     user = relationship("User", back_populates="comment")
@@ -65,6 +91,7 @@ class Comment(Base):
 
 class PostLike(Base):
     __tablename__ = 'post_like'
+    __table_args__ = (Index("ix_post_like_user_id_post_id", "user_id", "post_id", unique=True),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
 
@@ -74,10 +101,11 @@ class PostLike(Base):
 
 class Tag(Base):
     __tablename__ = "tag"
+    __table_args__ = (Index("ix_tag_date_created_id", "date_created", "id"),)
 
     id = Column(Integer, primary_key=True, unique=True, autoincrement=True)
-    name = Column(String(50))
-    date_created = Column(DateTime(timezone=True), server_default=func.now())
+    name = Column(String(50), index=True)
+    date_created = Column(Timestamp(timezone=True), server_default=func.now())
 
     post = relationship('Post', secondary="post_tag", back_populates='tag')
 
@@ -85,5 +113,37 @@ class Tag(Base):
 post_tag = Table(
     'post_tag', Base.metadata,
     Column("post_id", Integer, ForeignKey("post.id"), primary_key=True),
-    Column("tag_id", Integer, ForeignKey("tag.id"), primary_key=True)
+    Column("tag_id", Integer, ForeignKey("tag.id"), primary_key=True),
+    # the primary key covers lookups by post, this one covers lookups by tag
+    Index("ix_post_tag_tag_id_post_id", "tag_id", "post_id"),
 )
+
+
+class SlugAlias(Base):
+    """Former slug of a post or category, requests for it are redirected to the current one"""
+    __tablename__ = "slug_alias"
+    __table_args__ = (
+        Index("ix_slug_alias_kind_slug", "kind", "slug", unique=True),
+        Index("ix_slug_alias_kind_target_id", "kind", "target_id"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # __tablename__ of the target model
+    kind = Column(String(20), nullable=False)
+    slug = Column(String(255), nullable=False)
+    target_id = Column(Integer, nullable=False)
+    date_created = Column(Timestamp(timezone=True), server_default=func.now())
+
+
+class TimelineEntry(Base):
+    """Post of a followed account in the feed of user_id, written on post creation, see feed.py"""
+    __tablename__ = "timeline_entry"
+    __table_args__ = (
+        Index("ix_timeline_entry_user_id_date_created_post_id",
+              "user_id", "date_created", "post_id"),
+        Index("ix_timeline_entry_post_id", "post_id"),
+    )
+    user_id = Column(Integer, ForeignKey("user.id"), primary_key=True)
+    post_id = Column(Integer, ForeignKey("post.id"), primary_key=True)
+    author_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+    # Post.date_created, the feed is ordered by it
+    date_created = Column(Timestamp(timezone=True), nullable=False)
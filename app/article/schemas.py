@@ -3,6 +3,8 @@ from typing import List, Optional
 
 from pydantic import BaseModel
 
+from app.base import serializers
+
 
 # Comment
 class CommentBase(BaseModel):
@@ -27,8 +29,11 @@ class CommentInDB(CommentBase):
 
 class CommentInResponse(CommentBase):
     id: int
+    parent_id: Optional[int] = None
     date_created: datetime
     replies: List['CommentInResponse'] = []
+    # cursor of GET /comment/{id}/replies when the thread has more replies than were loaded
+    more_replies: Optional[str] = None
 
 
 CommentInResponse.update_forward_refs()
@@ -77,7 +82,8 @@ class CategoryUpdate(CategoryBase):
 
 class CategoryInDB(CategoryBase):
     user_id: int
-    slug: str
+    # allocated from the name on create
+    slug: Optional[str] = None
 
 
 class CategoryInResponse(CategoryBase):
@@ -106,25 +112,56 @@ class PostUpdate(PostBase):
 
 
 class PostInDB(PostBase):
-    slug: str
+    # allocated from the title on create
+    slug: Optional[str] = None
     user_id: int
     category: int
     tag: Optional[List[str]] = None
 
 
+class PostImport(PostCreate):
+    """Line of the NDJSON post import, the format of the export"""
+    slug: Optional[str] = None
+    is_active: Optional[bool] = True
+    date_created: Optional[datetime] = None
+
+
+class ImportLineError(BaseModel):
+    line: int
+    detail: str
+
+
+class ImportResult(BaseModel):
+    imported: int = 0
+    failed: int = 0
+    # the first POST_IMPORT_MAX_ERRORS failed lines
+    errors: List[ImportLineError] = []
+
+
 class PostInResponse(PostBase):
     id: str
+    slug: str
     date_created: datetime
     category: Optional[CategoryInResponse]
     tag: Optional[List[TagInResponse]] = None
-    comment: Optional[List[CommentInResponse]] = None
+    # the comments themselves are paged by GET /post/{id}/comments
+    comment_count: int = 0
+    like_count: int = 0
+    # filled in for full-text search results only
+    rank: Optional[float] = None
+    snippet: Optional[str] = None
 
 
 # Like
 class Like(BaseModel):
-    id: int
+    # None while the like waits in the write-behind buffer
+    id: Optional[int] = None
     user_id: int
     post_id: int
 
     class Config:
         orm_mode = True
+
+
+# the responses of the hot reads skip response_model validation, see app/base/serializers.py
+serializers.register(PostInResponse, CommentInResponse, CategoryInResponse, TagInResponse)
@@ -0,0 +1,104 @@
+import html
+import re
+from typing import List, Optional
+
+from sqlalchemy import DDL, event, false, func, literal_column, column, table
+from sqlalchemy.sql import Select
+
+from .models import Post
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5("
+    "title, text, content='post', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS post_fts_insert AFTER INSERT ON post BEGIN "
+    "INSERT INTO post_fts(rowid, title, text) VALUES (new.id, new.title, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS post_fts_delete AFTER DELETE ON post BEGIN "
+    "INSERT INTO post_fts(post_fts, rowid, title, text) "
+    "VALUES ('delete', old.id, old.title, old.text); END",
+    "CREATE TRIGGER IF NOT EXISTS post_fts_update AFTER UPDATE OF title, text ON post BEGIN "
+    "INSERT INTO post_fts(post_fts, rowid, title, text) "
+    "VALUES ('delete', old.id, old.title, old.text); "
+    "INSERT INTO post_fts(rowid, title, text) VALUES (new.id, new.title, new.text); END",
+]
+
+POSTGRES_DDL = [
+    "ALTER TABLE post ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(text, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_post_search_vector ON post USING gin (search_vector)",
+]
+
+# full-text objects live outside of the ORM metadata, autogenerate must not drop them
+UNMAPPED_OBJECTS = {"post_fts", "search_vector", "ix_post_search_vector"}
+
+for statement in SQLITE_DDL:
+    event.listen(Post.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRES_DDL:
+    event.listen(Post.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+post_fts = table("post_fts", column("rowid"))
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+# private use characters the database puts around matches, so the text can be escaped first
+_MATCH_START = "\ue000"
+_MATCH_END = "\ue001"
+
+
+def is_search_object(name: str) -> bool:
+    return name in UNMAPPED_OBJECTS or name.startswith("post_fts_")
+
+
+def highlight(snippet: Optional[str]) -> Optional[str]:
+    """HTML of a snippet of the database, the post text escaped and matches in <mark>"""
+    if snippet is None:
+        return None
+    return html.escape(snippet) \
+        .replace(_MATCH_START, HIGHLIGHT_START) \
+        .replace(_MATCH_END, HIGHLIGHT_END)
+
+
+def terms(search: str) -> List[str]:
+    """Split user input into words, so it can not break MATCH / tsquery syntax"""
+    return re.findall(r"\w+", search)
+
+
+def _sqlite_search(query: Select, words: List[str]) -> Select:
+    # every word is quoted and words are implicitly AND-ed, the last one matches as a prefix
+    match = " ".join(f'"{word}"' for word in words) + "*"
+    fts = literal_column("post_fts")
+    # bm25() is lower for better matches, title hits weigh ten times more than text hits
+    rank = -func.bm25(fts, 10.0, 1.0)
+    snippet = func.snippet(fts, -1, _MATCH_START, _MATCH_END, "…", 16)
+    return query \
+        .join(post_fts, post_fts.c.rowid == Post.id) \
+        .filter(fts.op("MATCH")(match)) \
+        .add_columns(rank.label("rank"), snippet.label("snippet")) \
+        .order_by(rank.desc())
+
+
+def _postgres_search(query: Select, words: List[str]) -> Select:
+    tsquery = func.plainto_tsquery("english", " ".join(words))
+    search_vector = literal_column("post.search_vector")
+    rank = func.ts_rank(search_vector, tsquery)
+    snippet = func.ts_headline(
+        "english", Post.text, tsquery,
+        f"StartSel={_MATCH_START}, StopSel={_MATCH_END}, MaxFragments=1",
+    )
+    return query \
+        .filter(search_vector.op("@@")(tsquery)) \
+        .add_columns(rank.label("rank"), snippet.label("snippet")) \
+        .order_by(rank.desc())
+
+
+def full_text_search(query: Select, search: str, dialect: str) -> Select:
+    """
+    Restrict query of Post to full-text matches ordered by relevance.
+    Rows become (Post, rank, snippet) tuples, highlight() turns snippet into HTML
+    """
+    words = terms(search)
+    if not words:
+        return query.filter(false()).add_columns(literal_column("0"), literal_column("''"))
+    if dialect == "postgresql":
+        return _postgres_search(query, words)
+    return _sqlite_search(query, words)
@@ -1,51 +1,202 @@
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple
 
-from fastapi.encoders import jsonable_encoder
-from slugify import slugify
-from sqlalchemy import or_
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, exists, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Load
+from sqlalchemy.sql import Select
 
-from app.article import schemas
+from app.article import schemas, loaders, feed, threads
 from .models import PostLike, Tag, Post, Comment, Category
-from app.base.crud import CRUDBase
+from .slugs import SlugMixin
+from app.base import cache
+from app.base.crud import AsyncCRUDBase
+from app.base.pagination import Cursor, keyset
+from app.base.sql import insert_ignore
+from .filters import PostQuery, TagMode
+from .search import highlight
+from config import settings
 
 
-class CRUDPost(CRUDBase[Post, schemas.PostCreate, schemas.PostUpdate]):
+class CRUDPost(SlugMixin, AsyncCRUDBase[Post, schemas.PostCreate, schemas.PostUpdate]):
     """CRUD for Post"""
-
-    def create_with_tags_and_category(self, db: Session, *,
-                                      post_schema: schemas.PostCreate) -> Post:
-        """Create post with user and tags"""
-        tags = tag_crud.get_or_create_tag_objects(db=db, tags=post_schema.tag)
-        category = category_crud.get(db=db, id=post_schema.category)
-        data = jsonable_encoder(post_schema, exclude={"tag", "category"})
-        print(tags)
-        print(category)
-        db_post = self.model(**data, tag=tags, category=category)
-        db.add(db_post)
-        db.commit()
-        db.refresh(db_post)
+    slug_source = "title"
+
+    def cache_tags(self, db_obj: Post) -> List[str]:
+        return ["posts", f"post:{db_obj.id}"]
+
+    async def remove(self, db: AsyncSession, options: Sequence[Load] = (), **kwargs) -> Post:
+        if "id" in kwargs:
+            await feed.remove_post(db, kwargs["id"])
+        return await super().remove(db, options=options, **kwargs)
+
+    async def create_with_tags_and_category(self, db: AsyncSession, *,
+                                            post_schema: schemas.PostCreate) -> Post:
+        """Create post with user and tags, the slug is allocated from the title"""
+        data = post_schema.dict(exclude={"tag", "category", "slug"})
+
+        async def make() -> Post:
+            tags = await tag_crud.get_or_create_tag_objects(db=db, tags=post_schema.tag)
+            category = await category_crud.get(db=db, id=post_schema.category)
+            return self.model(**data, tag=tags, category=category)
+
+        db_post = await self.add_with_slug(db, make, options=loaders.post_in_response())
+        await feed.fan_out(db, db_post)
+        await db.commit()
+        await cache.invalidate("posts", *(["tags"] if post_schema.tag else []))
         return db_post
 
 
-class CRUDComment(CRUDBase[Comment, schemas.CommentCreate, schemas.CommentUpdate]):
+class CRUDComment(AsyncCRUDBase[Comment, schemas.CommentCreate, schemas.CommentUpdate]):
     """CRUD for Comment"""
 
-    def get_without_parent(self, db: Session, id: int):
-        return db.query(self.model).filter_by(parent=None).filter(self.model.id == id).first()
-
-    def get_multi_without_parent(self, db: Session, *, skip: int = 0, limit: int = 100):
-        return db.query(self.model).filter_by(parent=None).offset(skip).limit(limit).all()
-
-
-class CRUDTag(CRUDBase[Tag, schemas.TagCreate, schemas.TagUpdate]):
+    def cache_tags(self, db_obj: Comment) -> List[str]:
+        # replies are nested in the responses of their ancestors, so comments share one tag
+        return ["comments", f"post:{db_obj.post_id}"]
+
+    async def create(self, db: AsyncSession, *, schema: schemas.CommentInDB,
+                     parent: Optional[Comment] = None, options: Sequence[Load] = ()) -> Comment:
+        """Create comment, a reply to parent if given, with its place in the thread"""
+        db_obj = self.model(**schema.dict())
+        if parent is not None:
+            db_obj.parent_id = parent.id
+        db.add(db_obj)
+        # the path ends with the id the INSERT assigns
+        await db.flush()
+        db_obj.path = threads.child_path(parent.path if parent else None, db_obj.id)
+        db_obj.depth = parent.depth + 1 if parent else 0
+        db_obj.thread_id = parent.thread_id if parent else db_obj.id
+        await db.execute(update(Post)
+                         .where(Post.id == db_obj.post_id)
+                         .values(comment_count=Post.comment_count + 1))
+        await db.commit()
+        db_obj = await self.reload(db, db_obj, options)
+        await cache.invalidate(*self.cache_tags(db_obj))
+        return db_obj
+
+    async def remove(self, db: AsyncSession, options: Sequence[Load] = (), **kwargs) -> Comment:
+        """Delete the comment with its replies at any depth"""
+        obj = await self.get(db, options=options, **kwargs)
+        tags = self.cache_tags(obj)
+        result = await db.execute(
+            delete(self.model)
+            .where(self.model.thread_id == obj.thread_id,
+                   or_(self.model.id == obj.id,
+                       self.model.path.startswith(threads.subtree_prefix(obj))))
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(update(Post)
+                         .where(Post.id == obj.post_id)
+                         .values(comment_count=Post.comment_count - result.rowcount))
+        await db.commit()
+        await cache.invalidate(*tags)
+        return obj
+
+    async def get_threads(self, db: AsyncSession, roots: Select,
+                          replies: int = settings.COMMENT_THREAD_REPLIES,
+                          depth: Optional[int] = None,
+                          options: Sequence[Load] = ()) -> List[Comment]:
+        """
+        Top-level comments whose ids `roots` selects, newest first, with the first `replies`
+        replies of every thread down to `depth` levels, all in one query ordered by path.
+        Threads with more replies get more_replies, the cursor of the rest
+        """
+        rank = func.row_number().over(partition_by=self.model.thread_id,
+                                      order_by=self.model.path).label("rank")
+        ranked = select(self.model.id, rank).where(self.model.thread_id.in_(roots))
+        if depth is not None:
+            ranked = ranked.where(self.model.depth <= depth)
+        ranked = ranked.subquery()
+        # the top-level comment is rank 1, one reply over the limit tells that there are more
+        query = select(self.model) \
+            .options(*options) \
+            .join(ranked, ranked.c.id == self.model.id) \
+            .where(ranked.c.rank <= replies + 2) \
+            .order_by(self.model.path) \
+            .add_columns(ranked.c.rank)
+        result = await db.execute(query)
+        comments, last_path, more = [], {}, set()
+        for comment, rank in result.all():
+            if rank > replies + 1:
+                more.add(comment.thread_id)
+                continue
+            comments.append(comment)
+            last_path[comment.thread_id] = comment.path
+        roots = threads.assemble(comments)
+        for root in roots:
+            root.more_replies = last_path[root.id] if root.id in more else None
+        return sorted(roots, key=lambda root: (root.date_created, root.id), reverse=True)
+
+    async def get_without_parent(self, db: AsyncSession, id: int) -> Optional[Comment]:
+        roots = select(self.model.id).filter(self.model.parent_id.is_(None), self.model.id == id)
+        comments = await self.get_threads(db, roots)
+        return comments[0] if comments else None
+
+    async def get_multi_without_parent(self, db: AsyncSession, *, skip: int = 0, limit: int = 100,
+                                       depth: Optional[int] = None,
+                                       options: Sequence[Load] = ()):
+        roots = select(self.model.id) \
+            .filter(self.model.parent_id.is_(None)) \
+            .order_by(self.model.date_created.desc(), self.model.id.desc()) \
+            .offset(skip) \
+            .limit(limit)
+        return await self.get_threads(db, roots, depth=depth, options=options)
+
+    async def get_multi_keyset_without_parent(self, db: AsyncSession, *,
+                                              after: Optional[Cursor] = None, limit: int = 100,
+                                              depth: Optional[int] = None,
+                                              options: Sequence[Load] = ()):
+        roots = select(self.model.id).filter(self.model.parent_id.is_(None))
+        roots = keyset(roots, self.model.date_created, self.model.id, after).limit(limit)
+        return await self.get_threads(db, roots, depth=depth, options=options)
+
+    async def get_post_threads(self, db: AsyncSession, post_id: int, *, skip: int = 0,
+                               after: Optional[Cursor] = None, limit: int = 20,
+                               replies: int = settings.COMMENT_THREAD_REPLIES,
+                               depth: Optional[int] = None,
+                               options: Sequence[Load] = ()) -> List[Comment]:
+        """Page of the top-level comments of post, by offset or after a keyset cursor"""
+        roots = select(self.model.id).filter(self.model.post_id == post_id,
+                                             self.model.parent_id.is_(None))
+        roots = keyset(roots, self.model.date_created, self.model.id, after) \
+            .offset(skip) \
+            .limit(limit)
+        return await self.get_threads(db, roots, replies=replies, depth=depth, options=options)
+
+    async def get_replies(self, db: AsyncSession, comment: Comment, *,
+                          after: Optional[str] = None,
+                          limit: int = settings.COMMENT_THREAD_REPLIES
+                          ) -> Tuple[List[Comment], Optional[str]]:
+        """
+        Replies of comment at any depth which follow the path `after`, as trees, and the cursor
+        of the next page. Replies whose parent is on an earlier page are at the top level
+        """
+        query = select(self.model).filter(
+            self.model.thread_id == comment.thread_id,
+            self.model.path.startswith(threads.subtree_prefix(comment)),
+        )
+        if after is not None:
+            query = query.filter(self.model.path > after)
+        result = await db.execute(query.order_by(self.model.path).limit(limit))
+        replies = result.scalars().all()
+        next_cursor = replies[-1].path if len(replies) == limit else None
+        return threads.assemble(replies), next_cursor
+
+
+class CRUDTag(AsyncCRUDBase[Tag, schemas.TagCreate, schemas.TagUpdate]):
     """CRUD for Tag"""
 
-    def get_or_create_tag_objects(self, db: Session, tags: List[str]) -> List[Tag]:
+    def cache_tags(self, db_obj: Tag) -> List[str]:
+        return ["tags", f"tag:{db_obj.id}"]
+
+    async def get_or_create_tag_objects(self, db: AsyncSession,
+                                        tags: Optional[List[str]]) -> List[Tag]:
         """
         Get list objects Tag or/and create objects Tag if tags does not existing in DB
         """
-        tag_obj_list = db.query(self.model).filter(self.model.name.in_(tags)).all()
+        if not tags:
+            return []
+        result = await db.execute(select(self.model).filter(self.model.name.in_(tags)))
+        tag_obj_list = result.scalars().all()
         # finding the difference between existing tags and non-existent tags
         difference = list(set([tag.name for tag in tag_obj_list]) ^ set([tag for tag in tags]))
         # create new Tag objects in list
@@ -55,8 +206,12 @@ class CRUDTag(CRUDBase[Tag, schemas.TagCreate, schemas.TagUpdate]):
         return tag_obj_list
 
 
-class CRUDCategory(CRUDBase[Category, schemas.CategoryCreate, schemas.CommentUpdate]):
-    pass
+class CRUDCategory(SlugMixin,
+                   AsyncCRUDBase[Category, schemas.CategoryCreate, schemas.CommentUpdate]):
+    slug_source = "name"
+
+    def cache_tags(self, db_obj: Category) -> List[str]:
+        return ["categories", f"category:{db_obj.id}"]
 
 
 # create CRUD object for posts
@@ -72,53 +227,103 @@ tag_crud = CRUDTag(Tag)
 category_crud = CRUDCategory(Category)
 
 
-def like(db: Session, post_id: int, user_id: int):
-    like_post = PostLike(user_id=user_id, post_id=post_id)
-    db.add(like_post)
-    db.commit()
-    db.refresh(like_post)
-    return like_post
-
-
-def unlike(db: Session, post_id: int, user_id: int):
-    unlike_post = db.query(PostLike).filter_by(user_id=user_id, post_id=post_id).first()
-    db.delete(unlike_post)
-    db.commit()
-    return unlike_post
-
-
-def count_likes(db: Session, post_id: int):
-    count = db.query(PostLike).filter_by(post_id=post_id).count()
-    return count
-
-
-def has_liked_post(db: Session, post_id: int, user_id: int):
-    return db.query(PostLike).filter_by(user_id=user_id, post_id=post_id).count() > 0
-
-
-def post_filters(db: Session, skip: int = 0, limit: int = 100, search: str = None,
-                 tag: Optional[List[str]] = None, category: int = None):
+async def like(db: AsyncSession, post_id: int, user_id: int) -> Optional[schemas.Like]:
+    """Like post and increment Post.like_count in one transaction, None if already liked"""
+    result = await db.execute(
+        insert_ignore(db, PostLike.__table__).values(user_id=user_id, post_id=post_id)
+    )
+    if not result.rowcount:
+        await db.rollback()
+        return None
+    await db.execute(update(Post).where(Post.id == post_id).values(like_count=Post.like_count + 1))
+    await db.commit()
+    await cache.invalidate(f"post:{post_id}")
+    return schemas.Like(id=result.inserted_primary_key[0], user_id=user_id, post_id=post_id)
+
+
+async def unlike(db: AsyncSession, post_id: int, user_id: int) -> Optional[schemas.Like]:
+    """Remove like and decrement Post.like_count in one transaction, None if post was not liked"""
+    like_id = await db.scalar(select(PostLike.id).filter_by(user_id=user_id, post_id=post_id))
+    if like_id is None:
+        return None
+    # a concurrent unlike could have deleted the row in the meantime
+    result = await db.execute(delete(PostLike).where(PostLike.id == like_id))
+    if not result.rowcount:
+        await db.rollback()
+        return None
+    await db.execute(update(Post).where(Post.id == post_id).values(like_count=Post.like_count - 1))
+    await db.commit()
+    await cache.invalidate(f"post:{post_id}")
+    return schemas.Like(id=like_id, user_id=user_id, post_id=post_id)
+
+
+async def count_likes(db: AsyncSession, post_id: int) -> int:
+    count = await db.scalar(select(Post.like_count).filter(Post.id == post_id))
+    return count or 0
+
+
+async def has_liked_post(db: AsyncSession, post_id: int, user_id: int) -> bool:
+    return await db.scalar(
+        select(exists().where(PostLike.user_id == user_id, PostLike.post_id == post_id))
+    )
+
+
+async def reconcile_like_counts(db: AsyncSession, post_ids: Optional[List[int]] = None) -> int:
+    """
+    Recount Post.like_count from post_like in bulk, return number of corrected posts.
+    Cached responses are invalidated for `post_ids` only, a full recount leaves them to expire
+    """
+    counted = select(func.count(PostLike.id)) \
+        .where(PostLike.post_id == Post.id) \
+        .scalar_subquery()
+    query = update(Post).where(Post.like_count != counted).values(like_count=counted)
+    if post_ids is not None:
+        query = query.where(Post.id.in_(post_ids))
+    result = await db.execute(query.execution_options(synchronize_session=False))
+    await db.commit()
+    if post_ids is not None:
+        await cache.invalidate(*(f"post:{post_id}" for post_id in post_ids))
+    return result.rowcount
+
+
+async def reconcile_comment_counts(db: AsyncSession, post_ids: Optional[List[int]] = None) -> int:
+    """reconcile_like_counts counterpart for Post.comment_count"""
+    counted = select(func.count(Comment.id)) \
+        .where(Comment.post_id == Post.id) \
+        .scalar_subquery()
+    query = update(Post).where(Post.comment_count != counted).values(comment_count=counted)
+    if post_ids is not None:
+        query = query.where(Post.id.in_(post_ids))
+    result = await db.execute(query.execution_options(synchronize_session=False))
+    await db.commit()
+    if post_ids is not None:
+        await cache.invalidate(*(f"post:{post_id}" for post_id in post_ids))
+    return result.rowcount
+
+
+async def post_filters(db: AsyncSession, skip: int = 0, limit: int = 100, search: str = None,
+                       tag: Optional[List[str]] = None, category: int = None,
+                       after: Optional[Cursor] = None, tag_mode: TagMode = TagMode.any,
+                       options: Optional[Sequence[Load]] = None):
     """
-    Filter Post by title, text, tag and category
+    Filter active Post by title, text, tag and category, all given filters must match.
+    Newest posts go first, `after` continues from a keyset pagination cursor.
+    With `search` posts are ordered by full-text relevance and get `rank` and `snippet`.
+    `options` replace the loader options of PostInResponse
     """
-    list_filters = []
+    if options is None:
+        options = loaders.post_in_response()
+    query = select(Post).options(*options)
+    post_query = PostQuery(db, query) \
+        .active() \
+        .category(category) \
+        .tags(tag, mode=tag_mode) \
+        .search(search) \
+        .page(skip=skip, limit=limit, after=after)
+    result = await db.execute(post_query)
     if search:
-        list_filters.append(Post.title.match(search))
-        list_filters.append(Post.text.match(search))
-    if tag:
-        list_filters.append(Tag.name.in_(tag))
-    if category:
-        list_filters.append(Post.category_id == category)
-
-    filtered_posts = db.query(Post) \
-        .filter(or_(*list_filters)) \
-        .join(Post.tag) \
-        .order_by(Post.date_created.desc()) \
-        .offset(skip) \
-        .limit(limit) \
-        .all()
-    return filtered_posts
-
-
-def generate_slug(text: str):
-    return slugify(text)
+        rows = result.all()
+        for post, rank, snippet in rows:
+            post.rank, post.snippet = rank, highlight(snippet)
+        return [post for post, _, _ in rows]
+    return result.scalars().all()
@@ -0,0 +1,154 @@
+"""
+Unique slugs of posts and categories.
+
+A slug is the slugified title (name), with a -2, -3, ... suffix when that is taken. Taken means
+used by a row or by a slug_alias, the former slugs which redirect to their row, so one query
+over both finds the first free suffix. Unique indexes catch allocations racing each other and
+SlugMixin.add_with_slug retries those.
+"""
+from typing import Awaitable, Callable, List, Optional, Sequence, Set
+
+from slugify import slugify
+from sqlalchemy import and_, delete, or_, select, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Load
+
+from app.base import cache
+from .models import SlugAlias
+
+SLUG_ATTEMPTS = 3
+# SQLite parses a chain of ORs into a tree at most 1000 deep
+BASES_PER_QUERY = 200
+
+
+def base_slug(text: str, default: str) -> str:
+    return slugify(text) or default
+
+
+def _matching(column, bases: List[str], *prefix):
+    """
+    column is a base or a suffixed base. Suffixes are digits, so [base-0, base-:) is an index
+    range holding them. prefix holds equalities on the index columns before column, they are
+    repeated in every term so that each is an index seek
+    """
+    return or_(and_(*prefix, column.in_(bases)),
+               *(and_(*prefix, column >= f"{base}-0", column < f"{base}-:") for base in bases))
+
+
+class SlugAllocator:
+    """
+    Allocates slugs of model rows. Slugs seen taken are remembered, so an allocator used for
+    many batches, like the bulk import, queries every base once
+    """
+
+    def __init__(self, db: AsyncSession, model, target_id: Optional[int] = None):
+        self.db = db
+        self.model = model
+        # aliases of the row being renamed are free for it
+        self.target_id = target_id
+        self.taken: Set[str] = set()
+        self._loaded: Set[str] = set()
+
+    def taken_query(self, bases: List[str]):
+        alias = select(SlugAlias.slug).where(
+            _matching(SlugAlias.slug, bases, SlugAlias.kind == self.model.__tablename__)
+        )
+        if self.target_id is not None:
+            alias = alias.where(SlugAlias.target_id != self.target_id)
+        rows = select(self.model.slug).where(_matching(self.model.slug, bases))
+        if self.target_id is not None:
+            rows = rows.where(self.model.id != self.target_id)
+        return union_all(rows, alias)
+
+    async def allocate(self, bases: Sequence[str]) -> List[str]:
+        unknown = sorted(set(bases) - self._loaded)
+        for i in range(0, len(unknown), BASES_PER_QUERY):
+            result = await self.db.execute(self.taken_query(unknown[i:i + BASES_PER_QUERY]))
+            self.taken.update(result.scalars())
+        self._loaded.update(unknown)
+        slugs = []
+        for base in bases:
+            slug, n = base, 1
+            while slug in self.taken:
+                n += 1
+                slug = f"{base}-{n}"
+            self.taken.add(slug)
+            slugs.append(slug)
+        return slugs
+
+
+async def allocate(db: AsyncSession, model, text: str, target_id: Optional[int] = None) -> str:
+    base = base_slug(text, default=model.__tablename__)
+    return (await SlugAllocator(db, model, target_id).allocate([base]))[0]
+
+
+async def current_slug(db: AsyncSession, model, slug: str) -> Optional[str]:
+    """Slug of the row which used to have `slug`, None if there is none"""
+    return await db.scalar(
+        select(model.slug)
+        .join(SlugAlias, SlugAlias.target_id == model.id)
+        .where(SlugAlias.kind == model.__tablename__, SlugAlias.slug == slug)
+    )
+
+
+class SlugMixin:
+    """
+    AsyncCRUDBase mixin for models whose slug follows the `slug_source` column.
+    Changing the source moves the slug and keeps the old one as an alias
+    """
+    slug_source: str
+
+    async def create(self, db: AsyncSession, *, schema, options: Sequence[Load] = ()):
+        data = schema.dict(exclude={"slug"})
+
+        async def make():
+            return self.model(**data)
+
+        db_obj = await self.add_with_slug(db, make, options)
+        await cache.invalidate(*self.cache_tags(db_obj))
+        return db_obj
+
+    async def add_with_slug(self, db: AsyncSession, make: Callable[[], Awaitable],
+                            options: Sequence[Load] = ()):
+        """Add and commit the object built by make with a free slug"""
+        for attempt in range(SLUG_ATTEMPTS):
+            db_obj = await make()
+            db_obj.slug = await allocate(db, self.model, getattr(db_obj, self.slug_source))
+            db.add(db_obj)
+            try:
+                await db.commit()
+            except IntegrityError:
+                # a concurrent request took the slug
+                await db.rollback()
+                if attempt == SLUG_ATTEMPTS - 1:
+                    raise
+            else:
+                return await self.reload(db, db_obj, options)
+
+    async def update(self, db: AsyncSession, *, db_obj, schema, options: Sequence[Load] = ()):
+        update_data = schema if isinstance(schema, dict) else schema.dict(exclude_unset=True)
+        text = update_data.get(self.slug_source)
+        if text is not None and text != getattr(db_obj, self.slug_source):
+            await self.move_slug(db, db_obj, text)
+        return await super().update(db, db_obj=db_obj, schema=schema, options=options)
+
+    async def move_slug(self, db: AsyncSession, db_obj, text: str) -> None:
+        slug = await allocate(db, self.model, text, target_id=db_obj.id)
+        if slug == db_obj.slug:
+            return
+        kind = self.model.__tablename__
+        # moving back to a former slug, it is no longer an alias
+        await db.execute(delete(SlugAlias).where(
+            SlugAlias.kind == kind, SlugAlias.slug == slug, SlugAlias.target_id == db_obj.id
+        ))
+        if db_obj.slug:
+            db.add(SlugAlias(kind=kind, slug=db_obj.slug, target_id=db_obj.id))
+        db_obj.slug = slug
+
+    async def remove(self, db: AsyncSession, options: Sequence[Load] = (), **kwargs):
+        if "id" in kwargs:
+            await db.execute(delete(SlugAlias).where(
+                SlugAlias.kind == self.model.__tablename__, SlugAlias.target_id == kwargs["id"]
+            ))
+        return await super().remove(db, options=options, **kwargs)
@@ -0,0 +1,50 @@
+"""
+Comment threads stored as materialized paths.
+
+Comment.path is the ids from the top-level comment down to the comment, zero padded and joined
+by "/", so ordering a thread by path lists it depth first, every comment after its parent.
+Comment.thread_id is the id of the top-level comment, (thread_id, path) is indexed, so a page
+of threads is one ordered query which assemble() turns back into trees.
+"""
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .models import Comment
+
+PATH_SEPARATOR = "/"
+SEGMENT_DIGITS = 10
+
+
+def segment(id: int) -> str:
+    # fixed width, so string order of paths is numeric order of ids
+    return str(id).zfill(SEGMENT_DIGITS)
+
+
+def child_path(parent_path: Optional[str], id: int) -> str:
+    if parent_path is None:
+        return segment(id)
+    return f"{parent_path}{PATH_SEPARATOR}{segment(id)}"
+
+
+def subtree_prefix(comment: Comment) -> str:
+    """Paths of the replies of comment, at any depth, start with this"""
+    return comment.path + PATH_SEPARATOR
+
+
+def assemble(comments: Sequence[Comment]) -> List[Comment]:
+    """
+    Set Comment.replies from comments ordered by path and return the ones whose parent is not
+    among them. The replies are set as loaded values, the session sees no change
+    """
+    replies: Dict[int, List[Comment]] = {comment.id: [] for comment in comments}
+    roots = []
+    for comment in comments:
+        siblings = replies.get(comment.parent_id)
+        if siblings is None:
+            roots.append(comment)
+        else:
+            siblings.append(comment)
+    for comment in comments:
+        set_committed_value(comment, "replies", replies[comment.id])
+    return roots
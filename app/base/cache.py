@@ -0,0 +1,243 @@
+"""
+Response cache for anonymous GET endpoints.
+
+Routers opt in with `APIRouter(route_class=CachedRoute)`. An endpoint marks its response
+cacheable by tagging it with `tag(request, "post:1", ...)`; untagged responses are never stored.
+Tags are built from ids, never from names, and reach the route in request.state.
+Entries are keyed by path and the query parameters the route declares, and are dropped by
+`invalidate(*tags)` which services call after writes. Every cached response carries an ETag
+and a matching If-None-Match is answered with 304 before the endpoint runs.
+"""
+import hashlib
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+from fastapi.dependencies.utils import get_flat_dependant
+
+from app.base.routing import SerializingRoute
+from config import settings
+
+CACHE_STATUS_HEADER = "X-Cache"
+# headers which are not replayed from a cached response
+UNCACHED_HEADERS = {"content-length", "set-cookie", "date"}
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    media_type: Optional[str]
+    headers: List[Tuple[str, str]]
+
+    @classmethod
+    def from_response(cls, response: Response) -> "CachedResponse":
+        headers = [(name, value) for name, value in response.headers.items()
+                   if name not in UNCACHED_HEADERS]
+        return cls(body=response.body, etag=etag(response.body),
+                   media_type=response.media_type, headers=headers)
+
+    def to_response(self, status: str) -> Response:
+        response = Response(content=self.body, media_type=self.media_type)
+        for name, value in self.headers:
+            response.headers[name] = value
+        response.headers["ETag"] = self.etag
+        response.headers[CACHE_STATUS_HEADER] = status
+        return response
+
+    def to_json(self) -> bytes:
+        return json.dumps({
+            "body": self.body.decode(), "etag": self.etag,
+            "media_type": self.media_type, "headers": self.headers,
+        }).encode()
+
+    @classmethod
+    def from_json(cls, data: bytes) -> "CachedResponse":
+        value = json.loads(data)
+        return cls(body=value["body"].encode(), etag=value["etag"],
+                   media_type=value["media_type"],
+                   headers=[tuple(header) for header in value["headers"]])
+
+
+def etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class ResponseCache(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, entry: CachedResponse, tags: Iterable[str]) -> None:
+        pass
+
+    @abstractmethod
+    async def invalidate(self, tags: Iterable[str]) -> None:
+        pass
+
+
+class MemoryResponseCache(ResponseCache):
+    """LRU with TTL of a single worker process"""
+
+    def __init__(self, max_entries: int = settings.RESPONSE_CACHE_MAX_ENTRIES,
+                 ttl: float = settings.RESPONSE_CACHE_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, CachedResponse, Set[str]]]" = OrderedDict()
+        self._keys_by_tag: Dict[str, Set[str]] = {}
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires, entry, _ = item
+        if expires <= self.clock():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: CachedResponse, tags: Iterable[str]) -> None:
+        self._drop(key)
+        tags = set(tags)
+        self._entries[key] = (self.clock() + self.ttl, entry, tags)
+        for tag in tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    async def invalidate(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            for key in self._keys_by_tag.pop(tag, ()):
+                self._drop(key)
+
+    def _drop(self, key: str) -> None:
+        item = self._entries.pop(key, None)
+        if item is None:
+            return
+        for tag in item[2]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+# delete every entry listed in the tag sets KEYS, then the sets themselves
+INVALIDATE_SCRIPT = """
+for _, tag in ipairs(KEYS) do
+    local keys = redis.call('SMEMBERS', tag)
+    for i = 1, #keys, 500 do
+        redis.call('DEL', unpack(keys, i, math.min(i + 499, #keys)))
+    end
+    redis.call('DEL', tag)
+end
+"""
+
+
+class RedisResponseCache(ResponseCache):
+    """Cache shared by all workers, each tag is a set of entry keys"""
+
+    def __init__(self, client, ttl: float = settings.RESPONSE_CACHE_TTL,
+                 prefix: str = "cache:"):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self._invalidate = client.register_script(INVALIDATE_SCRIPT)
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        data = await self.client.get(self.prefix + key)
+        return None if data is None else CachedResponse.from_json(data)
+
+    async def set(self, key: str, entry: CachedResponse, tags: Iterable[str]) -> None:
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(self.prefix + key, entry.to_json(), ex=self.ttl)
+            for tag in tags:
+                # tag sets outlive their entries a little, stale members are harmless
+                pipe.sadd(self.prefix + "tag:" + tag, self.prefix + key)
+                pipe.expire(self.prefix + "tag:" + tag, self.ttl * 2)
+            await pipe.execute()
+
+    async def invalidate(self, tags: Iterable[str]) -> None:
+        keys = [self.prefix + "tag:" + tag for tag in tags]
+        if keys:
+            await self._invalidate(keys=keys)
+
+
+def create_response_cache() -> Optional[ResponseCache]:
+    if settings.RESPONSE_CACHE_BACKEND == "memory":
+        return MemoryResponseCache()
+    if settings.RESPONSE_CACHE_BACKEND == "redis":
+        from redis import asyncio as aioredis
+        return RedisResponseCache(aioredis.Redis.from_url(settings.REDIS_URL))
+    return None
+
+
+# None when responses are not cached
+response_cache = create_response_cache()
+
+
+def tag(request: Request, *tags: str) -> None:
+    """Make the response cacheable, it is dropped when any of tags is invalidated"""
+    if not hasattr(request.state, "cache_tags"):
+        request.state.cache_tags = set()
+    request.state.cache_tags.update(tags)
+
+
+async def invalidate(*tags: str) -> None:
+    if response_cache is not None and tags:
+        await response_cache.invalidate(tags)
+
+
+def if_none_match(request: Request, etag_value: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag_value in {value.strip() for value in header.split(",")}
+
+
+class CachedRoute(SerializingRoute):
+    """Route serving tagged GET responses from response_cache"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        flat = get_flat_dependant(self.dependant)
+        self.cache_params = sorted({param.alias for param in flat.query_params})
+
+    def cache_key(self, request: Request) -> str:
+        params = [(name, value) for name in self.cache_params
+                  for value in request.query_params.getlist(name)]
+        return request.url.path + "?" + urlencode(params)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        if "GET" not in self.methods:
+            return handler
+
+        async def cached_handler(request: Request) -> Response:
+            if response_cache is None:
+                return await handler(request)
+            key = self.cache_key(request)
+            entry = await response_cache.get(key)
+            status = "HIT"
+            if entry is None:
+                status = "MISS"
+                response = await handler(request)
+                tags = getattr(request.state, "cache_tags", set())
+                if response.status_code != 200 or not tags:
+                    return response
+                entry = CachedResponse.from_response(response)
+                await response_cache.set(key, entry, tags)
+            if if_none_match(request, entry.etag):
+                return Response(status_code=304, headers={
+                    "ETag": entry.etag, CACHE_STATUS_HEADER: status,
+                })
+            return entry.to_response(status)
+
+        return cached_handler
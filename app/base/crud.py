@@ -1,9 +1,12 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+from typing import Any, Dict, Generic, List, Optional, Sequence, Type, TypeVar, Union
 
-from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Load, Session
 
+from app.base import cache
+from app.base.pagination import Cursor, keyset
 from db.db import Base
 
 ModelType = TypeVar("ModelType", bound=Base)
@@ -11,7 +14,17 @@ CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
 
+def set_changed_columns(db_obj: Base, update_data: Dict[str, Any]) -> None:
+    """Set the columns of db_obj whose value in update_data differs, other keys are ignored"""
+    for column in db_obj.__table__.columns.keys():
+        if column in update_data and getattr(db_obj, column) != update_data[column]:
+            setattr(db_obj, column, update_data[column])
+
+
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    # column used together with id for keyset pagination
+    keyset_column = "date_created"
+
     def __init__(self, model: Type[ModelType]):
         """
         CRUD object with default methods to Create, Read, Update, Delete (CRUD).
@@ -21,16 +34,25 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         """
         self.model = model
 
-    def get(self, db: Session, **kwargs) -> Optional[ModelType]:
-        return db.query(self.model).filter_by(**kwargs).first()
+    def get(self, db: Session, options: Sequence[Load] = (), **kwargs) -> Optional[ModelType]:
+        return db.query(self.model).options(*options).filter_by(**kwargs).first()
 
     def get_multi(
-        self, db: Session, *, skip: int = 0, limit: int = 100
+        self, db: Session, *, skip: int = 0, limit: int = 100, options: Sequence[Load] = ()
+    ) -> List[ModelType]:
+        return db.query(self.model).options(*options).offset(skip).limit(limit).all()
+
+    def get_multi_keyset(
+        self, db: Session, *, after: Optional[Cursor] = None, limit: int = 100,
+        options: Sequence[Load] = ()
     ) -> List[ModelType]:
-        return db.query(self.model).offset(skip).limit(limit).all()
+        """Newest first page of objects which go after cursor"""
+        query = db.query(self.model).options(*options)
+        query = keyset(query, getattr(self.model, self.keyset_column), self.model.id, after)
+        return query.limit(limit).all()
 
     def create(self, db: Session, *, schema: CreateSchemaType) -> ModelType:
-        obj_in_data = jsonable_encoder(schema)
+        obj_in_data = schema.dict()
         db_obj = self.model(**obj_in_data)  # type: ignore
         db.add(db_obj)
         db.commit()
@@ -44,14 +66,11 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         db_obj: ModelType,
         schema: Union[UpdateSchemaType, Dict[str, Any]]
     ) -> ModelType:
-        obj_data = jsonable_encoder(db_obj)
         if isinstance(schema, dict):
             update_data = schema
         else:
             update_data = schema.dict(exclude_unset=True)
-        for field in obj_data:
-            if field in update_data:
-                setattr(db_obj, field, update_data[field])
+        set_changed_columns(db_obj, update_data)
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
@@ -62,3 +81,95 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         db.delete(obj)
         db.commit()
         return obj
+
+
+class AsyncCRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    # column used together with id for keyset pagination
+    keyset_column = "date_created"
+
+    def __init__(self, model: Type[ModelType]):
+        """
+        CRUDBase counterpart for AsyncSession.
+        Relationships can't be lazy loaded outside of the session, so whatever
+        the response serializes must be eager loaded through `options`
+        """
+        self.model = model
+
+    def cache_tags(self, db_obj: ModelType) -> List[str]:
+        """Response cache tags invalidated when db_obj is created, updated or removed"""
+        return []
+
+    async def get(
+        self, db: AsyncSession, options: Sequence[Load] = (), **kwargs
+    ) -> Optional[ModelType]:
+        query = select(self.model).options(*options).filter_by(**kwargs).limit(1)
+        result = await db.execute(query)
+        return result.scalars().first()
+
+    async def get_multi(
+        self, db: AsyncSession, *, skip: int = 0, limit: int = 100, options: Sequence[Load] = ()
+    ) -> List[ModelType]:
+        query = select(self.model).options(*options).offset(skip).limit(limit)
+        result = await db.execute(query)
+        return result.scalars().all()
+
+    async def get_multi_keyset(
+        self, db: AsyncSession, *, after: Optional[Cursor] = None, limit: int = 100,
+        options: Sequence[Load] = ()
+    ) -> List[ModelType]:
+        """Newest first page of objects which go after cursor"""
+        query = select(self.model).options(*options)
+        query = keyset(query, getattr(self.model, self.keyset_column), self.model.id, after)
+        result = await db.execute(query.limit(limit))
+        return result.scalars().all()
+
+    async def reload(
+        self, db: AsyncSession, db_obj: ModelType, options: Sequence[Load] = ()
+    ) -> ModelType:
+        """Refresh object with server side values and eager load relationships"""
+        query = select(self.model) \
+            .options(*options) \
+            .filter_by(id=db_obj.id) \
+            .execution_options(populate_existing=True)
+        result = await db.execute(query)
+        return result.scalars().one()
+
+    async def create(
+        self, db: AsyncSession, *, schema: CreateSchemaType, options: Sequence[Load] = ()
+    ) -> ModelType:
+        obj_in_data = schema.dict()
+        db_obj = self.model(**obj_in_data)  # type: ignore
+        db.add(db_obj)
+        await db.commit()
+        db_obj = await self.reload(db, db_obj, options)
+        await cache.invalidate(*self.cache_tags(db_obj))
+        return db_obj
+
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: ModelType,
+        schema: Union[UpdateSchemaType, Dict[str, Any]],
+        options: Sequence[Load] = ()
+    ) -> ModelType:
+        if isinstance(schema, dict):
+            update_data = schema
+        else:
+            update_data = schema.dict(exclude_unset=True)
+        # tags of the old values, e.g. a renamed tag
+        tags = self.cache_tags(db_obj)
+        set_changed_columns(db_obj, update_data)
+        db.add(db_obj)
+        await db.commit()
+        db_obj = await self.reload(db, db_obj, options)
+        await cache.invalidate(*{*tags, *self.cache_tags(db_obj)})
+        return db_obj
+
+    async def remove(self, db: AsyncSession, options: Sequence[Load] = (), **kwargs) -> ModelType:
+        obj = await self.get(db, options=options, **kwargs)
+        tags = self.cache_tags(obj)
+        await db.delete(obj)
+        await db.commit()
+        await cache.invalidate(*tags)
+        return obj
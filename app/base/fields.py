@@ -0,0 +1,109 @@
+"""
+Sparse fieldsets of list responses, e.g. GET /post/?fields=id,title,slug,date_created.
+
+A Projection is the dependency of a list endpoint: it parses `fields`, the query loads only
+those columns and eager loads only the relationships among them, and the response is
+serialized with a copy of the response schema trimmed to them.
+"""
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Type
+
+from fastapi import HTTPException, Query, Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, create_model
+from sqlalchemy import inspect
+from sqlalchemy.orm import Load, load_only
+
+from app.base import serializers
+
+
+@lru_cache(maxsize=256)
+def trimmed_model(schema: Type[BaseModel], names: FrozenSet[str]) -> Type[BaseModel]:
+    """schema with only the fields in names, a field nesting schema itself nests the copy"""
+    name = f"{schema.__name__}_{'_'.join(sorted(names))}"
+    fields: Dict[str, Any] = {}
+    recursive = False
+    for field_name, field in schema.__fields__.items():
+        if field_name not in names:
+            continue
+        outer_type = field.outer_type_
+        if field.type_ is schema:
+            # only List[schema] nests schema in this app
+            outer_type, recursive = List[name], True
+        fields[field_name] = (outer_type, field.default if not field.required else ...)
+    model = create_model(name, __config__=schema.__config__, **fields)
+    if recursive:
+        model.update_forward_refs(**{name: model})
+    return model
+
+
+class FieldSet:
+    """Fields of the response picked by the client, all when `names` is None"""
+
+    def __init__(self, projection: "Projection", names: Optional[FrozenSet[str]]):
+        self.projection = projection
+        self.names = names
+
+    @property
+    def enabled(self) -> bool:
+        return self.names is not None
+
+    def includes(self, name: str) -> bool:
+        return self.names is None or name in self.names
+
+    def options(self, default: Sequence[Load] = ()) -> List[Load]:
+        """Loader options of the query, `default` when all fields are returned"""
+        if self.names is None:
+            return list(default)
+        return self.projection.options(self.names)
+
+    def respond(self, items: List[Any], response: Response) -> Any:
+        """
+        Return value of the endpoint: items for the route's response_model, or a response
+        serialized with the trimmed model, carrying the headers set on `response`
+        """
+        if self.names is None:
+            return items
+        serialize = serializers.serializer(trimmed_model(self.projection.schema, self.names))
+        result = ORJSONResponse([serialize(item) for item in items],
+                                status_code=response.status_code or 200)
+        result.raw_headers.extend(response.raw_headers)
+        return result
+
+
+class Projection:
+    """
+    Sparse fieldsets of `schema` listing `model` rows. `relationships` maps fields to their
+    loader options, `required` columns are loaded whatever the fields, e.g. for the cursor
+    """
+
+    def __init__(self, schema: Type[BaseModel], model, relationships: Dict[str, Load] = None,
+                 required: Sequence[str] = ("id",)):
+        self.schema = schema
+        self.model = model
+        self.relationships = relationships or {}
+        self.required = set(required)
+
+    @property
+    def columns(self) -> FrozenSet[str]:
+        # not inspected in __init__, projections are built before all mappers are defined
+        return frozenset(inspect(self.model).column_attrs.keys())
+
+    def __call__(self, fields: Optional[str] = Query(
+            None, description="Comma separated fields of the response, all by default")
+    ) -> FieldSet:
+        names = frozenset(name.strip() for name in (fields or "").split(",") if name.strip())
+        if not names:
+            return FieldSet(self, None)
+        unknown = names - self.schema.__fields__.keys()
+        if unknown:
+            raise HTTPException(status_code=400,
+                                detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        return FieldSet(self, names)
+
+    def options(self, names: FrozenSet[str]) -> List[Load]:
+        columns = (names & self.columns) | self.required
+        return [
+            load_only(*(getattr(self.model, column) for column in sorted(columns))),
+            *(loader for name, loader in self.relationships.items() if name in names),
+        ]
@@ -0,0 +1,205 @@
+"""
+Mail transport of the Celery workers.
+
+Templates of EMAIL_TEMPLATES_DIR are compiled once per process, at worker startup by
+compile_templates(), and kept by a Jinja Environment. Its bytecode cache lets the next
+processes skip the parsing too.
+
+Every process keeps its SMTP connections alive between messages, usually one, more when threads
+send at the same time. A connection idle for more than SMTP_POOL_MAX_IDLE seconds is checked
+with a NOOP before it is reused, and one which failed is dropped, so the next message
+reconnects. session() holds a connection for a batch of messages, batch() keeps the connection
+of the messages sent by a thread until it exits, e.g. for a batch of tasks.
+"""
+import logging
+import os
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from email.header import Header
+from email.message import Message
+from email.mime.text import MIMEText
+from email.utils import formataddr
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+templates = Environment(
+    loader=FileSystemLoader(settings.EMAIL_TEMPLATES_DIR),
+    bytecode_cache=FileSystemBytecodeCache(settings.EMAIL_TEMPLATES_CACHE_DIR),
+    autoescape=select_autoescape(["html"]),
+    # templates only change with a deploy, which restarts the workers
+    auto_reload=False,
+)
+
+
+def compile_templates() -> None:
+    for name in templates.list_templates():
+        templates.get_template(name)
+
+
+def render(template_name: str, **context) -> str:
+    return templates.get_template(template_name).render(**context)
+
+
+def html_message(email_to: Optional[str], subject: str, html: str) -> Message:
+    # the compat32 MIMEText, the header registry of EmailMessage doubles the cost of a message
+    message = MIMEText(html, "html", "utf-8")
+    message["Subject"] = Header(subject, "utf-8")
+    message["From"] = formataddr((settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL))
+    if email_to:
+        message["To"] = email_to
+    return message
+
+
+class SMTPConnection:
+    def __init__(self):
+        self.smtp = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT,
+                                 timeout=settings.SMTP_TIMEOUT)
+        try:
+            if settings.SMTP_TLS:
+                self.smtp.starttls()
+            if settings.SMTP_USER:
+                self.smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        except BaseException:
+            self.smtp.close()
+            raise
+        self.pid = os.getpid()
+        self.messages = 0
+        self.used = time.monotonic()
+
+    def alive(self, max_idle: float) -> bool:
+        if time.monotonic() - self.used <= max_idle:
+            return True
+        try:
+            return self.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, message: Message) -> None:
+        try:
+            self.smtp.send_message(message)
+        finally:
+            self.messages += 1
+            self.used = time.monotonic()
+
+    def close(self) -> None:
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+
+
+class SMTPTransport:
+    """Kept-alive SMTP connections of the process, one per thread sending at the same time"""
+
+    def __init__(self, max_idle: float = settings.SMTP_POOL_MAX_IDLE,
+                 max_messages: int = settings.SMTP_POOL_MAX_MESSAGES,
+                 size: int = settings.SMTP_POOL_SIZE):
+        self.max_idle = max_idle
+        self.max_messages = max_messages
+        self.size = size
+        self._lock = threading.Lock()
+        self._idle: List[SMTPConnection] = []
+        # batching and the connection held by the batch of every thread
+        self._local = threading.local()
+
+    def _checkout(self) -> Tuple[SMTPConnection, bool]:
+        """A connection and whether it was kept alive"""
+        held, self._local.held = getattr(self._local, "held", None), None
+        if held is not None:
+            if held.messages < self.max_messages:
+                return held, True
+            held.close()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection = self._idle.pop()
+            if connection.pid != os.getpid():
+                # inherited through a fork, the session belongs to the parent
+                continue
+            if connection.messages < self.max_messages and connection.alive(self.max_idle):
+                return connection, True
+            connection.close()
+        return SMTPConnection(), False
+
+    def _checkin(self, connection: SMTPConnection) -> None:
+        if getattr(self._local, "batching", False):
+            self._local.held = connection
+            return
+        with self._lock:
+            if len(self._idle) < self.size and connection.pid == os.getpid():
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            if connection.pid == os.getpid():
+                connection.close()
+
+    @contextmanager
+    def _connection(self, fresh: bool = False) -> Iterator[Tuple[SMTPConnection, bool]]:
+        connection, reused = (SMTPConnection(), False) if fresh else self._checkout()
+        try:
+            yield connection, reused
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                smtplib.SMTPDataError):
+            # smtplib reset the transaction, the connection stays usable
+            self._checkin(connection)
+            raise
+        except BaseException:
+            connection.smtp.close()
+            raise
+        self._checkin(connection)
+
+    def send(self, message: Message) -> None:
+        """Send one message, again over a new connection if the kept-alive one was closed"""
+        reused = False
+        try:
+            with self._connection() as (connection, reused):
+                connection.send(message)
+        except smtplib.SMTPServerDisconnected:
+            if not reused:
+                raise
+            logger.info("SMTP connection closed by the server, reconnecting")
+            with self._connection(fresh=True) as (connection, _):
+                connection.send(message)
+
+    @contextmanager
+    def session(self) -> Iterator[Callable[[Message], None]]:
+        """
+        A connection for a batch, the yielded function sends a message. Failed messages are not
+        sent again, the connection is dropped after a connection error
+        """
+        with self._connection() as (connection, _):
+            yield connection.send
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Send the messages of this thread through one connection until the block exits, rather
+        than through the pool for every message. A connection error drops it, as in send()
+        """
+        if getattr(self._local, "batching", False):
+            yield
+            return
+        self._local.batching = True
+        try:
+            yield
+        finally:
+            self._local.batching = False
+            held, self._local.held = getattr(self._local, "held", None), None
+            if held is not None:
+                self._checkin(held)
+
+
+transport = SMTPTransport()
@@ -0,0 +1,87 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query as SAQuery
+
+from config import settings
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Cursor(NamedTuple):
+    """Position after the last row of a page, ordered by (date, id) descending"""
+    date: datetime
+    id: int
+
+
+def _sign(payload: bytes) -> bytes:
+    key = settings.SECRET_KEY.encode()
+    return hmac.new(key, b"cursor:" + payload, hashlib.sha256).digest()[:16]
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    payload = json.dumps([cursor.date.isoformat(), cursor.id], separators=(",", ":")).encode()
+    token = base64.urlsafe_b64encode(payload + _sign(payload))
+    return token.decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Cursor:
+    """Decode cursor token, raise ValueError if it is malformed or was not signed by us"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (binascii.Error, ValueError):
+        raise ValueError("Malformed cursor")
+    payload, signature = raw[:-16], raw[-16:]
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise ValueError("Invalid cursor signature")
+    try:
+        date, id = json.loads(payload)
+        return Cursor(date=datetime.fromisoformat(date), id=int(id))
+    except (TypeError, ValueError):
+        raise ValueError("Malformed cursor")
+
+
+def keyset(query: SAQuery, date_column, id_column, cursor: Optional[Cursor]) -> SAQuery:
+    """
+    Order query by (date_column, id_column) descending and continue after cursor.
+    The predicate is an index range scan on (date_column, id_column), so every page costs the same
+    """
+    if cursor is not None:
+        query = query.filter(or_(
+            date_column < cursor.date,
+            and_(date_column == cursor.date, id_column < cursor.id),
+        ))
+    return query.order_by(date_column.desc(), id_column.desc())
+
+
+class CursorParams:
+    """
+    Query parameter switching list endpoints to keyset pagination.
+    Send `?cursor=` for the first page, then the value of the X-Next-Cursor response header
+    """
+
+    def __init__(self, cursor: Optional[str] = Query(None)):
+        self.enabled = cursor is not None
+        self.after: Optional[Cursor] = None
+        if cursor:
+            try:
+                self.after = decode_cursor(cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    def set_next(self, response: Response, items: List, limit: int,
+                 date_field: str = "date_created"):
+        """Add cursor of the next page to response headers if the page is full"""
+        if not items or len(items) < limit:
+            return
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            Cursor(date=getattr(last, date_field), id=last.id)
+        )
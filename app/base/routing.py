@@ -0,0 +1,107 @@
+"""
+Route class of the API routers.
+
+SerializingRoute serializes the response_model in the route rather than leaving it to the request
+handler of FastAPI, so the step is timed for traced requests, see
+app/monitoring/instrumentation.py. The endpoint is wrapped: what it returns is validated by
+serialize() and rendered with the route's response class. Headers, cookies and the status code
+set on the `response` parameter of the endpoint and of its dependencies are carried over, as
+FastAPI does. Endpoints returning a Response are left alone. Response models registered in
+app/base/serializers.py skip validation and are serialized by their compiled serializer.
+"""
+import asyncio
+import time
+from copy import copy
+from typing import Any, Callable, Optional
+
+from fastapi import Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.dependencies.models import Dependant
+from fastapi.routing import APIRoute, serialize_response
+from starlette.concurrency import run_in_threadpool
+
+from app.base import serializers
+from app.monitoring.instrumentation import current_trace
+
+# parameter passing the response of the dependencies to endpoints which do not declare one
+RESPONSE_PARAM = "_route_response"
+
+
+class SerializingRoute(APIRoute):
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.fast_serializer: Optional[serializers.Serializer] = None
+        options = (self.response_model_include, self.response_model_exclude,
+                   self.response_model_exclude_unset, self.response_model_exclude_defaults,
+                   self.response_model_exclude_none)
+        if self.secure_cloned_response_field is not None and not any(options) \
+                and self.response_model_by_alias:
+            self.fast_serializer = serializers.field_serializer(self.secure_cloned_response_field)
+
+    async def serialize(self, content: Any, is_coroutine: bool) -> Any:
+        """The JSON compatible data of what the endpoint returned"""
+        if self.fast_serializer is not None and serializers.is_plain(content):
+            return self.fast_serializer(content)
+        return await serialize_response(
+            field=self.secure_cloned_response_field,
+            response_content=content,
+            include=self.response_model_include,
+            exclude=self.response_model_exclude,
+            by_alias=self.response_model_by_alias,
+            exclude_unset=self.response_model_exclude_unset,
+            exclude_defaults=self.response_model_exclude_defaults,
+            exclude_none=self.response_model_exclude_none,
+            is_coroutine=is_coroutine,
+        )
+
+    def render(self, data: Any, sub_response: Response) -> Response:
+        response_class = self.response_class
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = response_class.value
+        kwargs = {} if self.status_code is None else {"status_code": self.status_code}
+        response = response_class(data, **kwargs)
+        response.raw_headers.extend(sub_response.raw_headers)
+        if sub_response.status_code:
+            response.status_code = sub_response.status_code
+        return response
+
+    def serializing_call(self, dependant: Dependant) -> Callable:
+        """dependant.call returning the rendered response"""
+        call = dependant.call
+        is_coroutine = asyncio.iscoroutinefunction(call)
+        response_param = dependant.response_param_name
+
+        async def serializing_call(**values: Any) -> Any:
+            if response_param is None:
+                sub_response = values.pop(RESPONSE_PARAM)
+            else:
+                sub_response = values[response_param]
+            if is_coroutine:
+                content = await call(**values)
+            else:
+                content = await run_in_threadpool(call, **values)
+            if isinstance(content, Response):
+                return content
+            trace = current_trace.get()
+            if trace is None:
+                return self.render(await self.serialize(content, is_coroutine), sub_response)
+            start = time.perf_counter()
+            try:
+                return self.render(await self.serialize(content, is_coroutine), sub_response)
+            finally:
+                trace.serialize_seconds += time.perf_counter() - start
+
+        return serializing_call
+
+    def get_route_handler(self) -> Callable:
+        # the handler of FastAPI runs the wrapped endpoint, self.dependant stays the endpoint's
+        # for the OpenAPI schema
+        dependant = self.dependant
+        self.dependant = copy(dependant)
+        self.dependant.call = self.serializing_call(dependant)
+        self.dependant.response_param_name = dependant.response_param_name or RESPONSE_PARAM
+        try:
+            return super().get_route_handler()
+        finally:
+            self.dependant = dependant
@@ -0,0 +1,116 @@
+"""
+Fast path of response serialization.
+
+FastAPI validates what an endpoint returns against its response_model, through from_orm for
+ORM rows, then runs jsonable_encoder over the validated models. On list pages that is most of
+the CPU time of the request. Schemas registered here are compiled once into functions reading
+the attributes of the returned objects straight into dicts, which ORJSONResponse, the default
+response class, dumps as they are: datetimes, EmailStr and the rest are native to orjson.
+SerializingRoute of app/base/routing.py takes the serializer of its response_model from here.
+"""
+from datetime import date, datetime
+from enum import Enum
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type
+
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON, ModelField
+
+Serializer = Callable[[Any], Any]
+
+# types orjson dumps as pydantic would, int and float are not coerced
+PASSTHROUGH = (int, float, bool, datetime, date)
+
+_serializers: Dict[Type[BaseModel], Serializer] = {}
+_registered: Set[Type[BaseModel]] = set()
+
+
+def _getter(name: str, default: Any) -> Callable[[Any], Any]:
+    # missing attributes take the default, like from_orm does
+    return lambda obj: getattr(obj, name, default)
+
+
+def _item_converter(field: ModelField) -> Optional[Serializer]:
+    """Conversion of a value of the field's type, None when orjson takes it as it is"""
+    type_ = field.type_
+    if isinstance(type_, type) and issubclass(type_, BaseModel):
+        return serializer(type_)
+    if isinstance(type_, type) and issubclass(type_, Enum):
+        return attrgetter("value")
+    if type_ is str:
+        # e.g. PostInResponse.id, an int column declared as str
+        return lambda value: value if type(value) is str else str(value)
+    if isinstance(type_, type) and issubclass(type_, (str, *PASSTHROUGH)):
+        return None
+    raise TypeError(f"{field.name}: {type_} has no fast serialization")
+
+
+def _converter(field: ModelField) -> Optional[Serializer]:
+    convert = _item_converter(field)
+    if field.shape == SHAPE_SINGLETON:
+        return convert
+    if field.shape == SHAPE_LIST:
+        if convert is None:
+            return list
+        return lambda values: [convert(value) for value in values]
+    raise TypeError(f"{field.name}: {field.outer_type_} has no fast serialization")
+
+
+def serializer(schema: Type[BaseModel]) -> Serializer:
+    """Function serializing an object with the attributes of schema, compiled on first use"""
+    compiled = _serializers.get(schema)
+    if compiled is not None:
+        return compiled
+    fields: List[Tuple[str, Callable[[Any], Any], Optional[Serializer]]] = []
+
+    def serialize(obj: Any) -> Dict[str, Any]:
+        data = {}
+        for key, get, convert in fields:
+            value = get(obj)
+            data[key] = value if convert is None or value is None else convert(value)
+        return data
+
+    # registered before compiling the fields, a schema may nest itself
+    _serializers[schema] = serialize
+    try:
+        for name, field in schema.__fields__.items():
+            get = attrgetter(name) if field.required else _getter(name, field.default)
+            fields.append((field.alias, get, _converter(field)))
+    except TypeError:
+        del _serializers[schema]
+        raise
+    return serialize
+
+
+def register(*schemas: Type[BaseModel]) -> None:
+    """Serialize responses whose response_model is, or is a list of, one of schemas fast"""
+    for schema in schemas:
+        serializer(schema)
+        _registered.add(schema)
+
+
+def _registered_base(type_: Any) -> Optional[Type[BaseModel]]:
+    # FastAPI clones response models into subclasses with the same fields
+    for base in getattr(type_, "__mro__", ()):
+        if base in _registered and base.__fields__.keys() == type_.__fields__.keys():
+            return base
+    return None
+
+
+def field_serializer(field: ModelField) -> Optional[Serializer]:
+    """Serializer of a response field whose model is, or is a list of, a registered schema"""
+    schema = _registered_base(field.type_)
+    if schema is None or field.shape not in (SHAPE_SINGLETON, SHAPE_LIST):
+        return None
+    item = serializer(schema)
+    if field.shape == SHAPE_SINGLETON:
+        return item
+    return lambda items: [item(obj) for obj in items]
+
+
+def is_plain(content: Any) -> bool:
+    """Dicts are left to FastAPI, their keys are not attributes"""
+    if isinstance(content, (list, tuple)):
+        return not content or not isinstance(content[0], dict)
+    return not isinstance(content, dict)
+
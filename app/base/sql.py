@@ -0,0 +1,33 @@
+from typing import Callable, Dict
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Insert
+
+# dialects with an INSERT ... ON CONFLICT DO NOTHING, which likes, follows, feeds and the
+# newsletter rely on
+INSERTS: Dict[str, Callable[..., Insert]] = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def check_dialect(dialect: str) -> None:
+    """Raise RuntimeError for a database the queries of the app do not support"""
+    if dialect not in INSERTS:
+        raise RuntimeError(f"Unsupported database {dialect}, use one of {', '.join(INSERTS)}")
+
+
+def insert_ignore(db: Session, table) -> Insert:
+    """INSERT ... ON CONFLICT DO NOTHING in the dialect of the session"""
+    dialect = db.bind.dialect.name
+    check_dialect(dialect)
+    return INSERTS[dialect](table).on_conflict_do_nothing()
+
+
+def returns_inserted(db: Session) -> bool:
+    """
+    Whether insert_ignore(...).returning() lists the rows inserted, and delete().returning() the
+    rows deleted, SQLAlchemy 1.4 has no RETURNING for SQLite
+    """
+    return db.bind.dialect.name == "postgresql"
@@ -0,0 +1,141 @@
+"""
+Where the API sends its Celery tasks.
+
+With a broker, enqueue() publishes to the queue config/celery_app.py routes the task to.
+Without CELERY_BROKER_URL the tasks run in the API process instead: every Celery queue becomes
+an asyncio queue with its own consumer, so transactional emails never wait behind bulk ones.
+A consumer takes up to TASK_QUEUE_BATCH_SIZE waiting tasks at a time and runs them one after
+the other in a thread, with Task.apply() like eager tasks, retries included. The emails of a
+batch, e.g. of transactional tasks, go through one session of the kept-alive SMTP connection
+of app/base/mail.py. Tasks still waiting at shutdown are run before the process exits, those
+with a countdown not yet due are lost.
+"""
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from celery import Task
+from starlette.concurrency import run_in_threadpool
+
+from app.base import mail
+from config import settings
+from config.celery_app import app
+
+logger = logging.getLogger(__name__)
+
+Job = Tuple[Task, dict]
+
+
+class TaskQueue(ABC):
+    @abstractmethod
+    def enqueue(self, task: Task, kwargs: dict, countdown: Optional[float] = None) -> None:
+        pass
+
+    def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class CeleryTaskQueue(TaskQueue):
+    def enqueue(self, task: Task, kwargs: dict, countdown: Optional[float] = None) -> None:
+        task.apply_async(kwargs=kwargs, countdown=countdown)
+
+
+class LocalTaskQueue(TaskQueue):
+    """asyncio queues of the running event loop, one per Celery queue"""
+
+    def __init__(self, batch_size: int = settings.TASK_QUEUE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._consumers: List[asyncio.Task] = []
+
+    @staticmethod
+    def queue_of(task: Task) -> str:
+        route = app.conf.task_routes.get(task.name, {})
+        return route.get("queue", app.conf.task_default_queue)
+
+    def enqueue(self, task: Task, kwargs: dict, countdown: Optional[float] = None) -> None:
+        """Safe to call from the event loop and from the threads running tasks"""
+        loop = self._loop
+        if loop is None:
+            # no consumer, e.g. a script: run it now
+            self._run([(task, kwargs)])
+        elif countdown:
+            loop.call_soon_threadsafe(loop.call_later, countdown, self._put, task, kwargs)
+        elif self._in_loop():
+            self._put(task, kwargs)
+        else:
+            loop.call_soon_threadsafe(self._put, task, kwargs)
+
+    def _in_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _put(self, task: Task, kwargs: dict) -> None:
+        if self._loop is None:
+            # from a thread while stopping
+            self._run([(task, kwargs)])
+            return
+        name = self.queue_of(task)
+        if name not in self._queues:
+            self._queues[name] = asyncio.Queue()
+            self._consumers.append(asyncio.ensure_future(self._consume(self._queues[name])))
+        self._queues[name].put_nowait((task, kwargs))
+
+    @staticmethod
+    def _take(queue: asyncio.Queue, size: int) -> List[Job]:
+        jobs = []
+        while len(jobs) < size and not queue.empty():
+            jobs.append(queue.get_nowait())
+        return jobs
+
+    async def _consume(self, queue: asyncio.Queue) -> None:
+        while True:
+            jobs = [await queue.get()] + self._take(queue, self.batch_size - 1)
+            await run_in_threadpool(self._run, jobs)
+
+    @staticmethod
+    def _run(jobs: List[Job]) -> None:
+        with mail.transport.batch():
+            for task, kwargs in jobs:
+                result = task.apply(kwargs=kwargs)
+                if result.failed():
+                    logger.error(f"Task {task.name} failed\n{result.traceback}")
+
+    def start(self) -> None:
+        """Consume in the running event loop"""
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self) -> None:
+        self._loop = None
+        for consumer in self._consumers:
+            consumer.cancel()
+        for consumer in self._consumers:
+            try:
+                await consumer
+            except asyncio.CancelledError:
+                pass
+        self._consumers = []
+        jobs = [job for queue in self._queues.values() for job in self._take(queue, queue.qsize())]
+        self._queues = {}
+        if jobs:
+            await run_in_threadpool(self._run, jobs)
+
+
+def create_task_queue() -> TaskQueue:
+    if settings.CELERY_BROKER_URL or settings.CELERY_TASK_ALWAYS_EAGER:
+        return CeleryTaskQueue()
+    return LocalTaskQueue()
+
+
+queue = create_task_queue()
+
+
+def enqueue(task: Task, *, countdown: Optional[float] = None, **kwargs) -> None:
+    queue.enqueue(task, kwargs, countdown)
@@ -1,18 +1,19 @@
 from fastapi import APIRouter, Depends
 from pydantic import EmailStr
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.contact.models import Contact
 from app.contact import services, schemas
+from app.base.routing import SerializingRoute
 from db.db import get_db
 
-router = APIRouter()
+router = APIRouter(route_class=SerializingRoute)
 
 
 @router.post("/subscription/{category_id}/{email}")
-def newsletter_subscription(
-        email: EmailStr, category_id: int, db: Session = Depends(get_db)) -> Contact:
-    contact = services.contact_crud.create_contact_by_email(
+async def newsletter_subscription(
+        email: EmailStr, category_id: int, db: AsyncSession = Depends(get_db)) -> Contact:
+    contact = await services.contact_crud.create_contact_by_email(
         email=email, category_id=category_id, db=db
     )
     return contact
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from db.db import Base
@@ -6,9 +6,25 @@ from db.db import Base
 
 class Contact(Base):
     __tablename__ = "contact"
+    # subscribers of a category in id order, for the newsletter
+    __table_args__ = (Index("ix_contact_category_id_id", "category_id", "id"),)
     id = Column(Integer, primary_key=True, autoincrement=True, unique=True)
     email = Column(String(255), unique=True)
     date = Column(DateTime(timezone=True), server_default=func.now())
 
     category_id = Column(Integer, ForeignKey("category.id"))
     category = relationship("Category", back_populates="contact")
+
+
+class NewsletterDelivery(Base):
+    """Newsletter of a post to a contact, the idempotency key of sending it, see newsletter.py"""
+    __tablename__ = "newsletter_delivery"
+    __table_args__ = (
+        Index("ix_newsletter_delivery_post_id_contact_id", "post_id", "contact_id", unique=True),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    post_id = Column(Integer, ForeignKey("post.id"), nullable=False)
+    contact_id = Column(Integer, ForeignKey("contact.id"), nullable=False)
+    # "sending" from the claim until the SMTP server accepts it, then "sent" or "failed"
+    status = Column(String(10), nullable=False)
+    date_created = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,255 @@
+"""
+Newsletter of new posts to the Contact subscribers of their category.
+
+publish() pages through the subscribers of the category by Contact.id and hands every
+NEWSLETTER_BATCH_SIZE of them to a tasks.celery_send_newsletter_batch. A batch renders the
+message once and sends it through one session of the kept-alive SMTP connection of the worker,
+see app/base/mail.py, rate limited per recipient domain.
+
+(post_id, contact_id) rows of newsletter_delivery are the idempotency keys. A contact is claimed
+before its message goes out and claimed contacts are skipped, so retries and duplicate task
+deliveries never send a post twice. Claims of messages not sent because of a transient error
+are released for the retry. A worker dying mid-batch leaves its claims "sending": those
+messages may be lost, never doubled.
+"""
+import logging
+import smtplib
+import time
+from abc import ABC, abstractmethod
+from email.message import Message
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.article.models import Post
+from app.base import mail
+from app.base.sql import insert_ignore, returns_inserted
+from config import settings
+from .models import Contact, NewsletterDelivery
+
+logger = logging.getLogger(__name__)
+
+SENDING, SENT, FAILED = "sending", "sent", "failed"
+# errors after which the rest of a batch is retried later, 5xx replies to a recipient are not
+TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, OSError)
+
+
+def contact_pages(db: Session, category_id: int, size: int) -> Iterator[List[int]]:
+    """Ids of the subscribers of the category, `size` at a time, keyset paginated by id"""
+    after = 0
+    while True:
+        result = db.execute(select(Contact.id)
+                            .where(Contact.category_id == category_id, Contact.id > after)
+                            .order_by(Contact.id)
+                            .limit(size))
+        ids = result.scalars().all()
+        if not ids:
+            return
+        yield ids
+        after = ids[-1]
+
+
+def publish(db: Session, post_id: int, enqueue: Callable[[int, List[int]], None]) -> int:
+    """Call enqueue(post_id, contact_ids) for every batch of subscribers, return their number"""
+    post = db.get(Post, post_id)
+    if post is None or post.category_id is None or not post.is_active:
+        return 0
+    count = 0
+    for contact_ids in contact_pages(db, post.category_id, settings.NEWSLETTER_BATCH_SIZE):
+        enqueue(post_id, contact_ids)
+        count += len(contact_ids)
+    logger.info(f"newsletter of post {post_id}: {count} subscribers enqueued")
+    return count
+
+
+def render(post: Post) -> Message:
+    """The message of post without recipient, rendered once per batch"""
+    html = mail.render(
+        "newsletter.html",
+        project_name=settings.PROJECT_NAME,
+        title=post.title,
+        summary=(post.text or "")[:settings.NEWSLETTER_SUMMARY_LENGTH],
+        link=f"{settings.SERVER_HOST}/post/{post.slug}",
+    )
+    return mail.html_message(None, f"{settings.PROJECT_NAME} - {post.title}", html)
+
+
+def addressed(message: Message, post_id: int, contact_id: int, email: str) -> Message:
+    for header in ("To", "Message-ID"):
+        del message[header]
+    message["To"] = email
+    # the same for every attempt, so receiving servers can drop duplicates too
+    sender_domain = settings.EMAILS_FROM_EMAIL.rpartition("@")[2]
+    message["Message-ID"] = f"<newsletter.{post_id}.{contact_id}@{sender_domain}>"
+    return message
+
+
+class DomainRateLimiter(ABC):
+    """Messages per second to every recipient domain"""
+
+    def __init__(self, rate: float = settings.NEWSLETTER_DOMAIN_RATE,
+                 rates: Optional[Dict[str, float]] = None):
+        self.rate = rate
+        self.rates = settings.NEWSLETTER_DOMAIN_RATES if rates is None else rates
+
+    def rate_of(self, domain: str) -> float:
+        return self.rates.get(domain, self.rate)
+
+    @abstractmethod
+    def acquire(self, domain: str) -> float:
+        """0 when a message to domain may go now, else the seconds to wait before asking again"""
+
+
+class MemoryDomainRateLimiter(DomainRateLimiter):
+    """Token bucket per domain of a single worker process, bursts of one second of messages"""
+
+    def __init__(self, *args, clock: Callable[[], float] = time.monotonic, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.clock = clock
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def acquire(self, domain: str) -> float:
+        rate, now = self.rate_of(domain), self.clock()
+        tokens, updated = self._buckets.get(domain, (rate, now))
+        tokens = min(rate, tokens + (now - updated) * rate)
+        if tokens >= 1:
+            self._buckets[domain] = (tokens - 1, now)
+            return 0
+        self._buckets[domain] = (tokens, now)
+        return (1 - tokens) / rate
+
+
+class RedisDomainRateLimiter(DomainRateLimiter):
+    """Limit shared by all workers, a counter per domain and second"""
+
+    def __init__(self, client, *args, prefix: str = "newsletter:rate:", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = client
+        self.prefix = prefix
+
+    def acquire(self, domain: str) -> float:
+        now = time.time()
+        key = f"{self.prefix}{domain}:{int(now)}"
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, 2)
+            count, _ = pipe.execute()
+        if count <= self.rate_of(domain):
+            return 0
+        return 1 - now % 1
+
+
+def create_rate_limiter() -> DomainRateLimiter:
+    if settings.NEWSLETTER_RATE_LIMIT_BACKEND == "redis":
+        import redis
+        return RedisDomainRateLimiter(redis.Redis.from_url(settings.REDIS_URL))
+    return MemoryDomainRateLimiter()
+
+
+rate_limiter = create_rate_limiter()
+
+
+class BatchResult(NamedTuple):
+    sent: List[int]
+    failed: List[int]
+    # contacts left for later by the rate limit, and when to retry them
+    deferred: List[int]
+    retry_after: float
+
+
+def claim(db: Session, post_id: int, contact_ids: List[int]) -> List[int]:
+    """
+    Claim the contacts not claimed yet for post, with one multi-row
+    INSERT ... ON CONFLICT DO NOTHING
+    """
+    if not contact_ids:
+        return []
+    statement = insert_ignore(db, NewsletterDelivery.__table__).values([
+        {"post_id": post_id, "contact_id": contact_id, "status": SENDING}
+        for contact_id in contact_ids
+    ])
+    if returns_inserted(db):
+        result = db.execute(statement.returning(NewsletterDelivery.contact_id))
+        claimed = set(result.scalars())
+    else:
+        # the claims there before the INSERT are the rows it skips
+        result = db.execute(select(NewsletterDelivery.contact_id)
+                            .where(NewsletterDelivery.post_id == post_id,
+                                   NewsletterDelivery.contact_id.in_(contact_ids)))
+        existing = set(result.scalars())
+        db.execute(statement)
+        claimed = set(contact_ids) - existing
+    db.commit()
+    return [contact_id for contact_id in contact_ids if contact_id in claimed]
+
+
+def finish(db: Session, post_id: int, sent: List[int], failed: List[int],
+           released: List[int]) -> None:
+    """Record the outcome of claimed contacts, released ones can be claimed again"""
+    for status, contact_ids in ((SENT, sent), (FAILED, failed)):
+        if contact_ids:
+            db.execute(update(NewsletterDelivery)
+                       .where(NewsletterDelivery.post_id == post_id,
+                              NewsletterDelivery.contact_id.in_(contact_ids))
+                       .values(status=status)
+                       .execution_options(synchronize_session=False))
+    if released:
+        db.execute(delete(NewsletterDelivery)
+                   .where(NewsletterDelivery.post_id == post_id,
+                          NewsletterDelivery.contact_id.in_(released),
+                          NewsletterDelivery.status == SENDING)
+                   .execution_options(synchronize_session=False))
+    db.commit()
+
+
+def send_batch(db: Session, post_id: int, contact_ids: List[int], *,
+               limiter: Optional[DomainRateLimiter] = None,
+               max_wait: Optional[float] = settings.NEWSLETTER_MAX_RATE_WAIT) -> BatchResult:
+    """
+    Send post to the contacts in one SMTP session. Waits of the rate limit up to max_wait
+    seconds are slept, None sleeps all of them, longer ones defer the rest of the batch.
+    TRANSIENT_ERRORS propagate after the unsent contacts are released
+    """
+    limiter = limiter or rate_limiter
+    post = db.get(Post, post_id)
+    if post is None:
+        return BatchResult([], [], [], 0)
+    claimed = claim(db, post_id, contact_ids)
+    if not claimed:
+        return BatchResult([], [], [], 0)
+    result = db.execute(select(Contact.id, Contact.email)
+                        .where(Contact.id.in_(claimed))
+                        .order_by(Contact.id))
+    contacts = result.all()
+    message = render(post)
+    sent, failed, deferred, retry_after = [], [], [], 0.0
+    try:
+        with mail.transport.session() as send:
+            for n, (contact_id, email) in enumerate(contacts):
+                domain = email.rpartition("@")[2].lower()
+                wait = limiter.acquire(domain)
+                while wait and (max_wait is None or wait <= max_wait):
+                    time.sleep(wait)
+                    wait = limiter.acquire(domain)
+                if wait:
+                    deferred, retry_after = [id for id, _ in contacts[n:]], wait
+                    break
+                try:
+                    send(addressed(message, post_id, contact_id, email))
+                    sent.append(contact_id)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError) as exc:
+                    if getattr(exc, "smtp_code", 550) < 500:
+                        raise
+                    # refused for this recipient, retrying would not help
+                    logger.warning(f"newsletter of post {post_id} to {email} failed: {exc}")
+                    failed.append(contact_id)
+    finally:
+        done = set(sent) | set(failed)
+        finish(db, post_id, sent, failed, [id for id, _ in contacts if id not in done])
+    return BatchResult(sent, failed, deferred, retry_after)
+
+
+def retry_countdown(retries: int) -> float:
+    """Exponential backoff of a failed batch"""
+    return settings.NEWSLETTER_RETRY_BACKOFF * 2 ** retries
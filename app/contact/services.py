@@ -1,19 +1,18 @@
-from app.base.crud import CRUDBase
+from app.base.crud import AsyncCRUDBase
 from pydantic import EmailStr
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from . import schemas, models
 
 
-class CRUDContact(CRUDBase[models.Contact, schemas.ContactCreate, schemas.ContactUpdate]):
-    def create_contact_by_email(
-            self, db: Session, *, email: EmailStr, category_id: int) -> models.Contact:
+class CRUDContact(AsyncCRUDBase[models.Contact, schemas.ContactCreate, schemas.ContactUpdate]):
+    async def create_contact_by_email(
+            self, db: AsyncSession, *, email: EmailStr, category_id: int) -> models.Contact:
         """Add email contact in database"""
         db_obj = self.model(email=email, category_id=category_id)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
-        return db_obj
+        await db.commit()
+        return await self.reload(db, db_obj)
 
 
 contact_crud = CRUDContact(models.Contact)
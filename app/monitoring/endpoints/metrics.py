@@ -0,0 +1,51 @@
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+
+from app.base.routing import SerializingRoute
+from app.monitoring import prometheus
+from app.monitoring.instrumentation import instrumentation
+from app.user import permission
+from app.user.principal import principal_cache
+from config import settings
+from db.engine import pool_metrics
+
+router = APIRouter(route_class=SerializingRoute)
+
+
+def verify_metrics_token(authorization: Optional[str] = Header(None)) -> None:
+    if settings.METRICS_TOKEN and authorization != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+
+@router.get("", dependencies=[Depends(verify_metrics_token)], response_class=Response)
+async def get_prometheus_metrics() -> Response:
+    """
+    Metrics of this worker in the Prometheus text format.
+    Requires `Authorization: Bearer <METRICS_TOKEN>` when METRICS_TOKEN is set
+    """
+    return Response(content=prometheus.render(), media_type=prometheus.CONTENT_TYPE)
+
+
+@router.get("/db-pool", dependencies=[Depends(permission.get_current_superuser)])
+async def get_pool_metrics() -> Dict[str, Any]:
+    """
+    Connection pool usage per engine.
+    `saturation` is checked out / (pool_size + max_overflow), wait_ms_* is how long
+    checkouts waited for a free connection
+    """
+    return pool_metrics()
+
+
+@router.get("/principal-cache", dependencies=[Depends(permission.get_current_superuser)])
+async def get_principal_cache_metrics() -> Dict[str, Any]:
+    """Hits and misses of the authenticated user cache of this worker"""
+    if principal_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **principal_cache.stats()}
+
+
+@router.get("/slow-requests", dependencies=[Depends(permission.get_current_superuser)])
+async def get_slow_requests() -> List[Dict[str, Any]]:
+    """Slowest traced requests of this worker with their SQL statements, slowest first"""
+    return instrumentation.slowest()
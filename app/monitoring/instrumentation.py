@@ -0,0 +1,254 @@
+"""
+Request instrumentation.
+
+InstrumentationMiddleware records the latency of every request per route. A share of the
+requests (INSTRUMENTATION_SAMPLE_RATE) is also traced: SQLAlchemy events count the queries and
+DB time, SerializingRoute of app/base/routing.py times the response_model serialization, and
+the totals go to histograms and to a Server-Timing header. Traced requests slower than
+SLOW_REQUEST_SECONDS are logged with their SQL statements. Untraced requests only pay a context
+variable lookup per query.
+"""
+import heapq
+import itertools
+import logging
+import random
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Route
+
+from config import settings
+from db.engine import engines
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Prometheus histogram, one series per tuple of label values"""
+
+    def __init__(self, name: str, description: str, labels: Sequence[str],
+                 buckets: Sequence[float]):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket and +Inf, sum]
+        self.series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def exposition(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total) in sorted(self.series.items()):
+            labels = format_labels(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip([*map(str, self.buckets), "+Inf"], counts):
+                cumulative += count
+                bucket_labels = format_labels([*zip(self.labels, label_values), ("le", bound)])
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def format_labels(labels: Iterable[Tuple[str, Any]]) -> str:
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Trace:
+    """Queries and serialization time of one sampled request"""
+    __slots__ = ("queries", "db_seconds", "serialize_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.statements: List[Tuple[float, str]] = []
+
+    def server_timing(self, total_seconds: float) -> str:
+        return (f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries", '
+                f"serialize;dur={self.serialize_seconds * 1000:.1f}, "
+                f"total;dur={total_seconds * 1000:.1f}")
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+class Instrumentation:
+    """Histograms of all requests and the slowest traced requests of this worker"""
+
+    def __init__(self, sample_rate: float = settings.INSTRUMENTATION_SAMPLE_RATE,
+                 slow_seconds: float = settings.SLOW_REQUEST_SECONDS,
+                 max_statements: int = settings.SLOW_REQUEST_MAX_STATEMENTS,
+                 slow_kept: int = settings.SLOW_REQUESTS_KEPT):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.max_statements = max_statements
+        self.slow_kept = slow_kept
+        self.slow_total = 0
+        # min-heap of (duration, n, request), the fastest of the kept requests is replaced first
+        self._slowest: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._counter = itertools.count()
+        self.request_seconds = Histogram(
+            "http_request_duration_seconds", "Request latency",
+            ("method", "route", "status"), LATENCY_BUCKETS)
+        self.db_queries = Histogram(
+            "http_request_db_queries", "SQL queries per traced request",
+            ("method", "route"), QUERY_BUCKETS)
+        self.db_seconds = Histogram(
+            "http_request_db_seconds", "Time in SQL queries per traced request",
+            ("method", "route"), LATENCY_BUCKETS)
+        self.serialize_seconds = Histogram(
+            "http_request_serialize_seconds", "Response model serialization per traced request",
+            ("method", "route"), LATENCY_BUCKETS)
+
+    def histograms(self) -> List[Histogram]:
+        return [self.request_seconds, self.db_queries, self.db_seconds, self.serialize_seconds]
+
+    def sample(self) -> Optional[Trace]:
+        if self.sample_rate >= 1 or (self.sample_rate > 0 and random.random() < self.sample_rate):
+            return Trace()
+        return None
+
+    def observe(self, method: str, route: str, status: int, seconds: float,
+                trace: Optional[Trace]) -> None:
+        self.request_seconds.observe(seconds, method, route, str(status))
+        if trace is None:
+            return
+        self.db_queries.observe(trace.queries, method, route)
+        self.db_seconds.observe(trace.db_seconds, method, route)
+        self.serialize_seconds.observe(trace.serialize_seconds, method, route)
+        if seconds >= self.slow_seconds:
+            self.slow_request(method, route, status, seconds, trace)
+
+    def slow_request(self, method: str, route: str, status: int, seconds: float,
+                     trace: Trace) -> None:
+        self.slow_total += 1
+        logger.warning(
+            "Slow request %s %s %d in %.0f ms, %d queries in %.0f ms\n%s",
+            method, route, status, seconds * 1000, trace.queries, trace.db_seconds * 1000,
+            "\n".join(f"{duration * 1000:8.1f} ms  {statement}"
+                      for duration, statement in trace.statements),
+        )
+        request = {
+            "method": method, "route": route, "status": status,
+            "ms": round(seconds * 1000, 1), "queries": trace.queries,
+            "db_ms": round(trace.db_seconds * 1000, 1),
+            "serialize_ms": round(trace.serialize_seconds * 1000, 1),
+            "statements": [{"ms": round(duration * 1000, 2), "sql": statement}
+                           for duration, statement in trace.statements],
+        }
+        item = (seconds, next(self._counter), request)
+        if len(self._slowest) < self.slow_kept:
+            heapq.heappush(self._slowest, item)
+        elif self._slowest and seconds > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def slowest(self) -> List[Dict[str, Any]]:
+        return [request for _, _, request in sorted(self._slowest, reverse=True)]
+
+
+instrumentation = Instrumentation()
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if current_trace.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    trace = current_trace.get()
+    if trace is None or not conn.info.get("query_start"):
+        return
+    seconds = time.perf_counter() - conn.info["query_start"].pop()
+    trace.queries += 1
+    trace.db_seconds += seconds
+    if len(trace.statements) < instrumentation.max_statements:
+        trace.statements.append((seconds, statement))
+
+
+def handle_error(exception_context) -> None:
+    starts = exception_context.connection.info.get("query_start") \
+        if exception_context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    if event.contains(engine, "after_cursor_execute", after_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+class InstrumentationMiddleware:
+    """ASGI middleware timing requests and tracing a sample of them"""
+
+    def __init__(self, app, instrumentation: Instrumentation = instrumentation):
+        self.app = app
+        self.instrumentation = instrumentation
+        self._route_paths: Optional[Dict[Any, str]] = None
+
+    def route_path(self, scope) -> str:
+        """Path template of the matched route, so that /post/1 and /post/2 share a series"""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._route_paths is None:
+            self._route_paths = {}
+            for route in reversed(scope["app"].routes):
+                if isinstance(route, Route):
+                    self._route_paths[route.endpoint] = route.path
+        return self._route_paths.get(endpoint) or getattr(endpoint, "__name__", "unknown")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        trace = self.instrumentation.sample()
+        token = current_trace.set(trace) if trace is not None else None
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace is not None:
+                    timing = trace.server_timing(time.perf_counter() - start)
+                    message["headers"] = [*message.get("headers", []),
+                                          (b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if token is not None:
+                current_trace.reset(token)
+            self.instrumentation.observe(scope["method"], self.route_path(scope), status,
+                                         time.perf_counter() - start, trace)
+
+
+def instrument(app: FastAPI) -> None:
+    """Add the middleware and hook the engines of db.engine"""
+    app.add_middleware(InstrumentationMiddleware)
+    for engine in engines.values():
+        instrument_engine(engine)
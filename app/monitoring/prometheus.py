@@ -0,0 +1,55 @@
+"""Prometheus text exposition of the instrumentation, pool and cache metrics of this worker"""
+from typing import Any, Dict, List, Tuple
+
+from app.monitoring.instrumentation import format_labels, instrumentation
+from app.user import principal
+from app.user.hashing import password_hasher
+from db.engine import pool_metrics
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # starlette appends the charset
+
+# field of pool_metrics() -> (metric, type, description)
+POOL_METRICS = {
+    "checked_out": ("db_pool_checked_out", "gauge", "Connections checked out"),
+    "saturation": ("db_pool_saturation", "gauge", "Checked out / (pool_size + max_overflow)"),
+    "checkouts": ("db_pool_checkouts_total", "counter", "Connection checkouts"),
+    "timeouts": ("db_pool_timeouts_total", "counter", "Checkouts which timed out"),
+    "wait_seconds_total": ("db_pool_wait_seconds_total", "counter",
+                           "Time spent waiting for a connection"),
+}
+
+
+def metric(name: str, kind: str, description: str,
+           samples: List[Tuple[Dict[str, Any], float]]) -> List[str]:
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{format_labels(labels.items())} {value}" for labels, value in samples)
+    return lines
+
+
+def render() -> str:
+    lines: List[str] = []
+    for histogram in instrumentation.histograms():
+        lines.extend(histogram.exposition())
+    lines.extend(metric("http_slow_requests_total", "counter",
+                        "Traced requests slower than SLOW_REQUEST_SECONDS",
+                        [({}, instrumentation.slow_total)]))
+
+    pools = pool_metrics()
+    for field, (name, kind, description) in POOL_METRICS.items():
+        lines.extend(metric(name, kind, description,
+                            [({"engine": engine}, values[field])
+                             for engine, values in sorted(pools.items())]))
+
+    if principal.principal_cache is not None:
+        stats = principal.principal_cache.stats()
+        lines.extend(metric("principal_cache_lookups_total", "counter",
+                            "Authenticated user cache lookups",
+                            [({"result": "hit"}, stats["hits"]),
+                             ({"result": "miss"}, stats["misses"])]))
+
+    lines.extend(metric("password_hash_pending", "gauge", "Password hashes running or queued",
+                        [({}, password_hasher.pending)]))
+    lines.extend(metric("password_hash_rejected_total", "counter",
+                        "Password hashes rejected with 503",
+                        [({}, password_hasher.rejected)]))
+    return "\n".join(lines) + "\n"
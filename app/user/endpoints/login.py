@@ -3,26 +3,28 @@ from typing import Any
 
 from fastapi import APIRouter, Body, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.user import services, schemas
+from app.base import task_queue
+from app.base.routing import SerializingRoute
+from app.user import principal, services, schemas
+from app.user.hashing import password_hasher
 from config import settings, security
-from config.security import get_password_hash, generate_password_reset_token, \
-    verify_password_reset_token
+from config.security import generate_password_reset_token, verify_password_reset_token
 from db.db import get_db
 import tasks
 
-router = APIRouter()
+router = APIRouter(route_class=SerializingRoute)
 
 
 @router.post("/login/access-token", response_model=schemas.Token)
-def login_access_token(
-        db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()
+async def login_access_token(
+        db: AsyncSession = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = services.user_crud.authenticate(
+    user = await services.user_crud.authenticate(
         db, email=form_data.username, password=form_data.password
     )
     if not user:
@@ -39,12 +41,12 @@ def login_access_token(
 
 
 @router.post("/password-recovery/{email}")
-def recover_password(email: str, db: Session = Depends(get_db)
+async def recover_password(email: str, db: AsyncSession = Depends(get_db)
                      ) -> Any:
     """
     Password Recovery
     """
-    user = services.user_crud.get(db, email=email)
+    user = await services.user_crud.get(db, email=email)
     if not user:
         raise HTTPException(
             status_code=404,
@@ -52,8 +54,8 @@ def recover_password(email: str, db: Session = Depends(get_db)
         )
     password_reset_token = generate_password_reset_token(email=email)
 
-    tasks.celery_send_reset_password_email.delay(email_to=user.email, email=email,
-                                                 token=password_reset_token)
+    task_queue.enqueue(tasks.celery_send_reset_password_email, email_to=user.email, email=email,
+                       token=password_reset_token)
     # background_tasks.add_task(
     #     send_reset_password_email, email_to=user.email, email=email, token=password_reset_token
     # )
@@ -62,10 +64,10 @@ def recover_password(email: str, db: Session = Depends(get_db)
 
 
 @router.post("/reset-password/")
-def reset_password(
+async def reset_password(
         token: str = Body(...),
         new_password: str = Body(...),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
 ) -> Any:
     """
     Reset password
@@ -73,7 +75,7 @@ def reset_password(
     email = verify_password_reset_token(token)
     if not email:
         raise HTTPException(status_code=400, detail="Invalid token")
-    user = services.user_crud.get(db, email=email)
+    user = await services.user_crud.get(db, email=email)
     if not user:
         raise HTTPException(
             status_code=404,
@@ -81,8 +83,9 @@ def reset_password(
         )
     elif not services.user_crud.is_active(user):
         raise HTTPException(status_code=400, detail="Inactive user")
-    hashed_password = get_password_hash(new_password)
+    hashed_password = await password_hasher.hash(new_password)
     user.hashed_password = hashed_password
     db.add(user)
-    db.commit()
+    await db.commit()
+    await principal.invalidate(user.id)
     return {"msg": "Password updated successfully"}
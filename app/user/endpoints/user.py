@@ -1,50 +1,64 @@
 from typing import Any, List
 
-from fastapi import APIRouter, Body, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Body, Depends, HTTPException, UploadFile, File, Query, Response
 from fastapi.encoders import jsonable_encoder
 from pydantic.networks import EmailStr
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import tasks
+from app.article import feed, loaders
+from app.article.schemas import PostInResponse
+from app.base import task_queue
+from app.base.fields import FieldSet
+from app.base.pagination import CursorParams
+from app.base.routing import SerializingRoute
 from app.user import schemas, services, models, permission
+from app.user.principal import Principal
 from config import settings
 from config.settings import MEDIA_PATH
 from db.db import get_db
 
-router = APIRouter()
+router = APIRouter(route_class=SerializingRoute)
 
 
 @router.get("/",
             response_model=List[schemas.UserInResponse],
             dependencies=[Depends(permission.get_current_superuser)])
-def read_users(
-        db: Session = Depends(get_db),
+async def read_users(
+        response: Response,
+        db: AsyncSession = Depends(get_db),
         skip: int = 0,
         limit: int = 100,
+        page: CursorParams = Depends(),
 ) -> Any:
     """
     Retrieve users.
     """
-    users = services.user_crud.get_multi(db, skip=skip, limit=limit)
+    if page.enabled:
+        users = await services.user_crud.get_multi_keyset(db, after=page.after, limit=limit)
+        page.set_next(response, users, limit, date_field=services.user_crud.keyset_column)
+    else:
+        users = await services.user_crud.get_multi(db, skip=skip, limit=limit)
     return users
 
 
 @router.post("/",
              response_model=schemas.UserInResponse,
              dependencies=[Depends(permission.get_current_superuser)])
-def create_user(*, db: Session = Depends(get_db), user_in: schemas.UserCreate) -> Any:
+async def create_user(*, db: AsyncSession = Depends(get_db), user_in: schemas.UserCreate) -> Any:
     """
     Create new user.
     """
-    user = services.user_crud.get(db, email=user_in.email)
+    user = await services.user_crud.get(db, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this username already exists in the system.",
         )
-    user = services.user_crud.create(db, schema=user_in)
+    user = await services.user_crud.create(db, schema=user_in)
     if settings.EMAILS_ENABLED and user_in.email:
-        tasks.celery_send_new_account_email.delay(
+        task_queue.enqueue(
+            tasks.celery_send_new_account_email,
             email_to=user_in.email, username=user_in.email, password=user_in.password
         )
         # background_tasks.add_task(
@@ -55,9 +69,9 @@ def create_user(*, db: Session = Depends(get_db), user_in: schemas.UserCreate) -
 
 
 @router.put("/me", response_model=schemas.UserInResponse)
-def update_user_me(
+async def update_user_me(
         *,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         password: str = Body(None),
         full_name: str = Body(None),
         email: EmailStr = Body(None),
@@ -74,13 +88,13 @@ def update_user_me(
         user_in.full_name = full_name
     if email is not None:
         user_in.email = email
-    user = services.user_crud.update(db, db_obj=current_user, obj_in=user_in)
+    user = await services.user_crud.update(db, db_obj=current_user, obj_in=user_in)
     return user
 
 
 @router.get("/me", response_model=schemas.UserInResponse)
-def read_user_me(
-        db: Session = Depends(get_db),
+async def read_user_me(
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(permission.get_current_active_user),
 ) -> Any:
     """
@@ -89,10 +103,28 @@ def read_user_me(
     return current_user
 
 
+@router.get("/me/feed", response_model=List[PostInResponse])
+async def read_feed_me(
+        response: Response,
+        db: AsyncSession = Depends(get_db),
+        limit: int = Query(20, le=100),
+        page: CursorParams = Depends(),
+        fields: FieldSet = Depends(loaders.post_fields),
+        current_user: Principal = Depends(permission.get_current_active_principal),
+) -> Any:
+    """
+    Newest posts of the accounts the current user follows, continue with `?cursor=`
+    """
+    posts = await feed.read(db, current_user.id, after=page.after, limit=limit,
+                            options=fields.options(loaders.post_in_response()))
+    page.set_next(response, posts, limit)
+    return fields.respond(posts, response)
+
+
 @router.post("/open", response_model=schemas.UserInResponse)
-def create_user_open(
+async def create_user_open(
         *,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         password: str = Body(...),
         email: EmailStr = Body(...),
 ) -> Any:
@@ -104,27 +136,27 @@ def create_user_open(
             status_code=403,
             detail="Open user registration is forbidden on this server",
         )
-    user = services.user_crud.get(db, email=email)
+    user = await services.user_crud.get(db, email=email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this username already exists in the system",
         )
     user_in = schemas.UserCreate(password=password, email=email)
-    user = services.user_crud.create(db, schema=user_in)
+    user = await services.user_crud.create(db, schema=user_in)
     return user
 
 
 @router.get("/{user_id}", response_model=schemas.UserInResponse)
-def read_user_by_id(
+async def read_user_by_id(
         user_id: int,
         current_user: models.User = Depends(permission.get_current_active_user),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
 ) -> Any:
     """
     Get a specific user by id.
     """
-    user = services.user_crud.get(db, id=user_id)
+    user = await services.user_crud.get(db, id=user_id)
     if user == current_user:
         return user
     if not services.user_crud.is_superuser(current_user):
@@ -137,53 +169,111 @@ def read_user_by_id(
 @router.put("/{user_id}",
             response_model=schemas.UserInResponse,
             dependencies=[Depends(permission.get_current_superuser)])
-def update_user(
+async def update_user(
         *,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         user_id: int,
         user_in: schemas.UserUpdate,
 ) -> Any:
     """
     Update a user.
     """
-    user = services.user_crud.get(db, id=user_id)
+    user = await services.user_crud.get(db, id=user_id)
     if not user:
         raise HTTPException(
             status_code=404,
             detail="The user with this username does not exist in the system",
         )
-    user = services.user_crud.update(db, db_obj=user, obj_in=user_in)
+    user = await services.user_crud.update(db, db_obj=user, obj_in=user_in)
     return user
 
 
+@router.post("/follow", response_model=schemas.Followed)
+async def follow_users(
+        *,
+        db: AsyncSession = Depends(get_db),
+        schema: schemas.FollowIds,
+        current_user: Principal = Depends(permission.get_current_active_principal)
+):
+    """
+    Follow up to FOLLOW_BULK_MAX_IDS users, `followed` lists those not followed before
+    """
+    followed = await services.follow(db, current_user.id, schema.ids)
+    return {"followed": followed}
+
+
 @router.post("/follow/{id}")
-def follow_user(
+async def follow_user(
         *,
         id: int,
-        db: Session = Depends(get_db),
-        current_user: models.User = Depends(permission.get_current_active_user)
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(permission.get_current_active_principal)
 ):
-    services.follow(action="follow", db=db, user_id=id, current_user_id=current_user.id)
-    return {"msg": "You are not following this user now"}
+    if not await services.follow(db, current_user.id, [id]):
+        if not await services.user_crud.get(db, id=id):
+            raise HTTPException(status_code=404, detail="User not found")
+    return {"msg": "Now you follow this user"}
 
 
 @router.post("/unfollow/{id}")
-def unfollow_user(
+async def unfollow_user(
         *,
         id: int,
-        db: Session = Depends(get_db),
-        current_user: models.User = Depends(permission.get_current_active_user)
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(permission.get_current_active_principal)
 ):
-    services.follow(action="unfollow", db=db, user_id=id, current_user_id=current_user.id)
-    return {"msg": "Now you follow this user"}
+    await services.unfollow(db, current_user.id, [id])
+    return {"msg": "You are not following this user now"}
+
+
+async def follow_list(db: AsyncSession, response: Response, user_id: int, followers: bool,
+                      page: CursorParams, limit: int) -> List[models.User]:
+    users = await services.get_follows(db, user_id, followers=followers, after=page.after,
+                                       limit=limit)
+    if not users and not await services.user_crud.get(db, id=user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    page.set_next(response, users, limit, date_field="followed_at")
+    return users
+
+
+@router.get("/{user_id}/followers",
+            response_model=List[schemas.UserPublic],
+            dependencies=[Depends(permission.get_current_active_principal)])
+async def read_followers(
+        user_id: int,
+        response: Response,
+        db: AsyncSession = Depends(get_db),
+        limit: int = Query(100, le=100),
+        page: CursorParams = Depends(),
+) -> Any:
+    """
+    Followers of the user, the latest first, continue with `?cursor=`
+    """
+    return await follow_list(db, response, user_id, True, page, limit)
+
+
+@router.get("/{user_id}/following",
+            response_model=List[schemas.UserPublic],
+            dependencies=[Depends(permission.get_current_active_principal)])
+async def read_following(
+        user_id: int,
+        response: Response,
+        db: AsyncSession = Depends(get_db),
+        limit: int = Query(100, le=100),
+        page: CursorParams = Depends(),
+) -> Any:
+    """
+    Users the user follows, the latest first, continue with `?cursor=`
+    """
+    return await follow_list(db, response, user_id, False, page, limit)
 
 
 @router.put("/update-avatar/me")
 async def update_image_me(
         *,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         image: UploadFile = File(...),
-        current_user: models.User = Depends(permission.get_current_active_user)
+        current_user: Principal = Depends(permission.get_current_active_principal)
 ):
     """
     User updates his own image
@@ -193,8 +283,8 @@ async def update_image_me(
 
     file_name = services.generate_unique_img_name(image)
     file_path = MEDIA_PATH + file_name
-    services.save_image_in_db(db=db, user_id=current_user.id, file_path=file_path)
-    services.save_image_in_folder(image=image, file_path=file_path)
+    await services.save_image_in_db(db=db, user_id=current_user.id, file_path=file_path)
+    await services.save_image_in_folder(image=image, file_path=file_path)
 
     return {
         "id": current_user.id,
@@ -202,11 +292,11 @@ async def update_image_me(
     }
 
 
-@router.put("/update-avatar/{id}", dependencies=[Depends(permission.get_current_user)])
+@router.put("/update-avatar/{id}", dependencies=[Depends(permission.get_current_principal)])
 async def update_image_user(
         *,
         id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         image: UploadFile = File(...),
 ):
     """
@@ -217,8 +307,8 @@ async def update_image_user(
 
     file_name = services.generate_unique_img_name(image=image)
     file_path = MEDIA_PATH + file_name
-    services.save_image_in_db(db=db, user_id=id, file_path=file_path)
-    services.save_image_in_folder(image=image, file_path=file_path)
+    await services.save_image_in_db(db=db, user_id=id, file_path=file_path)
+    await services.save_image_in_folder(image=image, file_path=file_path)
     return {
         "id": id,
         "filename": file_name
@@ -0,0 +1,75 @@
+"""
+Password hashing off the event loop.
+
+bcrypt burns 100-300 ms of CPU per call, so hashes and verifications run in a small process
+pool where they don't compete with the app threads for the GIL. At most `workers + queue_size`
+jobs are accepted; beyond that PasswordHasherBusy is raised and answered with 503.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Optional, Tuple, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from config.security import get_password_hash, verify_and_update_password
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusy(Exception):
+    """Too many password hashes are queued"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+
+    def __init__(self, workers: int = settings.PASSWORD_HASH_WORKERS,
+                 queue_size: int = settings.PASSWORD_HASH_QUEUE_SIZE,
+                 retry_after: int = settings.PASSWORD_HASH_RETRY_AFTER):
+        self.workers = workers
+        self.limit = max(workers, 1) + queue_size
+        self.retry_after = retry_after
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            # spawned workers don't inherit the event loop, connections and threads of the app
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        if self.pending >= self.limit:
+            self.rejected += 1
+            raise PasswordHasherBusy(self.retry_after)
+        self.pending += 1
+        try:
+            if self.workers <= 0:
+                return await run_in_threadpool(func, *args)
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify password, the second value is a new hash if the current one is deprecated"""
+        return await self._run(verify_and_update_password, password, hashed_password)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -1,29 +1,43 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Table, Index, func
 from sqlalchemy.orm import relationship
 
 from db.db import Base
+from db.types import Timestamp
 
 user_to_user = Table(
     'user_to_user', Base.metadata,
     Column("follower_id", Integer, ForeignKey("user.id"), primary_key=True),
-    Column("followed_id", Integer, ForeignKey("user.id"), primary_key=True)
+    Column("followed_id", Integer, ForeignKey("user.id"), primary_key=True),
+    Column("date_created", Timestamp(), server_default=func.now()),
+    # the primary key answers whether a user follows another, these page the follow lists
+    Index("ix_user_to_user_follower_id_date_created_followed_id",
+          "follower_id", "date_created", "followed_id"),
+    Index("ix_user_to_user_followed_id_date_created_follower_id",
+          "followed_id", "date_created", "follower_id"),
 )
 
 
 class User(Base):
     __tablename__ = "user"
+    __table_args__ = (
+        Index("ix_user_date_registrations_id", "date_registrations", "id"),
+        Index("ix_user_follower_count", "follower_count"),
+    )
     id = Column(Integer, unique=True, primary_key=True, autoincrement=True)
     email = Column(String, unique=True)
     hashed_password = Column(String)
     full_name = Column(String(255))
-    date_registrations = Column(DateTime(), default=datetime.utcnow, index=True)
+    date_registrations = Column(Timestamp(), default=datetime.utcnow, index=True)
     last_login = Column(DateTime(), nullable=True)
     is_active = Column(Boolean, default=True)
     is_superuser = Column(Boolean, default=False)
     is_staff = Column(Boolean, default=False)
     avatar = Column(String, nullable=True)
+    # denormalized counts of user_to_user rows, maintained by services.follow and unfollow
+    follower_count = Column(Integer, nullable=False, default=0, server_default="0")
+    following_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     post = relationship("Post", back_populates="user")
 
@@ -41,4 +55,4 @@ class User(Base):
                              primaryjoin="User.id==user_to_user.c.follower_id",
                              secondaryjoin="User.id==user_to_user.c.followed_id",
                              backref="followers"
-                             )
\ No newline at end of file
+                             )
@@ -2,9 +2,10 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from pydantic import ValidationError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.user import models, services, schemas
+from app.user.principal import Principal, principal_cache
 from config import settings, security
 from db.db import get_db
 
@@ -13,9 +14,10 @@ reusable_oauth2 = OAuth2PasswordBearer(
 )
 
 
-def get_current_user(
-        db: Session = Depends(get_db), token: str = Depends(reusable_oauth2)
-) -> models.User:
+async def get_current_principal(
+        db: AsyncSession = Depends(get_db), token: str = Depends(reusable_oauth2)
+) -> Principal:
+    """Id and permissions of the authenticated user, the User row is read on cache misses only"""
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
@@ -26,13 +28,41 @@ def get_current_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = services.user_crud.get(db, id=token_data.sub)
+    if token_data.sub is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    principal = None
+    if principal_cache is not None:
+        principal = await principal_cache.get(token_data.sub)
+    if principal is None:
+        user = await services.user_crud.get(db, id=token_data.sub)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        principal = Principal.from_user(user)
+        if principal_cache is not None:
+            await principal_cache.set(principal)
+    return principal
+
+
+async def get_current_user(
+        db: AsyncSession = Depends(get_db),
+        principal: Principal = Depends(get_current_principal),
+) -> models.User:
+    """The User row, for endpoints which show or change the user itself"""
+    user = await services.user_crud.get(db, id=principal.id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 
-def get_current_active_user(
+async def get_current_active_principal(
+        principal: Principal = Depends(get_current_principal),
+) -> Principal:
+    if not services.user_crud.is_active(principal):
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return principal
+
+
+async def get_current_active_user(
         current_user: models.User = Depends(get_current_user),
 ) -> models.User:
     if not services.user_crud.is_active(current_user):
@@ -40,11 +70,11 @@ def get_current_active_user(
     return current_user
 
 
-def get_current_superuser(
-        current_user: models.User = Depends(get_current_user),
-) -> models.User:
-    if not services.user_crud.is_superuser(current_user):
+async def get_current_superuser(
+        principal: Principal = Depends(get_current_principal),
+) -> Principal:
+    if not services.user_crud.is_superuser(principal):
         raise HTTPException(
             status_code=400, detail="The user doesn't have enough privileges"
         )
-    return current_user
+    return principal
@@ -0,0 +1,134 @@
+"""
+Cache of authenticated users.
+
+Most endpoints only need to know who the user is and what they may do, so
+permission.get_current_principal serves a frozen Principal from this cache instead of
+loading the User row on every request. CRUDUser.update and password reset invalidate it.
+"""
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from app.user.models import User
+from config import settings
+
+
+class Principal(NamedTuple):
+    id: int
+    is_active: bool
+    is_superuser: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(id=user.id, is_active=user.is_active, is_superuser=user.is_superuser)
+
+
+class PrincipalCache(ABC):
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, user_id: int) -> Optional[Principal]:
+        principal = await self._get(user_id)
+        if principal is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return principal
+
+    @abstractmethod
+    async def _get(self, user_id: int) -> Optional[Principal]:
+        pass
+
+    @abstractmethod
+    async def set(self, principal: Principal) -> None:
+        pass
+
+    @abstractmethod
+    async def invalidate(self, user_id: int) -> None:
+        pass
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class MemoryPrincipalCache(PrincipalCache):
+    """LRU with TTL of a single worker process"""
+
+    def __init__(self, max_entries: int = settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+                 ttl: float = settings.PRINCIPAL_CACHE_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[int, Tuple[float, Principal]]" = OrderedDict()
+
+    async def _get(self, user_id: int) -> Optional[Principal]:
+        item = self._entries.get(user_id)
+        if item is None:
+            return None
+        expires, principal = item
+        if expires <= self.clock():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return principal
+
+    async def set(self, principal: Principal) -> None:
+        self._entries[principal.id] = (self.clock() + self.ttl, principal)
+        self._entries.move_to_end(principal.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, float]:
+        return {**super().stats(), "size": len(self._entries)}
+
+
+class RedisPrincipalCache(PrincipalCache):
+    """Cache shared by all workers, hit/miss counters are per worker"""
+
+    def __init__(self, client, ttl: float = settings.PRINCIPAL_CACHE_TTL,
+                 prefix: str = "principal:"):
+        super().__init__()
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    async def _get(self, user_id: int) -> Optional[Principal]:
+        data = await self.client.get(f"{self.prefix}{user_id}")
+        return None if data is None else Principal(*json.loads(data))
+
+    async def set(self, principal: Principal) -> None:
+        await self.client.set(f"{self.prefix}{principal.id}", json.dumps(principal), ex=self.ttl)
+
+    async def invalidate(self, user_id: int) -> None:
+        await self.client.delete(f"{self.prefix}{user_id}")
+
+
+def create_principal_cache() -> Optional[PrincipalCache]:
+    if settings.PRINCIPAL_CACHE_BACKEND == "memory":
+        return MemoryPrincipalCache()
+    if settings.PRINCIPAL_CACHE_BACKEND == "redis":
+        from redis import asyncio as aioredis
+        return RedisPrincipalCache(aioredis.Redis.from_url(settings.REDIS_URL))
+    return None
+
+
+# None when every request loads the user row
+principal_cache = create_principal_cache()
+
+
+async def invalidate(user_id: int) -> None:
+    if principal_cache is not None:
+        await principal_cache.invalidate(user_id)
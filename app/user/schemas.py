@@ -1,7 +1,10 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
+
+from app.base import serializers
+from config import settings
 
 
 # Shared properties
@@ -36,6 +39,28 @@ class UserInResponse(UserBase):
     id: int
     full_name: Optional[str] = None
     date_registrations: datetime
+    follower_count: int = 0
+    following_count: int = 0
+
+
+# Properties of other users in follower and following lists
+class UserPublic(BaseModel):
+    id: int
+    full_name: Optional[str] = None
+    avatar: Optional[str] = None
+    follower_count: int = 0
+    following_count: int = 0
+
+    class Config:
+        orm_mode = True
+
+
+class FollowIds(BaseModel):
+    ids: List[int] = Field(..., min_items=1, max_items=settings.FOLLOW_BULK_MAX_IDS)
+
+
+class Followed(BaseModel):
+    followed: List[int]
 
 
 class Token(BaseModel):
@@ -45,3 +70,6 @@ class Token(BaseModel):
 
 class TokenPayload(BaseModel):
     sub: Optional[int] = None
+
+
+serializers.register(UserInResponse, UserPublic)
@@ -2,54 +2,67 @@ import logging
 import re
 import shutil
 import uuid
-from pathlib import Path
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, Union
 
-import emails
-from emails.template import JinjaTemplate
 from fastapi import UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
 
-from app.base.crud import CRUDBase
-from app.user.models import User
+from app.article import feed
+from app.base import mail
+from app.base.crud import AsyncCRUDBase
+from app.base.pagination import Cursor, keyset
+from app.base.sql import insert_ignore, returns_inserted
+from app.user import principal
+from app.user.hashing import password_hasher
+from app.user.models import User, user_to_user
 from app.user.schemas import UserCreate, UserUpdate
 from config import settings
-from config.security import get_password_hash, verify_password
 
 
-class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
+class CRUDUser(AsyncCRUDBase[User, UserCreate, UserUpdate]):
+    keyset_column = "date_registrations"
 
-    def create(self, db: Session, *, schema: UserCreate) -> User:
+    async def create(self, db: AsyncSession, *, schema: UserCreate) -> User:
+        hashed_password = await password_hasher.hash(schema.password)
         db_obj = User(
             email=schema.email,
-            hashed_password=get_password_hash(schema.password),
+            hashed_password=hashed_password,
             is_superuser=schema.is_superuser,
         )
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
-        return db_obj
+        await db.commit()
+        return await self.reload(db, db_obj)
 
-    def update(
-            self, db: Session, *, db_obj: User, obj_in: Union[UserUpdate, Dict[str, Any]]
+    async def update(
+            self, db: AsyncSession, *, db_obj: User, obj_in: Union[UserUpdate, Dict[str, Any]]
     ) -> User:
         if isinstance(obj_in, dict):
             update_data = obj_in
         else:
             update_data = obj_in.dict(exclude_unset=True)
-        if update_data["password"]:
-            hashed_password = get_password_hash(update_data["password"])
+        if update_data.get("password"):
+            hashed_password = await password_hasher.hash(update_data["password"])
             del update_data["password"]
             update_data["hashed_password"] = hashed_password
-        return super().update(db, db_obj=db_obj, obj_in=update_data)
+        user = await super().update(db, db_obj=db_obj, schema=update_data)
+        # is_active / is_superuser may have changed
+        await principal.invalidate(user.id)
+        return user
 
-    def authenticate(self, db: Session, *, email: str, password: str) -> Optional[User]:
-        user = self.get(db, email=email)
+    async def authenticate(self, db: AsyncSession, *, email: str, password: str) -> Optional[User]:
+        user = await self.get(db, email=email)
         if not user:
             return None
-        if not verify_password(password, user.hashed_password):
+        verified, new_hash = await password_hasher.verify(password, user.hashed_password)
+        if not verified:
             return None
+        if new_hash:
+            # hashed with old settings, e.g. fewer BCRYPT_ROUNDS
+            user.hashed_password = new_hash
+            await db.commit()
         return user
 
     def is_active(self, user: User) -> bool:
@@ -62,55 +75,149 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
 user_crud = CRUDUser(User)
 
 
-def follow(action: str, db: Session, user_id: int, current_user_id: int):
-    follower_user = user_crud.get(db=db, id=current_user_id)
-    followed_user = user_crud.get(db=db, id=user_id)
+async def follow(db: AsyncSession, follower_id: int, followed_ids: Iterable[int]) -> List[int]:
+    """
+    Follow the accounts followed_ids, with one multi-row INSERT ... ON CONFLICT DO NOTHING, and
+    count the new follows in the same transaction. Return the ids followed now, accounts already
+    followed, missing ones and the follower's own are skipped
+    """
+    ids = sorted(set(followed_ids) - {follower_id})
+    if not ids:
+        return []
+    result = await db.execute(select(User.id, User.follower_count).where(User.id.in_(ids)))
+    follower_counts = dict(result.all())
+    followed = await _insert_follows(db, follower_id, sorted(follower_counts))
+    if not followed:
+        await db.rollback()
+        return []
+    await _count_follows(db, follower_id, followed, 1)
+    await feed.follow(db, follower_id, {id: follower_counts[id] for id in followed})
+    await db.commit()
+    return followed
+
+
+async def _insert_follows(db: AsyncSession, follower_id: int, ids: List[int]) -> List[int]:
+    """Insert the follows of ids which do not exist yet, return those ids"""
+    if not ids:
+        return []
+    statement = insert_ignore(db, user_to_user).values(
+        [{"follower_id": follower_id, "followed_id": id} for id in ids]
+    )
+    if returns_inserted(db):
+        result = await db.execute(statement.returning(user_to_user.c.followed_id))
+        return sorted(result.scalars())
+    # the follows there before the INSERT are the rows it skips
+    result = await db.execute(select(user_to_user.c.followed_id)
+                              .where(user_to_user.c.follower_id == follower_id,
+                                     user_to_user.c.followed_id.in_(ids)))
+    existing = set(result.scalars())
+    await db.execute(statement)
+    return [id for id in ids if id not in existing]
+
+
+async def unfollow(db: AsyncSession, follower_id: int, followed_ids: Iterable[int]) -> List[int]:
+    """follow counterpart, with one multi-row DELETE, return the ids unfollowed now"""
+    unfollowed = await _delete_follows(db, follower_id, sorted(set(followed_ids)))
+    if not unfollowed:
+        await db.rollback()
+        return []
+    await _count_follows(db, follower_id, unfollowed, -1)
+    await feed.unfollow(db, follower_id, unfollowed)
+    await db.commit()
+    return unfollowed
+
+
+async def _delete_follows(db: AsyncSession, follower_id: int, ids: List[int]) -> List[int]:
+    """Delete the follows of ids which exist, return those ids"""
+    if not ids:
+        return []
+    statement = delete(user_to_user).where(user_to_user.c.follower_id == follower_id,
+                                           user_to_user.c.followed_id.in_(ids))
+    if returns_inserted(db):
+        result = await db.execute(statement.returning(user_to_user.c.followed_id))
+        return sorted(result.scalars())
+    result = await db.execute(select(user_to_user.c.followed_id)
+                              .where(user_to_user.c.follower_id == follower_id,
+                                     user_to_user.c.followed_id.in_(ids)))
+    existing = sorted(result.scalars())
+    if existing:
+        await db.execute(statement)
+    return existing
 
-    if action == "follow":
-        follower_user.following.append(followed_user)
-    elif action == "unfollow":
-        follower_user.following.remove(followed_user)
 
-    db.add(follower_user)
-    db.commit()
-    db.refresh(follower_user)
-    return follower_user
+async def _count_follows(db: AsyncSession, follower_id: int, followed_ids: List[int],
+                         sign: int) -> None:
+    await db.execute(update(User)
+                     .where(User.id.in_(followed_ids))
+                     .values(follower_count=User.follower_count + sign)
+                     .execution_options(synchronize_session=False))
+    await db.execute(update(User)
+                     .where(User.id == follower_id)
+                     .values(following_count=User.following_count + sign * len(followed_ids))
+                     .execution_options(synchronize_session=False))
+
+
+async def get_follows(db: AsyncSession, user_id: int, *, followers: bool,
+                      after: Optional[Cursor] = None, limit: int = 100) -> List[User]:
+    """
+    Page of the followers of user_id, or of the accounts it follows, the latest follows first.
+    Every user gets followed_at, the date of the follow, for the cursor
+    """
+    if followers:
+        user_column, other_column = user_to_user.c.followed_id, user_to_user.c.follower_id
+    else:
+        user_column, other_column = user_to_user.c.follower_id, user_to_user.c.followed_id
+    query = keyset(select(User, user_to_user.c.date_created)
+                   .join(user_to_user, other_column == User.id)
+                   .where(user_column == user_id),
+                   user_to_user.c.date_created, other_column, after)
+    result = await db.execute(query.limit(limit))
+    users = []
+    for user, followed_at in result.all():
+        user.followed_at = followed_at
+        users.append(user)
+    return users
+
+
+async def reconcile_follow_counts(db: AsyncSession) -> int:
+    """Recount User.follower_count and following_count from user_to_user"""
+    followers = select(func.count()) \
+        .where(user_to_user.c.followed_id == User.id) \
+        .scalar_subquery()
+    following = select(func.count()) \
+        .where(user_to_user.c.follower_id == User.id) \
+        .scalar_subquery()
+    result = await db.execute(
+        update(User)
+        .where(or_(User.follower_count != followers, User.following_count != following))
+        .values(follower_count=followers, following_count=following)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount
 
 
 def send_email(
         email_to: str,
-        subject_template: str = "",
-        html_template: str = "",
+        subject: str,
+        template_name: str,
         environment: Dict[str, Any] = {},
 ) -> None:
     assert settings.EMAILS_ENABLED, "no provided configuration for email variables"
-    message = emails.Message(
-        subject=JinjaTemplate(subject_template),
-        html=JinjaTemplate(html_template),
-        mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
-    )
-    smtp_options = {"host": settings.SMTP_HOST, "port": settings.SMTP_PORT}
-    if settings.SMTP_TLS:
-        smtp_options["tls"] = True
-    if settings.SMTP_USER:
-        smtp_options["user"] = settings.SMTP_USER
-    if settings.SMTP_PASSWORD:
-        smtp_options["password"] = settings.SMTP_PASSWORD
-    response = message.send(to=email_to, render=environment, smtp=smtp_options)
-    logging.info(f"send email result: {response}")
+    html = mail.render(template_name, **environment)
+    mail.transport.send(mail.html_message(email_to, subject, html))
+    logging.info(f"sent email {template_name} to {email_to}")
 
 
 def send_reset_password_email(email_to: str, email: str, token: str) -> None:
     project_name = settings.PROJECT_NAME
     subject = f"{project_name} - Password recovery for user {email}"
-    with open(Path(settings.EMAIL_TEMPLATES_DIR) / "reset_password.html") as f:
-        template_str = f.read()
     server_host = settings.SERVER_HOST
     link = f"{server_host}/reset-password?token={token}"
     send_email(
         email_to=email_to,
-        subject_template=subject,
-        html_template=template_str,
+        subject=subject,
+        template_name="reset_password.html",
         environment={
             "project_name": settings.PROJECT_NAME,
             "username": email,
@@ -124,13 +231,11 @@ def send_reset_password_email(email_to: str, email: str, token: str) -> None:
 def send_new_account_email(email_to: str, username: str, password: str) -> None:
     project_name = settings.PROJECT_NAME
     subject = f"{project_name} - New account for user {username}"
-    with open(Path(settings.EMAIL_TEMPLATES_DIR) / "new_account.html") as f:
-        template_str = f.read()
     link = settings.SERVER_HOST
     send_email(
         email_to=email_to,
-        subject_template=subject,
-        html_template=template_str,
+        subject=subject,
+        template_name="new_account.html",
         environment={
             "project_name": settings.PROJECT_NAME,
             "username": username,
@@ -147,15 +252,20 @@ def generate_unique_img_name(image: UploadFile = File(...)):
     return file_name
 
 
-def save_image_in_db(db: Session, file_path: str, user_id: int):
-    user = db.query(User).filter(User.id == user_id).first()
+async def save_image_in_db(db: AsyncSession, file_path: str, user_id: int):
+    result = await db.execute(select(User).filter(User.id == user_id))
+    user = result.scalars().first()
     user.image = file_path
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
     return user
 
 
-def save_image_in_folder(file_path: str, image: UploadFile = File(...)):
+def _copy_image(file_path: str, image: UploadFile):
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(image.file, buffer)
+
+
+async def save_image_in_folder(file_path: str, image: UploadFile = File(...)):
+    """Write uploaded image in a worker thread, file IO would block the event loop"""
+    await run_in_threadpool(_copy_image, file_path, image)
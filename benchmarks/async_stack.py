@@ -0,0 +1,102 @@
+"""
+Latency of concurrent post listings served by a sync `def` endpoint on the threadpool
+with Session, and by an `async def` endpoint with AsyncSession. Both run the same query.
+
+    python -m benchmarks.async_stack --requests 1000 --concurrency 1000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.article import loaders, schemas, services
+from app.article.filters import PostQuery
+from app.article.models import Post
+from benchmarks.seed import async_engine, create_database, seed
+
+
+def create_app(engine, aengine, limit: int) -> FastAPI:
+    sync_session = sessionmaker(bind=engine, autoflush=False)
+    async_session = sessionmaker(bind=aengine, class_=AsyncSession,
+                                 autoflush=False, expire_on_commit=False)
+
+    def get_sync_db():
+        db = sync_session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with async_session() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/sync/", response_model=List[schemas.PostInResponse])
+    def sync_posts(db: Session = Depends(get_sync_db)):
+        query = select(Post).options(*loaders.post_in_response())
+        return db.execute(PostQuery(db, query).active().page(limit=limit)).scalars().all()
+
+    @app.get("/async/", response_model=List[schemas.PostInResponse])
+    async def async_posts(db: AsyncSession = Depends(get_async_db)):
+        return await services.post_filters(db, limit=limit)
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, url: str, requests: int, concurrency: int):
+    """Send requests with at most `concurrency` in flight, return latencies in ms"""
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def one() -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return timings, time.perf_counter() - start
+
+
+def percentile(timings: List[float], p: float) -> float:
+    return statistics.quantiles(timings, n=100, method="inclusive")[int(p) - 1]
+
+
+async def benchmark(args) -> None:
+    engine = create_database()
+    seed(engine, posts=args.posts)
+    aengine = async_engine(engine)
+    app = create_app(engine, aengine, args.limit)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for label in ("sync", "async"):
+            await measure(client, f"/{label}/", args.concurrency // 10 or 1, 1)  # warm up
+            timings, elapsed = await measure(client, f"/{label}/", args.requests, args.concurrency)
+            print(f"{label:>5}: p50 {percentile(timings, 50):.1f} ms, "
+                  f"p99 {percentile(timings, 99):.1f} ms, "
+                  f"{args.requests / elapsed:,.0f} req/s")
+    await aengine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--limit", type=int, default=20, help="posts per response")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=1000)
+    asyncio.run(benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+NDJSON import of posts through app.article.bulk against creating them one by one like POST /post/.
+
+    python -m benchmarks.bulk_import --posts 100000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.article import schemas, services
+from app.article.bulk import PostImporter, export_posts, ndjson_lines
+from app.article.models import Post
+from benchmarks.seed import WORDS, async_engine, create_database, seed
+
+
+def archive(posts: int, categories: int, tags: int, seed: int = 0):
+    """NDJSON lines, titles repeat so that slugs collide"""
+    rnd = random.Random(seed)
+    for i in range(posts):
+        yield json.dumps({
+            "title": f"Imported post {i % (posts // 2 or 1)}",
+            "text": " ".join(rnd.choice(WORDS) for _ in range(50)),
+            "category": rnd.randint(1, categories),
+            # a tenth of the tags don't exist yet
+            "tag": [f"tag{rnd.randint(1, tags + tags // 10)}" for _ in range(3)],
+        }).encode() + b"\n"
+
+
+async def chunks(lines, size: int = 1 << 16):
+    chunk = b""
+    for line in lines:
+        chunk += line
+        if len(chunk) >= size:
+            yield chunk
+            chunk = b""
+    yield chunk
+
+
+async def benchmark(args) -> None:
+    engine = create_database()
+    seed(engine, users=1, categories=args.categories, tags=args.tags, posts=0)
+    aengine = async_engine(engine)
+    session_factory = sessionmaker(bind=aengine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_factory() as db:
+        lines = list(archive(args.one_by_one, args.categories, args.tags, seed=1))
+        start = time.perf_counter()
+        for line in lines:
+            post = schemas.PostCreate(**json.loads(line))
+            post_in_db = schemas.PostInDB(**post.dict(), user_id=1)
+            await services.post_crud.create_with_tags_and_category(db=db, post_schema=post_in_db)
+        elapsed = time.perf_counter() - start
+        print(f"one by one: {args.one_by_one / elapsed:,.0f} posts/s")
+
+    async with session_factory() as db:
+        lines = archive(args.posts, args.categories, args.tags)
+        start = time.perf_counter()
+        result = await PostImporter(db, user_id=1).run(ndjson_lines(chunks(lines)))
+        elapsed = time.perf_counter() - start
+        print(f"    import: {result.imported:,} posts in {elapsed:.1f} s, "
+              f"{result.imported / elapsed:,.0f} posts/s, {result.failed} failed")
+
+    async with session_factory() as db:
+        total = await db.scalar(select(func.count(Post.id)))
+        start = time.perf_counter()
+        size = 0
+        async for chunk in export_posts(db):
+            size += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"    export: {total:,} posts, {size / 2 ** 20:.0f} MiB in {elapsed:.1f} s")
+    await aengine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--one-by-one", type=int, default=500,
+                        help="posts created one by one for comparison")
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--tags", type=int, default=200)
+    asyncio.run(benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
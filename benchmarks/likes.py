@@ -0,0 +1,86 @@
+"""
+Sustained like/unlike throughput, written straight to the database
+or through the write-behind buffer.
+
+    python -m benchmarks.likes --clients 8 --seconds 5
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.article import services
+from app.article.like_buffer import LikeFlusher, MemoryLikeBuffer
+from benchmarks.seed import async_engine, create_database, seed
+
+
+async def run(seconds: float, clients: int, hit) -> int:
+    """Await hit(rnd) from concurrent clients until time is up, return number of calls"""
+    counts = [0] * clients
+    deadline = time.perf_counter() + seconds
+
+    async def client(n: int) -> None:
+        rnd = random.Random(n)
+        while time.perf_counter() < deadline:
+            await hit(rnd)
+            counts[n] += 1
+            # an in-memory buffer never suspends, let the flusher and other clients run
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    return sum(counts)
+
+
+async def benchmark(args) -> None:
+    engine = create_database()
+    seed(engine, users=args.users, posts=100)
+    aengine = async_engine(engine)
+    session_factory = sessionmaker(bind=aengine, class_=AsyncSession, expire_on_commit=False)
+
+    def event(rnd):
+        return rnd.randint(1, args.users), rnd.randint(1, args.hot_posts), rnd.random() < 0.7
+
+    async def direct(rnd) -> None:
+        user_id, post_id, liked = event(rnd)
+        async with session_factory() as db:
+            if liked:
+                await services.like(db, post_id=post_id, user_id=user_id)
+            else:
+                await services.unlike(db, post_id=post_id, user_id=user_id)
+
+    buffer = MemoryLikeBuffer()
+    flusher = LikeFlusher(buffer, session_factory, interval=0.2)
+
+    async def buffered(rnd) -> None:
+        user_id, post_id, liked = event(rnd)
+        await buffer.add(user_id, post_id, liked)
+        await flusher.notify()
+
+    calls = await run(args.seconds, args.clients, direct)
+    print(f"direct:   {calls / args.seconds:,.0f} events/s")
+
+    flusher.start()
+    calls = await run(args.seconds, args.clients, buffered)
+    await flusher.stop()
+    print(f"buffered: {calls / args.seconds:,.0f} events/s")
+
+    async with session_factory() as db:
+        wrong = await services.reconcile_like_counts(db)
+    print(f"posts with a wrong like_count after flush: {wrong}")
+    await aengine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--hot-posts", type=int, default=5, help="posts receiving all likes")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    asyncio.run(benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
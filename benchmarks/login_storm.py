@@ -0,0 +1,99 @@
+"""
+Burst of concurrent logins while other clients read a cheap endpoint, with bcrypt in the
+threadpool of the app and in the password hashing process pool.
+
+    python -m benchmarks.login_storm --logins 200 --workers 4
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from typing import List
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.user import hashing, services
+from app.user.hashing import PasswordHasher
+from benchmarks.seed import async_engine, create_database, seed
+from config import security
+from db.db import get_db
+from main import app
+
+
+def p99(timings: List[float]) -> float:
+    return statistics.quantiles(timings, n=100, method="inclusive")[98] if timings else 0.0
+
+
+async def storm(client: httpx.AsyncClient, users: int, logins: int):
+    """Send all logins at once while a reader polls the like counter, return both latencies"""
+    login_timings, read_timings, statuses = [], [], []
+    done = asyncio.Event()
+
+    async def login(n: int) -> None:
+        start = time.perf_counter()
+        response = await client.post("/api/v1/user/login/access-token", data={
+            "username": f"user{n % users + 1}@example.com", "password": "password",
+        })
+        login_timings.append((time.perf_counter() - start) * 1000)
+        statuses.append(response.status_code)
+
+    async def reader() -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get("/api/v1/post/like/1/")
+            read_timings.append((time.perf_counter() - start) * 1000)
+
+    readers = [asyncio.ensure_future(reader()) for _ in range(4)]
+    start = time.perf_counter()
+    await asyncio.gather(*(login(n) for n in range(logins)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await asyncio.gather(*readers)
+    return login_timings, read_timings, statuses, elapsed
+
+
+async def benchmark(args) -> None:
+    engine = create_database()
+    seed(engine, users=args.users, posts=1,
+         hashed_password=security.get_password_hash("password"))
+    aengine = async_engine(engine)
+    session_factory = sessionmaker(bind=aengine, class_=AsyncSession, expire_on_commit=False)
+
+    async def get_bench_db():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = get_bench_db
+    logging.getLogger("app.monitoring.instrumentation").setLevel(logging.ERROR)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for label, workers in (("threadpool", 0), (f"{args.workers} processes", args.workers)):
+            hasher = PasswordHasher(workers=workers, queue_size=args.queue_size)
+            hashing.password_hasher = services.password_hasher = hasher
+            if workers:
+                await hasher.verify("warm", security.get_password_hash("up"))  # start workers
+            logins, reads, statuses, elapsed = await storm(client, args.users, args.logins)
+            ok = [timing for timing, status in zip(logins, statuses) if status == 200]
+            print(f"{label:>12}: {len(ok)} logins in {elapsed:.1f} s, "
+                  f"login p50 {statistics.median(ok) if ok else 0:.0f} ms, p99 {p99(ok):.0f} ms, "
+                  f"{statuses.count(503)} rejected with 503, "
+                  f"concurrent read p99 {p99(reads):.0f} ms")
+            hasher.shutdown()
+    await aengine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=1000,
+                        help="lower it to see requests rejected with 503")
+    asyncio.run(benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
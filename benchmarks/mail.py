@@ -0,0 +1,62 @@
+"""
+Transactional emails, the new account email of tasks.celery_send_new_account_email sent one
+after the other to a local SMTP server which drops the messages (pip install aiosmtpd).
+--in-process enqueues them to the in-process task queue used without a broker instead.
+
+    python -m benchmarks.mail --messages 2000 [--in-process]
+"""
+import argparse
+import asyncio
+import time
+
+from aiosmtpd.controller import Controller
+
+from app.base import task_queue
+from app.user import services
+from benchmarks.newsletter import Sink
+from config import settings
+
+
+async def enqueue(messages: int, sink: Sink) -> None:
+    import tasks
+    queue = task_queue.queue = task_queue.LocalTaskQueue()
+    queue.start()
+    for i in range(messages):
+        task_queue.enqueue(tasks.celery_send_new_account_email, email_to=f"user{i}@example.com",
+                           username=f"user{i}", password="password")
+    while sink.messages < messages:
+        await asyncio.sleep(0.01)
+    await queue.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--in-process", action="store_true")
+    args = parser.parse_args()
+
+    settings.SMTP_HOST, settings.SMTP_PORT = "127.0.0.1", args.port
+    settings.SMTP_TLS, settings.SMTP_USER = False, None
+
+    sink = Sink()
+    controller = Controller(sink, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    try:
+        start = time.perf_counter()
+        if args.in_process:
+            asyncio.run(enqueue(args.messages, sink))
+        else:
+            for i in range(args.messages):
+                services.send_new_account_email(email_to=f"user{i}@example.com",
+                                                username=f"user{i}", password="password")
+        elapsed = time.perf_counter() - start
+    finally:
+        controller.stop()
+    print(f"{sink.messages} messages in {elapsed:.2f} s, {sink.messages / elapsed:,.0f} messages/s")
+    assert sink.messages == args.messages, "messages were lost"
+
+
+if __name__ == "__main__":
+    main()
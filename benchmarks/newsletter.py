@@ -0,0 +1,79 @@
+"""
+Newsletter of a post to the subscribers of its category, with Celery in eager mode against a
+local SMTP server which drops the messages (pip install aiosmtpd). A second run of the same
+newsletter checks that nobody gets the post twice.
+
+    python -m benchmarks.newsletter --contacts 5000 --domains 20
+"""
+import argparse
+import time
+
+from aiosmtpd.controller import Controller
+
+from app.contact import newsletter
+from app.contact.models import Contact
+from benchmarks.seed import create_database, insert, seed
+from config import settings
+from config.celery_app import app
+from db.db import SessionLocal
+
+
+class Sink:
+    """aiosmtpd handler counting the messages"""
+
+    def __init__(self):
+        self.messages = 0
+        self.recipients = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages += 1
+        self.recipients.update(envelope.rcpt_tos)
+        return "250 OK"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=5000)
+    parser.add_argument("--domains", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=settings.NEWSLETTER_BATCH_SIZE)
+    parser.add_argument("--domain-rate", type=float, default=100000,
+                        help="messages per second to one domain")
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    engine = create_database()
+    seed(engine, users=1, categories=1, tags=0, posts=1)
+    insert(engine, Contact.__table__, (
+        {"id": i, "email": f"reader{i}@domain{i % args.domains}.example", "category_id": 1}
+        for i in range(1, args.contacts + 1)
+    ))
+    SessionLocal.configure(bind=engine)
+    # eager tasks still serialize through a producer, the memory transport needs no broker
+    app.conf.task_always_eager, app.conf.broker_url = True, "memory://"
+    settings.SMTP_HOST, settings.SMTP_PORT = "127.0.0.1", args.port
+    settings.SMTP_TLS, settings.SMTP_USER = False, None
+    settings.NEWSLETTER_BATCH_SIZE = args.batch_size
+    newsletter.rate_limiter = newsletter.MemoryDomainRateLimiter(rate=args.domain_rate)
+    # after the settings, tasks reads some of them at import
+    import tasks
+
+    sink = Sink()
+    controller = Controller(sink, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    try:
+        for attempt in ("first run", "second run"):
+            before = sink.messages
+            start = time.perf_counter()
+            tasks.celery_send_newsletter.delay(post_id=1)
+            elapsed = time.perf_counter() - start
+            sent = sink.messages - before
+            print(f"{attempt:>10}: {sent} messages in {elapsed:.2f} s, "
+                  f"{sent / elapsed:,.0f} messages/s")
+    finally:
+        controller.stop()
+    assert sink.messages == len(sink.recipients) == args.contacts, "messages were doubled or lost"
+
+
+if __name__ == "__main__":
+    main()
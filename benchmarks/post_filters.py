@@ -0,0 +1,98 @@
+"""
+Compare the old post_filters query (join on post_tag, OR-ed filters) with PostQuery.
+
+    python -m benchmarks.post_filters --posts 50000
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import or_, text
+from sqlalchemy.orm import Session
+
+from app.article.filters import PostQuery, TagMode
+from app.article.models import Post, Tag
+from benchmarks.seed import create_database, seed
+
+NEW_INDEXES = (
+    "ix_post_tag_tag_id_post_id",
+    "ix_post_category_id_date_created",
+    "ix_post_is_active_date_created",
+    "ix_tag_name",
+)
+
+SCENARIOS = {
+    "one tag": dict(tag=["tag7"]),
+    "category": dict(category=3),
+    "tag and category": dict(tag=["tag7"], category=3),
+    "two tags, all": dict(tag=["tag7", "tag8"], tag_mode=TagMode.all),
+}
+
+
+def legacy_query(db: Session, limit: int, tag=None, category=None, **kwargs):
+    list_filters = []
+    if tag:
+        list_filters.append(Tag.name.in_(tag))
+    if category:
+        list_filters.append(Post.category_id == category)
+    return db.query(Post) \
+        .filter(or_(*list_filters)) \
+        .join(Post.tag) \
+        .order_by(Post.date_created.desc()) \
+        .limit(limit)
+
+
+def new_query(db: Session, limit: int, tag=None, category=None, tag_mode=TagMode.any):
+    return PostQuery(db).active().category(category).tags(tag, mode=tag_mode).page(limit=limit)
+
+
+def statement(query):
+    """Legacy queries are ORM Query objects, PostQuery returns a select()"""
+    return getattr(query, "statement", query)
+
+
+def query_plan(db: Session, query) -> str:
+    sql = str(statement(query).compile(db.bind, compile_kwargs={"literal_binds": True}))
+    rows = db.execute(text("EXPLAIN QUERY PLAN " + sql)).fetchall()
+    return "\n".join(f"    {row[-1]}" for row in rows)
+
+
+def measure(db: Session, query, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = db.execute(statement(query)).scalars().all()
+        timings.append((time.perf_counter() - start) * 1000)
+    ids = [row.id for row in rows]
+    return statistics.median(timings), len(ids), len(ids) - len(set(ids))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--without-indexes", action="store_true",
+                        help="drop the filter indexes before measuring")
+    args = parser.parse_args()
+
+    engine = create_database()
+    seed(engine, posts=args.posts)
+    if args.without_indexes:
+        with engine.begin() as conn:
+            for index in NEW_INDEXES:
+                conn.execute(text(f"DROP INDEX {index}"))
+    db = Session(bind=engine)
+
+    for name, filters in SCENARIOS.items():
+        print(f"== {name}: {filters}")
+        for label, build in (("before", legacy_query), ("after", new_query)):
+            query = build(db, args.limit, **filters)
+            median, count, duplicates = measure(db, query, args.repeat)
+            print(f"  {label}: {median:.2f} ms, {count} rows, {duplicates} duplicates")
+            if engine.dialect.name == "sqlite":
+                print(query_plan(db, query))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Authenticated requests with and without the principal cache.
+
+    python -m benchmarks.principal_cache --users 1000 --requests 5000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.user import permission, principal
+from app.user.principal import MemoryPrincipalCache, Principal
+from benchmarks.seed import async_engine, create_database, seed
+from config import security
+from db.db import get_db
+
+
+def create_app(session_factory) -> FastAPI:
+    async def get_bench_db():
+        async with session_factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.dependency_overrides[get_db] = get_bench_db
+
+    @app.get("/whoami")
+    async def whoami(current_user: Principal = Depends(permission.get_current_active_principal)):
+        return {"id": current_user.id}
+
+    return app
+
+
+async def run(client: httpx.AsyncClient, tokens, requests: int, concurrency: int, seed: int):
+    rnd = random.Random(seed)
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def one(token: str) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get("/whoami", headers={"Authorization": f"Bearer {token}"})
+            timings.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(rnd.choice(tokens)) for _ in range(requests)))
+    return timings, time.perf_counter() - start
+
+
+async def benchmark(args) -> None:
+    engine = create_database()
+    seed(engine, users=args.users, posts=0)
+    aengine = async_engine(engine)
+    queries = [0]
+    event.listen(aengine.sync_engine, "before_cursor_execute",
+                 lambda *_: queries.__setitem__(0, queries[0] + 1))
+    session_factory = sessionmaker(bind=aengine, class_=AsyncSession, expire_on_commit=False)
+    # users are picked from a hot set, like the active users of a real site
+    tokens = [security.create_access_token(user_id)
+              for user_id in range(1, min(args.active_users, args.users) + 1)]
+
+    transport = httpx.ASGITransport(app=create_app(session_factory))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for label, cache in (("no cache", None), ("cache", MemoryPrincipalCache())):
+            permission.principal_cache = principal.principal_cache = cache
+            queries[0] = 0
+            timings, elapsed = await run(client, tokens, args.requests, args.concurrency, seed=1)
+            stats = cache.stats() if cache is not None else {}
+            print(f"{label:>8}: {args.requests / elapsed:,.0f} req/s, "
+                  f"p50 {statistics.median(timings):.2f} ms, "
+                  f"{queries[0] / args.requests:.2f} queries/request, "
+                  f"hit ratio {stats.get('hit_ratio', 0):.2f}")
+    await aengine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--active-users", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Bulk seeding of a throwaway database for benchmarks"""
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Optional
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from db.base import Base
+from app.article import threads
+from app.article.models import Category, Comment, Post, PostLike, Tag, TimelineEntry, post_tag
+from app.user.models import User, user_to_user
+from config import settings
+
+CHUNK_SIZE = 5000
+
+
+def create_database(url: Optional[str] = None) -> Engine:
+    """Create empty schema, by default in a new SQLite file in the temp directory"""
+    if url is None:
+        fd, path = tempfile.mkstemp(prefix="blog-bench-", suffix=".db")
+        os.close(fd)
+        url = f"sqlite:///{path}"
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    engine = create_engine(url, connect_args=connect_args)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    return engine
+
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_engine(engine: Engine) -> AsyncEngine:
+    """Async engine on the same database as engine"""
+    url = engine.url.set(drivername=ASYNC_DRIVERS[engine.dialect.name])
+    return create_async_engine(url)
+
+
+def chunks(rows: Iterable[dict], size: int = CHUNK_SIZE) -> Iterator[List[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def insert(engine: Engine, table, rows: Iterable[dict]) -> None:
+    with engine.begin() as conn:
+        for chunk in chunks(rows):
+            conn.execute(table.insert(), chunk)
+
+
+def seed(engine: Engine, *, users: int = 10, categories: int = 20, tags: int = 200,
+         posts: int = 10000, tags_per_post: int = 3, comments: int = 0, reply_depth: int = 8,
+         likes: int = 0, follows: int = 0, hashed_password: str = "", seed: int = 0) -> None:
+    """
+    Insert rows with ids 1..N for every table, so callers can address them without queries.
+    Comments come in reply chains of reply_depth comments on one post, likes and follows are
+    distinct random pairs and post.like_count matches the likes, timelines match the follows
+    """
+    rnd = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    insert(engine, User.__table__, (
+        {"id": i, "email": f"user{i}@example.com", "hashed_password": hashed_password,
+         "is_active": True,
+         "is_superuser": i == 1, "date_registrations": start + timedelta(minutes=i)}
+        for i in range(1, users + 1)
+    ))
+    insert(engine, Category.__table__, (
+        {"id": i, "name": f"category {i}", "slug": f"category-{i}", "user_id": 1,
+         "date_created": start + timedelta(minutes=i)}
+        for i in range(1, categories + 1)
+    ))
+    insert(engine, Tag.__table__, (
+        {"id": i, "name": f"tag{i}", "date_created": start + timedelta(minutes=i)}
+        for i in range(1, tags + 1)
+    ))
+    insert(engine, Post.__table__, (
+        {"id": i, "slug": f"post-{i}", "title": f"Post number {i}",
+         "text": f"Text of post {i} " + " ".join(rnd.choice(WORDS) for _ in range(50)),
+         "is_active": rnd.random() > 0.05, "user_id": rnd.randint(1, users),
+         "category_id": rnd.randint(1, categories), "date_created": start + timedelta(minutes=i)}
+        for i in range(1, posts + 1)
+    ))
+    insert(engine, post_tag, (
+        {"post_id": post_id, "tag_id": tag_id}
+        for post_id in range(1, posts + 1)
+        for tag_id in rnd.sample(range(1, tags + 1), min(tags_per_post, tags))
+    ))
+    if comments:
+        insert(engine, Comment.__table__, comment_chains(rnd, comments, posts, users,
+                                                         reply_depth, start))
+        comment_count = select(func.count()).where(Comment.post_id == Post.id).scalar_subquery()
+        with engine.begin() as conn:
+            conn.execute(Post.__table__.update().values(comment_count=comment_count))
+    if likes:
+        insert(engine, PostLike.__table__, (
+            {"user_id": user_id, "post_id": post_id}
+            for user_id, post_id in pairs(rnd, likes, users, posts)
+        ))
+        like_count = select(func.count()).where(PostLike.post_id == Post.id).scalar_subquery()
+        with engine.begin() as conn:
+            conn.execute(Post.__table__.update().values(like_count=like_count))
+    if follows:
+        insert(engine, user_to_user, (
+            {"follower_id": follower_id, "followed_id": followed_id}
+            for follower_id, followed_id in pairs(rnd, follows, users, users)
+            if follower_id != followed_id
+        ))
+        follower_count = select(func.count()) \
+            .where(user_to_user.c.followed_id == User.id) \
+            .scalar_subquery()
+        following_count = select(func.count()) \
+            .where(user_to_user.c.follower_id == User.id) \
+            .scalar_subquery()
+        with engine.begin() as conn:
+            conn.execute(User.__table__.update().values(follower_count=follower_count,
+                                                        following_count=following_count))
+            conn.execute(TimelineEntry.__table__.insert().from_select(
+                ["user_id", "post_id", "author_id", "date_created"], timelines()))
+    if engine.dialect.name == "postgresql":
+        reset_sequences(engine)
+
+
+def reset_sequences(engine: Engine) -> None:
+    """Move id sequences past the explicit ids, so the app can insert rows"""
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if "id" in table.c and table.c.id.autoincrement:
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('\"{table.name}\"', 'id'), "
+                    f"coalesce(max(id), 0) + 1, false) FROM \"{table.name}\""
+                ))
+
+
+def comment_chains(rnd: random.Random, comments: int, posts: int, users: int,
+                   reply_depth: int, start: datetime) -> Iterator[dict]:
+    """Comment i replies to comment i - 1, except every reply_depth-th which starts a chain"""
+    post_id = thread_id = path = None
+    for i in range(1, comments + 1):
+        is_root = (i - 1) % reply_depth == 0
+        if is_root:
+            post_id, thread_id, path = rnd.randint(1, posts), i, None
+        path = threads.child_path(path, i)
+        yield {"id": i, "text": f"Comment {i}", "is_active": True, "post_id": post_id,
+               "parent_id": None if is_root else i - 1, "user_id": rnd.randint(1, users),
+               "date_created": start + timedelta(seconds=i),
+               "thread_id": thread_id, "path": path, "depth": i - thread_id}
+
+
+def timelines():
+    """The newest posts of the pushed accounts every user follows, as app.article.feed keeps"""
+    rank = func.row_number().over(partition_by=user_to_user.c.follower_id,
+                                  order_by=(Post.date_created.desc(), Post.id.desc()))
+    entries = select(user_to_user.c.follower_id, Post.id, Post.user_id, Post.date_created,
+                     rank.label("rank")) \
+        .join(Post, Post.user_id == user_to_user.c.followed_id) \
+        .join(User, User.id == user_to_user.c.followed_id) \
+        .where(User.follower_count <= settings.FEED_FANOUT_MAX_FOLLOWERS) \
+        .subquery()
+    return select(*list(entries.c)[:4]).where(entries.c.rank <= settings.FEED_TIMELINE_LENGTH)
+
+
+def pairs(rnd: random.Random, count: int, left: int, right: int) -> List[tuple]:
+    """count distinct random (1..left, 1..right) pairs"""
+    count = min(count, left * right)
+    seen = set()
+    while len(seen) < count:
+        seen.add((rnd.randint(1, left), rnd.randint(1, right)))
+    return sorted(seen)
+
+
+WORDS = (
+    "python fastapi database index query cursor search async cache latency "
+    "throughput pool replica request response comment thread tag category"
+).split()
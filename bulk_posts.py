@@ -0,0 +1,75 @@
+"""
+Import or export posts as NDJSON, "-" is stdin / stdout.
+
+    python bulk_posts.py import archive.ndjson --user-id 1
+    python bulk_posts.py export posts.ndjson
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from typing import AsyncIterator, BinaryIO
+
+from app.article.bulk import PostImporter, export_posts, ndjson_lines
+from db.db import AsyncSessionLocal, async_engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 16
+
+
+async def file_chunks(file: BinaryIO) -> AsyncIterator[bytes]:
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def import_file(file: BinaryIO, user_id: int) -> None:
+    start = time.perf_counter()
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await PostImporter(db, user_id=user_id).run(ndjson_lines(file_chunks(file)))
+    finally:
+        await async_engine.dispose()
+    for error in result.errors:
+        logger.warning(f"Line {error.line}: {error.detail}")
+    logger.info(f"Imported {result.imported} posts, {result.failed} lines failed, "
+                f"in {time.perf_counter() - start:.1f} s")
+
+
+async def export_file(file: BinaryIO) -> None:
+    try:
+        async with AsyncSessionLocal() as db:
+            async for chunk in export_posts(db):
+                file.write(chunk)
+    finally:
+        await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--user-id", type=int, required=True, help="author of the posts")
+    export_parser = commands.add_parser("export")
+    export_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        file = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+        with file:
+            asyncio.run(import_file(file, args.user_id))
+    else:
+        file = sys.stdout.buffer if args.path == "-" else open(args.path, "wb")
+        with file:
+            asyncio.run(export_file(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,24 @@
 from celery import Celery
 from config import settings
 
-app = Celery('tasks', broker=settings.CELERY_BROKER_URL, backend=settings.CELERY_RESULT_BACKEND)
\ No newline at end of file
+# password resets and new accounts, to run their own workers, apart from newsletters
+TRANSACTIONAL_QUEUE = "transactional"
+BULK_QUEUE = "bulk"
+
+# without a broker the API runs the tasks itself, see app/base/task_queue.py. The memory
+# transport is only there for eager tasks, which still take a producer
+app = Celery('tasks', broker=settings.CELERY_BROKER_URL or "memory://",
+             backend=settings.CELERY_RESULT_BACKEND)
+app.conf.update(
+    task_always_eager=settings.CELERY_TASK_ALWAYS_EAGER,
+    task_default_queue="celery",
+    task_routes={
+        "tasks.celery_send_reset_password_email": {"queue": TRANSACTIONAL_QUEUE},
+        "tasks.celery_send_new_account_email": {"queue": TRANSACTIONAL_QUEUE},
+        "tasks.celery_send_newsletter": {"queue": BULK_QUEUE},
+        "tasks.celery_send_newsletter_batch": {"queue": BULK_QUEUE},
+    },
+    # a task lost with its worker is delivered again, the newsletter claims prevent doubles
+    task_acks_late=settings.CELERY_TASK_ACKS_LATE,
+    worker_prefetch_multiplier=settings.CELERY_WORKER_PREFETCH_MULTIPLIER,
+)
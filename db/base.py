@@ -1,4 +1,5 @@
 from db.db import Base # noqa
 from app.user.models import User # noqa
-from app.article.models import Post, PostLike, Comment, Tag # noqa
-from app.contact.models import Contact # noqa
\ No newline at end of file
+from app.article.models import Post, PostLike, Comment, Tag, SlugAlias, TimelineEntry # noqa
+from app.article import search # noqa
+from app.contact.models import Contact, NewsletterDelivery # noqa
\ No newline at end of file
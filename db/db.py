@@ -1,27 +1,40 @@
-from collections import Generator
+from typing import AsyncGenerator
 
-from sqlalchemy import create_engine
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.declarative import declarative_base, DeclarativeMeta
 from sqlalchemy.orm import sessionmaker
 
-from config.settings import SQLALCHEMY_DATABASE_URL
+from config.settings import DATABASE, DATABASE_REPLICAS, REPLICA_STRATEGY, \
+    READ_YOUR_WRITES_SECONDS
+from db.engine import create_profile_engine
+from db.routing import ReplicaSet, RoutingSession, route
 
-# Sqlite3
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-
-# engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# used by scripts, celery tasks and benchmarks
+engine = create_profile_engine(DATABASE, name="sync")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# aiosqlite / asyncpg, used by the API
+async_engine = create_profile_engine(DATABASE, name="async", is_async=True)
+
+replica_engines = [
+    create_profile_engine({**DATABASE, "async_url": url}, name=f"replica_{n}", is_async=True)
+    for n, url in enumerate(DATABASE_REPLICAS, 1)
+]
+replicas = ReplicaSet([replica.sync_engine for replica in replica_engines], REPLICA_STRATEGY)
+
+# objects stay loaded after commit, lazy loading is not possible outside of the session
+AsyncSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False,
+    bind=async_engine, class_=AsyncSession, sync_session_class=RoutingSession,
+)
+
 Base = declarative_base()
 
 
-def get_db() -> Generator:
-    try:
-        db = SessionLocal()
+async def get_db(request: Request, response: Response) -> AsyncGenerator:
+    """Session on a replica for read-only requests and on the primary otherwise"""
+    replica = route(request, response, replicas, READ_YOUR_WRITES_SECONDS)
+    async with AsyncSessionLocal(info={"replica": replica}) as db:
         yield db
-    finally:
-        db.close()
-
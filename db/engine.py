@@ -0,0 +1,129 @@
+"""Engines built from a profile of config.settings.DATABASE_PROFILES, with pool metrics"""
+import threading
+import time
+from collections import deque
+from functools import partial
+from typing import Any, Deque, Dict
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# sync engines by name, async engines are registered by their sync_engine
+engines: Dict[str, Engine] = {}
+
+
+class PoolMetrics:
+    """Checkout wait times of the last `window` checkouts and totals since start"""
+
+    def __init__(self, window: int = 1000):
+        self.waits: Deque[float] = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.waits.append(seconds)
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_total += seconds
+
+    def snapshot(self, pool: QueuePool) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self.waits)
+            checkouts, timeouts, wait_total = self.checkouts, self.timeouts, self.wait_total
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        checked_out = pool.checkedout()
+        return {
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": checked_out,
+            "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "wait_seconds_total": round(wait_total, 6),
+            "wait_ms_p50": round(waits[len(waits) // 2] * 1000, 3) if waits else 0.0,
+            "wait_ms_p99": round(waits[int(len(waits) * 0.99)] * 1000, 3) if waits else 0.0,
+            "wait_ms_max": round(waits[-1] * 1000, 3) if waits else 0.0,
+        }
+
+
+class TimedPoolMixin:
+    """Records how long every checkout waited for a connection"""
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.observe(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.observe(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() replaces the pool, metrics carry over
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def set_sqlite_pragmas(pragmas: Dict[str, Any], dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def connect_args(url: str, profile: Dict[str, Any], is_async: bool) -> Dict[str, Any]:
+    if url.startswith("sqlite") and not is_async:
+        return {"check_same_thread": False}
+    timeout = profile.get("statement_timeout")
+    if url.startswith("postgresql") and timeout:
+        if is_async:
+            return {"server_settings": {"statement_timeout": str(timeout)}}
+        return {"options": f"-c statement_timeout={timeout}"}
+    return {}
+
+
+def create_profile_engine(profile: Dict[str, Any], *, name: str, is_async: bool = False):
+    """Engine (or AsyncEngine) for the profile, registered in `engines` under name"""
+    url = profile["async_url" if is_async else "url"]
+    options = dict(
+        poolclass=TimedAsyncQueuePool if is_async else TimedQueuePool,
+        pool_size=profile["pool_size"],
+        max_overflow=profile["max_overflow"],
+        pool_timeout=profile["pool_timeout"],
+        pool_recycle=profile["pool_recycle"],
+        pool_pre_ping=profile["pool_pre_ping"],
+        connect_args=connect_args(url, profile, is_async),
+    )
+    if is_async:
+        engine = create_async_engine(url, **options)
+        sync_engine = engine.sync_engine
+    else:
+        engine = sync_engine = create_engine(url, **options)
+
+    pragmas = profile.get("pragmas")
+    if pragmas and sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", partial(set_sqlite_pragmas, pragmas))
+    sync_engine.pool.metrics = PoolMetrics()
+    engines[name] = sync_engine
+    return engine
+
+
+def pool_metrics() -> Dict[str, Dict[str, Any]]:
+    """Checkout wait time and saturation of every registered engine"""
+    return {name: engine.pool.metrics.snapshot(engine.pool) for name, engine in engines.items()}
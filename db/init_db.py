@@ -1,13 +1,13 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
 from app.user import schemas, services
 from config import settings
 
 
-def init_db(db: Session) -> None:
+async def init_db(db: AsyncSession) -> None:
 
-    user = services.user_crud.get(db, email=settings.FIRST_SUPERUSER)
+    user = await services.user_crud.get(db, email=settings.FIRST_SUPERUSER)
     if not user:
         user_in = schemas.UserCreate(
             email=settings.FIRST_SUPERUSER,
@@ -15,4 +15,4 @@ def init_db(db: Session) -> None:
             is_superuser=True,
             is_active=True,
         )
-        user = services.user_crud.create(db, schema=user_in)  # noqa
+        user = await services.user_crud.create(db, schema=user_in)  # noqa
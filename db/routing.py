@@ -0,0 +1,73 @@
+"""
+Read replica routing.
+
+Requests with a safe method read from a replica, everything else goes to the primary.
+A client that wrote gets a cookie keeping its reads on the primary for a few seconds,
+so it sees its own writes while replicas catch up.
+"""
+import itertools
+import time
+from typing import List, Optional
+
+from fastapi import Request, Response
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Delete, Insert, Update
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+PRIMARY_COOKIE = "db_primary_until"
+
+
+class ReplicaSet:
+    """Picks a replica engine round-robin or by the least checked out connections"""
+
+    def __init__(self, engines: List[Engine], strategy: str = "round_robin"):
+        if strategy not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown replica strategy {strategy}")
+        self.engines = engines
+        self.strategy = strategy
+        self._next = itertools.cycle(engines)
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    def choose(self) -> Engine:
+        if self.strategy == "least_connections":
+            return min(self.engines, key=lambda engine: engine.pool.checkedout())
+        return next(self._next)
+
+
+class RoutingSession(Session):
+    """
+    Session reading from info["replica"] when it is set.
+    Flushes and INSERT/UPDATE/DELETE statements go to the primary, after the first write
+    the session stays on the primary
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = self.info.get("replica")
+        if replica is not None and (self._flushing or isinstance(clause, (Insert, Update, Delete))):
+            self.info["replica"] = replica = None
+        if replica is None:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        return replica
+
+
+def route(request: Request, response: Response, replicas: ReplicaSet,
+          sticky_seconds: float) -> Optional[Engine]:
+    """Replica engine for a read-only request, None for the primary"""
+    now = time.time()
+    if request.method not in SAFE_METHODS:
+        if replicas:
+            response.set_cookie(PRIMARY_COOKIE, str(int(now + sticky_seconds) + 1),
+                                max_age=int(sticky_seconds) + 1, httponly=True)
+        return None
+    if not replicas:
+        return None
+    try:
+        primary_until = float(request.cookies.get(PRIMARY_COOKIE, 0))
+    except ValueError:
+        primary_until = 0
+    if primary_until > now:
+        return None
+    return replicas.choose()
@@ -0,0 +1,12 @@
+from sqlalchemy import DateTime
+from sqlalchemy.dialects import sqlite
+
+
+def Timestamp(timezone: bool = False):
+    """
+    DateTime which SQLite stores in whole seconds, the same way as CURRENT_TIMESTAMP does.
+    Otherwise bound values get '.000000' appended and never compare equal to server defaults
+    """
+    return DateTime(timezone=timezone).with_variant(
+        sqlite.DATETIME(truncate_microseconds=True), "sqlite"
+    )
@@ -1,20 +1,22 @@
+import asyncio
 import logging
 
 from db.init_db import init_db
-from db.db import SessionLocal
+from db.db import AsyncSessionLocal, async_engine
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def init() -> None:
-    db = SessionLocal()
-    init_db(db)
+async def init() -> None:
+    async with AsyncSessionLocal() as db:
+        await init_db(db)
+    await async_engine.dispose()
 
 
 def main() -> None:
     logger.info("Creating initial data")
-    init()
+    asyncio.run(init())
     logger.info("Initial data created")
 
 
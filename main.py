@@ -1,10 +1,61 @@
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, ORJSONResponse
+from app.article import like_buffer
+from app.base import sql, task_queue
+from app.monitoring.instrumentation import instrument
 from app.routers import router
+from app.user.hashing import PasswordHasherBusy, password_hasher
 from config import settings
+from db.db import async_engine, replica_engines
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 app.include_router(router, prefix=settings.API_V1_STR)
 
+instrument(app)
 
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(status_code=503, content={"detail": "Too many logins, try again later"},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+
+@app.on_event("startup")
+async def check_database():
+    for engine in [async_engine, *replica_engines]:
+        sql.check_dialect(engine.dialect.name)
+
+
+@app.on_event("startup")
+async def start_like_flusher():
+    if like_buffer.flusher is not None:
+        like_buffer.flusher.start()
+
+
+@app.on_event("shutdown")
+async def stop_like_flusher():
+    if like_buffer.flusher is not None:
+        await like_buffer.flusher.stop()
+
+
+@app.on_event("startup")
+async def start_task_queue():
+    task_queue.queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_task_queue():
+    await task_queue.queue.stop()
+
+
+@app.on_event("shutdown")
+async def close_database():
+    for engine in [async_engine, *replica_engines]:
+        await engine.dispose()
+
+
+@app.on_event("shutdown")
+async def stop_password_hasher():
+    password_hasher.shutdown()
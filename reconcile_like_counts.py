@@ -0,0 +1,31 @@
+import asyncio
+import logging
+from typing import Tuple
+
+from app.article.services import reconcile_comment_counts, reconcile_like_counts
+from app.user.services import reconcile_follow_counts
+from db.db import AsyncSessionLocal, async_engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def reconcile() -> Tuple[int, int, int]:
+    try:
+        async with AsyncSessionLocal() as db:
+            return (await reconcile_like_counts(db), await reconcile_comment_counts(db),
+                    await reconcile_follow_counts(db))
+    finally:
+        await async_engine.dispose()
+
+
+def main() -> None:
+    logger.info("Recounting post likes and comments and user follows")
+    likes, comments, follows = asyncio.run(reconcile())
+    logger.info(f"Like counts corrected for {likes} posts")
+    logger.info(f"Comment counts corrected for {comments} posts")
+    logger.info(f"Follow counts corrected for {follows} users")
+
+
+if __name__ == "__main__":
+    main()
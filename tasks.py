@@ -1,12 +1,63 @@
+from typing import List
+
+from celery import signals
+
+from config import settings
 from config.celery_app import app
+from app.base import mail, sql, task_queue
+from app.contact import newsletter
 from app.user import services
+from db.db import SessionLocal, engine
+
+
+@signals.worker_init.connect
+def check_database(**kwargs):
+    sql.check_dialect(engine.dialect.name)
+
+
+@signals.worker_init.connect
+@signals.worker_process_init.connect
+def compile_email_templates(**kwargs):
+    # before the pool forks, processes started otherwise compile them from the bytecode cache
+    mail.compile_templates()
 
 
-@app.task()
+@signals.worker_process_shutdown.connect
+@signals.worker_shutdown.connect
+def close_smtp_connection(**kwargs):
+    mail.transport.close()
+
+
+@app.task(ignore_result=True)
 def celery_send_reset_password_email(email_to: str, email: str, token: str):
     services.send_reset_password_email(email_to=email_to, email=email, token=token)
 
 
-@app.task()
+@app.task(ignore_result=True)
 def celery_send_new_account_email(email_to: str, username: str, password: str):
     services.send_new_account_email(email_to=email_to, username=username, password=password)
+
+
+@app.task(ignore_result=True)
+def celery_send_newsletter(post_id: int):
+    """Enqueue the newsletter batches of a new post"""
+    with SessionLocal() as db:
+        newsletter.publish(db, post_id,
+                           lambda post_id, contact_ids: task_queue.enqueue(
+                               celery_send_newsletter_batch,
+                               post_id=post_id, contact_ids=contact_ids))
+
+
+@app.task(bind=True, ignore_result=True, max_retries=settings.NEWSLETTER_MAX_RETRIES)
+def celery_send_newsletter_batch(self, post_id: int, contact_ids: List[int]):
+    # an eager task has no later to defer to, it waits for the rate limit instead
+    max_wait = None if self.request.is_eager else settings.NEWSLETTER_MAX_RATE_WAIT
+    with SessionLocal() as db:
+        try:
+            result = newsletter.send_batch(db, post_id, contact_ids, max_wait=max_wait)
+        except newsletter.TRANSIENT_ERRORS as exc:
+            # sent contacts stay claimed, the retry sends to the rest
+            raise self.retry(exc=exc, countdown=newsletter.retry_countdown(self.request.retries))
+    if result.deferred:
+        task_queue.enqueue(self, countdown=result.retry_after,
+                           post_id=post_id, contact_ids=result.deferred)
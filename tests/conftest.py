@@ -0,0 +1,119 @@
+import asyncio
+import os
+import smtplib
+from typing import Any, Dict, List
+
+import httpx
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.base import cache, mail
+from app.user import permission, principal
+from benchmarks.seed import ASYNC_DRIVERS, create_database
+from config import settings
+from db.db import get_db
+from main import app
+
+
+class Api:
+    """The app on a throwaway SQLite database, counting the queries of every request"""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        url = engine.url.set(drivername=ASYNC_DRIVERS[engine.dialect.name])
+        # a connection per session, every request runs in its own event loop
+        self.async_engine = create_async_engine(url, poolclass=NullPool)
+        self.queries: List[str] = []
+        event.listen(self.async_engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: self.queries.append(statement))
+        self.session_factory = sessionmaker(bind=self.async_engine, class_=AsyncSession,
+                                            expire_on_commit=False)
+
+    async def get_db(self):
+        async with self.session_factory() as db:
+            yield db
+
+    def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        async def send():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport,
+                                         base_url=f"http://test{settings.API_V1_STR}") as client:
+                return await client.request(method, url, **kwargs)
+
+        self.queries.clear()
+        return asyncio.run(send())
+
+    def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+
+@pytest.fixture
+def api(monkeypatch) -> Api:
+    engine = create_database()
+    api = Api(engine)
+    app.dependency_overrides[get_db] = api.get_db
+    monkeypatch.setattr(settings, "EMAILS_ENABLED", False)
+    monkeypatch.setattr(cache, "response_cache", None)
+    # user ids repeat across the test databases
+    principal_cache = principal.MemoryPrincipalCache()
+    monkeypatch.setattr(principal, "principal_cache", principal_cache)
+    monkeypatch.setattr(permission, "principal_cache", principal_cache)
+    yield api
+    app.dependency_overrides.pop(get_db, None)
+    engine.dispose()
+    os.remove(engine.url.database)
+
+
+class FakeSMTP:
+    """smtplib.SMTP keeping the messages, every connection opened is in FakeSMTP.opened"""
+    opened: List["FakeSMTP"] = []
+
+    def __init__(self, host: str, port: int, timeout: float = None):
+        self.sent: List[Any] = []
+        self.noops = 0
+        self.closed = False
+        # set to have the server drop the connection
+        self.dropped = False
+        FakeSMTP.opened.append(self)
+
+    def starttls(self) -> None:
+        pass
+
+    def login(self, user: str, password: str) -> None:
+        pass
+
+    def noop(self):
+        self.noops += 1
+        if self.dropped:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        return 250, b"OK"
+
+    def send_message(self, message) -> None:
+        if self.dropped:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        self.sent.append(message)
+
+    def quit(self) -> None:
+        self.closed = True
+
+    def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    """FakeSMTP behind a new transport whose idle connections are always checked"""
+    monkeypatch.setattr(settings, "EMAILS_ENABLED", True)
+    monkeypatch.setattr(FakeSMTP, "opened", [])
+    monkeypatch.setattr(mail.smtplib, "SMTP", FakeSMTP)
+    monkeypatch.setattr(mail, "transport", mail.SMTPTransport(max_idle=0))
+    return FakeSMTP
+
+
+def auth(user_id: int) -> Dict[str, str]:
+    from config import security
+    return {"Authorization": f"Bearer {security.create_access_token(user_id)}"}
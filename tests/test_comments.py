@@ -0,0 +1,20 @@
+from sqlalchemy import select
+
+from app.article.models import Comment, Post
+from benchmarks.seed import seed
+from tests.conftest import auth
+
+
+def test_deleting_a_comment_deletes_its_replies(api):
+    # comments 1 to 4 reply to each other, 5 to 8 are a second thread
+    seed(api.engine, users=1, categories=1, tags=0, posts=1, comments=8, reply_depth=4)
+
+    response = api.request("DELETE", "/comment/2", headers=auth(1))
+
+    assert response.status_code == 200
+    with api.engine.connect() as conn:
+        assert conn.execute(select(Comment.id).order_by(Comment.id)).scalars().all() == \
+            [1, 5, 6, 7, 8]
+        assert conn.execute(select(Post.comment_count)).scalar() == 5
+    threads = api.get("/post/1/comments").json()
+    assert {thread["id"]: thread["replies"] for thread in threads}[1] == []
@@ -0,0 +1,17 @@
+import json
+
+from benchmarks.seed import seed
+from tests.conftest import auth
+
+
+def test_imported_posts_reach_the_followers_feeds(api):
+    seed(api.engine, users=2, categories=1, tags=0, posts=0)
+    assert api.request("POST", "/user/follow/1", headers=auth(2)).status_code == 200
+    lines = [{"title": f"Imported {i}", "text": "text", "category": 1} for i in range(3)]
+
+    response = api.request("POST", "/post/import", headers=auth(1),
+                           content="\n".join(json.dumps(line) for line in lines))
+
+    assert response.json()["imported"] == 3
+    feed = api.get("/user/me/feed", headers=auth(2)).json()
+    assert sorted(post["title"] for post in feed) == ["Imported 0", "Imported 1", "Imported 2"]
@@ -0,0 +1,36 @@
+import pytest
+
+from app.base.pagination import NEXT_CURSOR_HEADER
+from benchmarks.seed import seed
+
+
+@pytest.fixture
+def seeded(api):
+    seed(api.engine, users=1, categories=1, tags=2, posts=3, tags_per_post=2)
+    return api
+
+
+def test_unknown_fields_are_rejected(seeded):
+    response = seeded.get("/post/", params={"fields": "id,title,password"})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Unknown fields: password"}
+
+
+def test_responses_hold_the_fields_asked_for(seeded):
+    full = {post["id"]: post for post in seeded.get("/post/").json()}
+
+    response = seeded.get("/post/", params={"fields": "id, title,tag"})
+
+    assert response.status_code == 200
+    for post in response.json():
+        assert post.keys() == {"id", "title", "tag"}
+        assert post == {name: full[post["id"]][name] for name in ("id", "title", "tag")}
+
+
+def test_trimmed_pages_keep_the_cursor(seeded):
+    response = seeded.get("/post/", params={"fields": "slug", "limit": 2, "cursor": ""})
+
+    assert response.status_code == 200
+    assert [post.keys() for post in response.json()] == [{"slug"}, {"slug"}]
+    assert NEXT_CURSOR_HEADER in response.headers
@@ -0,0 +1,42 @@
+import asyncio
+
+from sqlalchemy import select
+
+from app.user import services
+from app.user.models import User, user_to_user
+from benchmarks.seed import seed
+from tests.conftest import auth
+
+
+def test_follow_counts_only_new_follows(api):
+    seed(api.engine, users=4, categories=1, tags=0, posts=0)
+    assert api.request("POST", "/user/follow/2", headers=auth(1)).status_code == 200
+
+    response = api.request("POST", "/user/follow", headers=auth(1), json={"ids": [1, 2, 3, 4, 9]})
+
+    assert response.json() == {"followed": [3, 4]}
+    inserts = [query for query in api.queries if query.startswith("INSERT INTO user_to_user")]
+    assert len(inserts) == 1
+    with api.engine.connect() as conn:
+        counts = conn.execute(select(User.id, User.follower_count, User.following_count)
+                              .order_by(User.id)).all()
+    assert [tuple(row) for row in counts] == [(1, 0, 3), (2, 1, 0), (3, 1, 0), (4, 1, 0)]
+
+
+def test_unfollow_deletes_the_follows_at_once(api):
+    seed(api.engine, users=4, categories=1, tags=0, posts=0)
+    api.request("POST", "/user/follow", headers=auth(1), json={"ids": [2, 3]})
+
+    async def unfollow():
+        async with api.session_factory() as db:
+            return await services.unfollow(db, 1, [2, 3, 4, 9])
+
+    api.queries.clear()
+    assert asyncio.run(unfollow()) == [2, 3]
+    deletes = [query for query in api.queries if query.startswith("DELETE FROM user_to_user")]
+    assert len(deletes) == 1
+    with api.engine.connect() as conn:
+        assert conn.execute(select(user_to_user)).all() == []
+        counts = conn.execute(select(User.id, User.follower_count, User.following_count)
+                              .order_by(User.id)).all()
+    assert [tuple(row) for row in counts] == [(1, 0, 0), (2, 0, 0), (3, 0, 0), (4, 0, 0)]
@@ -0,0 +1,32 @@
+import pytest
+
+from app.monitoring import instrumentation
+from benchmarks.seed import seed
+
+
+@pytest.fixture
+def traced(api, monkeypatch):
+    monkeypatch.setattr(instrumentation.instrumentation, "sample_rate", 1)
+    monkeypatch.setattr(instrumentation.instrumentation.serialize_seconds, "series", {})
+    seed(api.engine, users=2, categories=1, tags=2, posts=3, tags_per_post=2)
+    return api
+
+
+def test_serialization_of_traced_requests_is_timed(traced):
+    response = traced.get("/post/")
+
+    assert response.status_code == 200
+    assert "serialize;dur=" in response.headers["server-timing"]
+    counts, total = instrumentation.instrumentation.serialize_seconds.series[
+        ("GET", "/api/v1/post/")]
+    assert sum(counts) == 1
+    assert total > 0
+
+
+def test_headers_and_status_of_the_endpoint_are_kept(traced):
+    response = traced.get("/post/", params={"limit": 2, "cursor": ""})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert "X-Next-Cursor" in response.headers
+
+    assert traced.get("/post/missing").status_code == 404
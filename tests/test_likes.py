@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app.article import like_buffer
+from app.article.models import Post, PostLike
+from app.base.sql import check_dialect
+from benchmarks.seed import seed
+from tests.conftest import auth
+
+
+def test_double_like_counts_once(api):
+    seed(api.engine, users=2, categories=1, tags=0, posts=1)
+
+    assert api.request("POST", "/post/like/1/", headers=auth(2)).status_code == 200
+    assert api.request("POST", "/post/like/1/", headers=auth(2)).status_code == 400
+
+    with api.engine.connect() as conn:
+        assert conn.execute(select(Post.like_count)).scalar() == 1
+    assert api.get("/post/like/1/").json() == {"count_likes": 1}
+
+
+def test_a_like_is_unique_per_user_and_post(api):
+    seed(api.engine, users=2, categories=1, tags=0, posts=1)
+    with api.engine.begin() as conn:
+        conn.execute(PostLike.__table__.insert(), {"user_id": 2, "post_id": 1})
+
+    with pytest.raises(IntegrityError):
+        with api.engine.begin() as conn:
+            conn.execute(PostLike.__table__.insert(), {"user_id": 2, "post_id": 1})
+
+
+def test_unsupported_database_is_rejected():
+    check_dialect("sqlite")
+    with pytest.raises(RuntimeError):
+        check_dialect("mysql")
+
+
+def test_buffered_likes_are_counted_before_the_flush(api, monkeypatch):
+    seed(api.engine, users=3, categories=1, tags=0, posts=1)
+    buffer = like_buffer.MemoryLikeBuffer()
+    flusher = like_buffer.LikeFlusher(buffer, api.session_factory)
+    monkeypatch.setattr(like_buffer, "buffer", buffer)
+    monkeypatch.setattr(like_buffer, "flusher", flusher)
+    assert api.request("POST", "/post/like/1/", headers=auth(2)).status_code == 200
+    asyncio.run(flusher.flush())
+
+    api.request("POST", "/post/like/1/", headers=auth(3))
+    assert api.get("/post/like/1/").json() == {"count_likes": 2}
+    api.request("DELETE", "/post/like/1/", headers=auth(2))
+    assert api.get("/post/like/1/").json() == {"count_likes": 1}
+
+    asyncio.run(flusher.flush())
+    assert api.get("/post/like/1/").json() == {"count_likes": 1}
@@ -0,0 +1,43 @@
+from app.base import mail
+
+
+def message(i: int):
+    return mail.html_message(f"user{i}@example.com", f"Message {i}", "<p>text</p>")
+
+
+def test_dropped_connections_are_reopened(smtp):
+    mail.transport.send(message(1))
+    [first] = smtp.opened
+    first.dropped = True
+    mail.transport.max_idle = 60
+
+    mail.transport.send(message(2))
+
+    first_sent, second_sent = (connection.sent for connection in smtp.opened)
+    assert [m["To"] for m in first_sent] == ["user1@example.com"]
+    assert [m["To"] for m in second_sent] == ["user2@example.com"]
+    assert first.closed
+
+
+def test_idle_connections_are_checked_with_a_noop(smtp):
+    mail.transport.send(message(1))
+    mail.transport.send(message(2))
+    [connection] = smtp.opened
+    assert connection.noops == 1
+
+    connection.dropped = True
+    mail.transport.send(message(3))
+
+    assert len(smtp.opened) == 2
+    assert connection.noops == 2 and connection.closed
+    assert [m["To"] for m in smtp.opened[1].sent] == ["user3@example.com"]
+
+
+def test_connections_are_recycled_after_max_messages(smtp):
+    mail.transport.max_messages = 2
+
+    for i in range(5):
+        mail.transport.send(message(i))
+
+    assert [len(connection.sent) for connection in smtp.opened] == [2, 2, 1]
+    assert [connection.closed for connection in smtp.opened] == [True, True, False]
@@ -0,0 +1,16 @@
+from sqlalchemy.orm import Session
+
+from app.contact import newsletter
+from app.contact.models import Contact
+from benchmarks.seed import seed
+
+
+def test_claim_skips_claimed_contacts(api):
+    seed(api.engine, users=1, categories=1, tags=0, posts=1)
+    with Session(api.engine) as db:
+        db.add_all(Contact(email=f"{i}@example.com", category_id=1) for i in range(1, 5))
+        db.commit()
+
+        assert newsletter.claim(db, 1, [1, 2]) == [1, 2]
+        assert newsletter.claim(db, 1, [1, 2, 3, 4]) == [3, 4]
+        assert newsletter.claim(db, 1, [4]) == []
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from app.article.models import Post
+from app.base.pagination import NEXT_CURSOR_HEADER, Cursor, decode_cursor, encode_cursor
+from benchmarks.seed import seed
+
+
+def test_cursor_round_trip():
+    cursor = Cursor(date=datetime(2021, 5, 4, 3, 2, 1, 123456), id=42)
+
+    assert decode_cursor(encode_cursor(cursor)) == cursor
+
+
+def test_tampered_cursor_is_rejected(api):
+    seed(api.engine, users=1, categories=1, tags=0, posts=5)
+    token = encode_cursor(Cursor(date=datetime(2021, 1, 1), id=3))
+    tampered = token[:-1] + ("A" if token[-1] != "A" else "B")
+
+    assert api.get("/post/", params={"cursor": token}).status_code == 200
+    response = api.get("/post/", params={"cursor": tampered})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+def test_pages_with_equal_dates_are_stable(api):
+    seed(api.engine, users=1, categories=1, tags=0, posts=23)
+    with api.engine.begin() as conn:
+        conn.execute(update(Post).values(date_created=datetime(2021, 1, 1)))
+        active = conn.execute(select(Post.id).where(Post.is_active)
+                              .order_by(Post.id.desc())).scalars().all()
+
+    ids, cursor = [], ""
+    while cursor is not None:
+        response = api.get("/post/", params={"cursor": cursor, "limit": 5})
+        if response.status_code == 404:
+            break
+        ids += [int(post["id"]) for post in response.json()]
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+
+    assert ids == active
@@ -0,0 +1,38 @@
+from sqlalchemy import select, update
+
+from app.user.hashing import password_hasher
+from app.user.models import User
+from benchmarks.seed import seed
+from config import settings
+from config.security import pwd_context
+
+
+def login(api, password: str):
+    return api.request("POST", "/user/login/access-token",
+                       data={"username": "user1@example.com", "password": password})
+
+
+def test_login_is_refused_with_retry_after_when_the_queue_is_full(api, monkeypatch):
+    seed(api.engine, users=1, categories=0, tags=0, posts=0)
+    monkeypatch.setattr(password_hasher, "pending", password_hasher.limit)
+
+    response = login(api, "password")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(settings.PASSWORD_HASH_RETRY_AFTER)
+
+
+def test_login_replaces_a_hash_of_other_rounds(api, monkeypatch):
+    monkeypatch.setattr(password_hasher, "workers", 0)
+    seed(api.engine, users=1, categories=0, tags=0, posts=0)
+    old_hash = pwd_context.hash("password", rounds=4)
+    with api.engine.begin() as conn:
+        conn.execute(update(User).values(hashed_password=old_hash))
+
+    assert login(api, "password").status_code == 200
+
+    with api.engine.connect() as conn:
+        new_hash = conn.execute(select(User.hashed_password)).scalar()
+    assert new_hash != old_hash
+    assert not pwd_context.needs_update(new_hash)
+    assert pwd_context.verify("password", new_hash)
@@ -0,0 +1,20 @@
+from app.base import task_queue
+from benchmarks.seed import seed
+from config import settings
+from tests.conftest import auth
+
+
+def test_post_is_created_when_the_newsletter_cannot_be_enqueued(api, monkeypatch):
+    seed(api.engine, users=1, categories=1, tags=0, posts=0)
+    monkeypatch.setattr(settings, "EMAILS_ENABLED", True)
+
+    def enqueue(task, *, countdown=None, **kwargs):
+        raise ConnectionError("broker unreachable")
+
+    monkeypatch.setattr(task_queue, "enqueue", enqueue)
+
+    response = api.request("POST", "/post/", headers=auth(1),
+                           json={"title": "Title", "text": "text", "category": 1})
+
+    assert response.status_code == 200
+    assert api.get(f"/post/{response.json()['slug']}").status_code == 200
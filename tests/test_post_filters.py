@@ -0,0 +1,30 @@
+from collections import defaultdict
+
+from sqlalchemy import select
+
+from app.article.models import Post, post_tag
+from benchmarks.seed import seed
+
+
+def expected_ids(api, category, tag_ids, all_tags):
+    with api.engine.connect() as conn:
+        posts = conn.execute(select(Post.id).where(Post.is_active,
+                                                   Post.category_id == category)).scalars().all()
+        tags = defaultdict(set)
+        for post_id, tag_id in conn.execute(select(post_tag.c.post_id, post_tag.c.tag_id)):
+            tags[post_id].add(tag_id)
+    match = set(tag_ids).issubset if all_tags else set(tag_ids).intersection
+    return sorted(id for id in posts if match(tags[id]))
+
+
+def test_tag_modes_return_each_post_once_and_and_the_filters(api):
+    seed(api.engine, users=2, categories=2, tags=4, posts=80, tags_per_post=2)
+
+    for mode in ("any", "all"):
+        response = api.get("/post/", params={"tag": ["tag1", "tag2"], "tag_mode": mode,
+                                             "category": 1, "limit": 100})
+        assert response.status_code == 200
+        ids = [int(post["id"]) for post in response.json()]
+        assert ids and len(ids) == len(set(ids))
+        assert sorted(ids) == expected_ids(api, 1, [1, 2], mode == "all")
+        assert all(post["category"]["id"] == 1 for post in response.json())
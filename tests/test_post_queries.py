@@ -0,0 +1,29 @@
+from benchmarks.seed import seed
+
+
+def test_post_list_query_count_does_not_grow_with_page_size(api):
+    seed(api.engine, users=5, categories=3, tags=20, posts=60, comments=120, reply_depth=4)
+
+    counts = []
+    for limit in (5, 50):
+        response = api.get("/post/", params={"limit": limit})
+        assert response.status_code == 200
+        assert len(response.json()) == limit
+        counts.append(len(api.queries))
+
+    assert counts[0] == counts[1]
+
+
+def test_comment_threads_query_count_does_not_grow_with_page_size(api):
+    seed(api.engine, users=5, categories=1, tags=0, posts=1, comments=200, reply_depth=4)
+
+    counts = []
+    for limit in (5, 50):
+        response = api.get("/post/1/comments", params={"limit": limit})
+        assert response.status_code == 200
+        threads = response.json()
+        assert len(threads) == limit
+        assert all(thread["replies"][0]["replies"] for thread in threads)
+        counts.append(len(api.queries))
+
+    assert counts[0] == counts[1]
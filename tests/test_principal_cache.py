@@ -0,0 +1,34 @@
+import asyncio
+
+from app.user import principal
+from benchmarks.seed import seed
+from tests.conftest import auth
+
+
+def cached(user_id: int):
+    return asyncio.run(principal.principal_cache.get(user_id))
+
+
+def test_updating_a_user_invalidates_its_principal(api):
+    seed(api.engine, users=2, categories=0, tags=0, posts=0)
+    assert api.get("/user/me/feed", headers=auth(2)).status_code == 200
+    assert api.get("/user/", headers=auth(2)).status_code == 400
+    assert cached(2) is not None
+
+    api.request("PUT", "/user/2", headers=auth(1), json={"is_superuser": True})
+    assert cached(2) is None
+    assert api.get("/user/", headers=auth(2)).status_code == 200
+
+    api.request("PUT", "/user/2", headers=auth(1), json={"is_active": False})
+    assert api.get("/user/me/feed", headers=auth(2)).status_code == 400
+
+
+def test_changing_the_password_invalidates_the_principal(api):
+    seed(api.engine, users=2, categories=0, tags=0, posts=0)
+    assert api.get("/user/me/feed", headers=auth(2)).status_code == 200
+    assert cached(2) is not None
+
+    response = api.request("PUT", "/user/2", headers=auth(1), json={"password": "new password"})
+
+    assert response.status_code == 200
+    assert cached(2) is None
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+import db.db
+from app.article.models import Category
+from benchmarks.seed import ASYNC_DRIVERS, create_database, seed
+from db.db import get_db
+from db.routing import PRIMARY_COOKIE, ReplicaSet, RoutingSession
+from main import app
+from tests.conftest import auth
+
+
+@pytest.fixture
+def replica(api, monkeypatch):
+    """A second SQLite file as the only replica, get_db routes between it and api.engine"""
+    engine = create_database()
+    async_replica = create_async_engine(
+        engine.url.set(drivername=ASYNC_DRIVERS["sqlite"]), poolclass=NullPool
+    )
+    monkeypatch.setattr(db.db, "replicas", ReplicaSet([async_replica.sync_engine]))
+    monkeypatch.setattr(db.db, "AsyncSessionLocal", sessionmaker(
+        bind=api.async_engine, class_=AsyncSession, sync_session_class=RoutingSession,
+        expire_on_commit=False,
+    ))
+    app.dependency_overrides.pop(get_db)
+    yield engine
+    engine.dispose()
+    os.remove(engine.url.database)
+
+
+def test_reads_go_to_the_replica_until_the_client_writes(api, replica):
+    seed(api.engine, users=2, categories=1, tags=0, posts=20)
+    seed(replica, users=2, categories=1, tags=0, posts=3)
+
+    posts = api.get("/post/").json()
+    assert posts and all(int(post["id"]) <= 3 for post in posts)
+
+    response = api.request("POST", "/post/like/1/", headers=auth(2))
+    assert response.status_code == 200
+    assert PRIMARY_COOKIE in response.cookies
+
+    cookie = {"Cookie": f"{PRIMARY_COOKIE}={response.cookies[PRIMARY_COOKIE]}"}
+    assert len(api.get("/post/", headers=cookie).json()) > 3
+
+
+def test_a_flush_moves_the_session_to_the_primary(api, replica):
+    seed(api.engine, users=1, categories=1, tags=0, posts=0)
+    seed(replica, users=1, categories=2, tags=0, posts=0)
+    count = select(func.count()).select_from(Category)
+
+    with RoutingSession(bind=api.engine, info={"replica": replica}) as session:
+        assert session.scalar(count) == 2
+        session.add(Category(name="new", slug="new", user_id=1))
+        session.flush()
+        assert session.info["replica"] is None
+        assert session.scalar(count) == 2
+        session.rollback()
+        assert session.scalar(count) == 1
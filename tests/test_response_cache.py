@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy import update
+
+from app.article.models import Tag
+from app.base import cache
+from benchmarks.seed import seed
+from tests.conftest import auth
+
+
+@pytest.fixture
+def cached(api, monkeypatch):
+    monkeypatch.setattr(cache, "response_cache", cache.MemoryResponseCache())
+    seed(api.engine, users=2, categories=1, tags=2, posts=1, tags_per_post=2)
+    with api.engine.begin() as conn:
+        conn.execute(update(Tag).where(Tag.id == 1).values(name="кава"))
+        conn.execute(update(Tag).where(Tag.id == 2).values(name="machine learning"))
+    return api
+
+
+@pytest.mark.parametrize("url", ["/post/", "/post/post-1", "/tag/1", "/tag/2"])
+def test_responses_with_any_tag_name_are_cached(cached, url):
+    first, second = cached.get(url), cached.get(url)
+
+    assert first.status_code == second.status_code == 200
+    assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("MISS", "HIT")
+    assert second.json() == first.json()
+
+
+def test_updating_a_tag_invalidates_the_posts_showing_it(cached):
+    cached.get("/post/post-1")
+
+    response = cached.request("PUT", "/tag/2", json={"name": "deep learning"}, headers=auth(1))
+    assert response.status_code == 200
+
+    response = cached.get("/post/post-1")
+    assert response.headers["X-Cache"] == "MISS"
+    assert "deep learning" in {tag["name"] for tag in response.json()["tag"]}
@@ -0,0 +1,19 @@
+from sqlalchemy import update
+
+from app.article.models import Post
+from benchmarks.seed import seed
+
+
+def test_snippet_escapes_post_text(api):
+    seed(api.engine, users=1, categories=1, tags=0, posts=1)
+    with api.engine.begin() as conn:
+        conn.execute(update(Post).values(text='<script>alert("kiwi")</script> kiwi & co',
+                                         is_active=True))
+
+    response = api.get("/post/", params={"search": "kiwi"})
+
+    assert response.status_code == 200
+    snippet = response.json()[0]["snippet"]
+    assert "<script>" not in snippet
+    assert "&lt;script&gt;" in snippet
+    assert "<mark>kiwi</mark> &amp; co" in snippet
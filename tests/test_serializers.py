@@ -0,0 +1,36 @@
+import pytest
+
+from app.base.routing import SerializingRoute
+from benchmarks.seed import seed
+from main import app
+from tests.conftest import auth
+
+HOT_READS = [
+    ("/post/", 1), ("/post/post-1", 1), ("/post/1/comments", 1),
+    ("/comment/", 1), ("/comment/1", 1), ("/comment/1/replies", 1),
+    ("/category/", 1), ("/category/category-1", 1), ("/tag/", 1), ("/tag/1", 1),
+    ("/user/", 1), ("/user/me", 2), ("/user/2", 1), ("/user/me/feed", 3),
+    ("/user/1/followers", 1), ("/user/1/following", 1),
+]
+
+
+@pytest.fixture
+def seeded(api):
+    seed(api.engine, users=4, categories=2, tags=4, posts=6, tags_per_post=2, comments=6,
+         reply_depth=3, likes=8, follows=8)
+    return api
+
+
+@pytest.mark.parametrize("url, user_id", HOT_READS)
+def test_compiled_serializers_match_the_response_models(seeded, monkeypatch, url, user_id):
+    routes = [route for route in app.routes
+              if isinstance(route, SerializingRoute) and route.fast_serializer is not None]
+    assert routes
+
+    fast = seeded.get(url, headers=auth(user_id))
+    for route in routes:
+        monkeypatch.setattr(route, "fast_serializer", None)
+    validated = seeded.get(url, headers=auth(user_id))
+
+    assert fast.status_code == validated.status_code == 200
+    assert fast.json() == validated.json()
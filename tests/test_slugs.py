@@ -0,0 +1,42 @@
+from benchmarks.seed import seed
+from tests.conftest import auth
+
+
+def create_post(api, title: str) -> dict:
+    response = api.request("POST", "/post/", headers=auth(1),
+                           json={"title": title, "text": "text", "category": 1})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_taken_slugs_get_a_suffix(api):
+    seed(api.engine, users=1, categories=1, tags=0, posts=0)
+
+    slugs = [create_post(api, "Hello, World!")["slug"] for _ in range(3)]
+
+    assert slugs == ["hello-world", "hello-world-2", "hello-world-3"]
+
+
+def test_former_slugs_redirect_and_stay_taken(api):
+    seed(api.engine, users=1, categories=1, tags=0, posts=0)
+    post = create_post(api, "Hello World")
+
+    response = api.request("PUT", f"/post/{post['id']}", headers=auth(1),
+                           json={"title": "Goodbye World", "text": "text", "category": 1})
+    assert response.json()["slug"] == "goodbye-world"
+
+    response = api.get("/post/hello-world")
+    assert response.status_code == 301
+    assert response.headers["location"].endswith("/post/goodbye-world")
+    assert create_post(api, "Hello World")["slug"] == "hello-world-2"
+
+
+def test_former_category_slugs_redirect(api):
+    seed(api.engine, users=1, categories=1, tags=0, posts=0)
+
+    response = api.request("PUT", "/category/1", headers=auth(1), json={"name": "Renamed"})
+    assert response.status_code == 200
+
+    response = api.get("/category/category-1")
+    assert response.status_code == 301
+    assert response.headers["location"].endswith("/category/renamed")
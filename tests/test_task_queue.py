@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import tasks
+from app.base import task_queue
+from config import settings
+from config.celery_app import BULK_QUEUE, TRANSACTIONAL_QUEUE
+
+
+class FakeTask:
+    def __init__(self, name: str, wait: threading.Event = None):
+        self.name = name
+        self.wait = wait
+        self.done = threading.Event()
+
+    def apply(self, kwargs: dict):
+        if self.wait is not None:
+            self.wait.wait(5)
+        self.done.set()
+        return SimpleNamespace(failed=lambda: False)
+
+
+def test_tasks_are_routed_to_their_celery_queue():
+    assert task_queue.LocalTaskQueue.queue_of(tasks.celery_send_reset_password_email) \
+        == task_queue.LocalTaskQueue.queue_of(tasks.celery_send_new_account_email) \
+        == TRANSACTIONAL_QUEUE
+    assert task_queue.LocalTaskQueue.queue_of(tasks.celery_send_newsletter_batch) == BULK_QUEUE
+
+
+def test_transactional_tasks_do_not_wait_behind_bulk_ones():
+    release = threading.Event()
+    bulk = FakeTask("tasks.celery_send_newsletter_batch", wait=release)
+    transactional = FakeTask("tasks.celery_send_reset_password_email")
+    queue = task_queue.LocalTaskQueue()
+
+    async def run():
+        queue.start()
+        queue.enqueue(bulk, {})
+        queue.enqueue(transactional, {})
+        try:
+            assert await asyncio.to_thread(transactional.done.wait, 5)
+            assert not bulk.done.is_set()
+        finally:
+            release.set()
+            await queue.stop()
+
+    asyncio.run(run())
+    assert bulk.done.is_set()
+
+
+def test_emails_of_a_batch_share_one_connection(smtp):
+    queue = task_queue.LocalTaskQueue()
+
+    async def run():
+        queue.start()
+        for i in range(3):
+            queue.enqueue(tasks.celery_send_new_account_email,
+                          {"email_to": f"user{i}@example.com", "username": f"user{i}",
+                           "password": "password"})
+        while sum(len(connection.sent) for connection in smtp.opened) < 3:
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+    [connection] = smtp.opened
+    assert [message["To"] for message in connection.sent] \
+        == ["user0@example.com", "user1@example.com", "user2@example.com"]
+    assert connection.noops == 0
+
+
+def test_tasks_run_in_process_without_a_consumer():
+    task = FakeTask("tasks.celery_send_reset_password_email")
+
+    task_queue.LocalTaskQueue().enqueue(task, {})
+
+    assert task.done.is_set()
+
+
+def test_a_broker_takes_the_tasks(monkeypatch):
+    monkeypatch.setattr(settings, "CELERY_TASK_ALWAYS_EAGER", False)
+    monkeypatch.setattr(settings, "CELERY_BROKER_URL", None)
+    assert isinstance(task_queue.create_task_queue(), task_queue.LocalTaskQueue)
+
+    monkeypatch.setattr(settings, "CELERY_BROKER_URL", "redis://localhost:6379/0")
+    assert isinstance(task_queue.create_task_queue(), task_queue.CeleryTaskQueue)